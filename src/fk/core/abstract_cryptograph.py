@@ -13,13 +13,17 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import base64
 import secrets
 import string
 from abc import ABC, abstractmethod
+from typing import Callable, TypeVar
 
 from fk.core.abstract_settings import AbstractSettings, S
 from fk.core.events import AfterSettingsChanged
 
+T = TypeVar('T')
+
 
 class AbstractCryptograph(ABC):
     _settings: AbstractSettings
@@ -51,10 +55,43 @@ class AbstractCryptograph(ABC):
     def _on_key_changed(self) -> None:
         pass
 
+    # The sequence number, if set, is bound to the encrypted data by the implementations, which
+    # support associated data. It's stored in clear text, so that it can be verified on decryption.
     @abstractmethod
-    def encrypt(self, s: str) -> str:
+    def encrypt(self, s: str, seq: int | None = None) -> str:
         pass
 
     @abstractmethod
     def decrypt(self, s: str) -> str:
         pass
+
+    # Returns the sequence number, which the token is authenticated with, without decrypting it. The
+    # callers must check that it matches the decrypted strategy, and the place of the record in the file.
+    def get_bound_sequence(self, token: str | bytes | memoryview) -> int | None:
+        return None
+
+    # Binary data formats use those. Implementations, which can work with bytes
+    # directly, should override them to avoid the extra Base64 step.
+    def encrypt_bytes(self, b: bytes, seq: int | None = None) -> bytes:
+        return self.encrypt(base64.b64encode(b).decode('ascii'), seq).encode('ascii')
+
+    def decrypt_bytes(self, b: bytes) -> bytes:
+        return base64.b64decode(self.decrypt(str(b, 'ascii')))
+
+    # Batch decryption, which keeps the order of tokens. The tokens, which can't be decrypted, are
+    # returned as None. The callers can then decrypt them one by one to get the actual error.
+    def decrypt_many(self, tokens: list[str]) -> list[str | None]:
+        return self._map(self.decrypt, tokens)
+
+    def decrypt_bytes_many(self, tokens: list[bytes]) -> list[bytes | None]:
+        return self._map(self.decrypt_bytes, tokens)
+
+    # Implementations can override it to decrypt in parallel
+    def _map(self, fn: Callable[[T], T], tokens: list[T]) -> list[T | None]:
+        result = list()
+        for t in tokens:
+            try:
+                result.append(fn(t))
+            except Exception:
+                result.append(None)
+        return result
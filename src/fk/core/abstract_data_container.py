@@ -14,23 +14,29 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import datetime
-from typing import Iterable, Generic, TypeVar
+from types import MappingProxyType
+from typing import Iterable, Generic, TypeVar, Mapping
 
 from fk.core.abstract_data_item import AbstractDataItem
+from fk.core.ordered_children import OrderedChildren
 
 TChild = TypeVar('TChild', bound=AbstractDataItem)
 TParent = TypeVar('TParent', bound=AbstractDataItem)
 
-
-def move_child(lst: list[TChild], child: TChild, index_to: int) -> None:
-    index_from = lst.index(child)
-    lst.insert(index_to if index_to <= index_from else index_to - 1, lst.pop(index_from))
+# Most containers, e.g. pomodoros without interruptions, never get any children, so they share those
+# read-only placeholders until the first child is added
+_NO_CHILDREN: Mapping = MappingProxyType(dict())
 
 
 class AbstractDataContainer(AbstractDataItem[TParent], Generic[TChild, TParent]):
+    # The children are ordered by their order keys, so that adding, deleting and moving a child, as well
+    # as finding its position, take O(log n) with OrderedChildren. Moving a child only changes its key.
+    __slots__ = ('_name', '_children', '_ordered', '_order_keys')
+
     _name: str
     _children: dict[str, TChild]
-    _children_with_order: list[TChild]
+    _ordered: OrderedChildren[TChild] | None
+    _order_keys: dict[str, float]
 
     def __init__(self,
                  name: str,
@@ -39,8 +45,23 @@ class AbstractDataContainer(AbstractDataItem[TParent], Generic[TChild, TParent])
                  create_date: datetime.datetime):
         super().__init__(uid=uid, parent=parent, create_date=create_date)
         self._name = name
-        self._children = dict()
-        self._children_with_order = list()
+        self._reset_children()
+
+    def _reset_children(self) -> None:
+        self._children = _NO_CHILDREN
+        self._ordered = None
+        self._order_keys = _NO_CHILDREN
+
+    def _index_of(self, uid: str) -> int:
+        return self._ordered.index_of(self._order_keys[uid])
+
+    def _renumber_children(self) -> None:
+        # Called on the rare occasion when we run out of float precision between two neighbours
+        children = list(self._ordered)
+        self._ordered = OrderedChildren()
+        self._order_keys = dict()
+        for child in children:
+            self._order_keys[child.get_uid()] = self._ordered.append(child)
 
     def __getitem__(self, uid: str) -> TChild:
         return self._children[uid]
@@ -50,29 +71,40 @@ class AbstractDataContainer(AbstractDataItem[TParent], Generic[TChild, TParent])
 
     def __setitem__(self, uid: str, value: TChild):
         if uid not in self._children:
+            if self._children is _NO_CHILDREN:
+                self._children = dict()
+                self._ordered = OrderedChildren()
+                self._order_keys = dict()
             self._children[uid] = value
-            self._children_with_order.append(value)
+            self._order_keys[uid] = self._ordered.append(value)
+            index = self.get_uid_index()
+            if index is not None:
+                index.add(value)
 
     def __delitem__(self, uid: str):
-        old = self._children.get(uid, None)
+        old = self._children[uid]
         del self._children[uid]
-        self._children_with_order.remove(old)
+        self._ordered.remove(self._order_keys[uid])
+        del self._order_keys[uid]
+        index = self.get_uid_index()
+        if index is not None:
+            index.remove(old)
 
     def __iter__(self) -> Iterable[str]:
-        for child in self._children_with_order:
+        for child in self.values():
             yield child.get_uid()
 
     def __len__(self):
-        return len(self._children_with_order)
+        return len(self._children)
 
     def values(self) -> list[TChild]:
-        return self._children_with_order
+        return self._ordered.values() if self._ordered is not None else list()
 
     def first(self) -> TChild:
-        return self._children_with_order[0] if len(self._children_with_order) > 0 else None
+        return self._ordered.first() if self._ordered is not None else None
 
     def keys(self) -> Iterable[str]:
-        for child in self._children_with_order:
+        for child in self.values():
             yield child.get_uid()
 
     def names(self) -> list[str]:
@@ -85,7 +117,29 @@ class AbstractDataContainer(AbstractDataItem[TParent], Generic[TChild, TParent])
         self._name = new_name
 
     def move_child(self, child: TChild, index_to: int) -> None:
-        move_child(self._children_with_order, child, index_to)
+        # The child ends up in front of the one, which is at index_to now
+        uid = child.get_uid()
+        index_from = self._index_of(uid)
+        ordered = self._ordered
+        size = len(ordered)
+        index_to = max(0, min(index_to, size))
+        if index_to == index_from or index_to == index_from + 1:
+            return
+        if index_to == 0:
+            key = ordered.key_at(0) - 1
+        elif index_to == size:
+            key = ordered.last_key() + 1
+        else:
+            before = ordered.key_at(index_to - 1)
+            after = ordered.key_at(index_to)
+            key = (before + after) / 2
+            if key <= before or key >= after:
+                self._renumber_children()
+                self.move_child(child, index_to)
+                return
+        ordered.remove(self._order_keys[uid])
+        ordered.insert(key, child)
+        self._order_keys[uid] = key
 
     def get(self, key: str, default: TChild = None) -> TChild:
         if key in self._children:
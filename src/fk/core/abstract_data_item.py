@@ -41,6 +41,9 @@ TParent = TypeVar('TParent', bound='AbstractDataItem')
 
 
 class AbstractDataItem(ABC, Generic[TParent]):
+    # The most numerous items, like pomodoros, declare __slots__ all the way up, so they don't need a __dict__
+    __slots__ = ('_uid', '_parent', '_create_date', '_last_modified_date')
+
     _uid: str
     _parent: TParent | None
     _create_date: datetime.datetime
@@ -66,6 +69,10 @@ class AbstractDataItem(ABC, Generic[TParent]):
     def get_parent(self) -> TParent:
         return self._parent
 
+    def get_uid_index(self) -> 'UidIndex | None':
+        # The Tenant owns the index, or the User, if it is not attached to a Tenant. It is None until then.
+        return self._parent.get_uid_index() if self._parent is not None else None
+
     def dump(self, indent: str = '', mask_uid: bool = False, mask_last_modified: bool = False) -> str:
         owner = self.get_owner()
         owner_name = owner.get_uid() if owner is not None else 'N/A'
@@ -18,8 +18,10 @@ from __future__ import annotations
 import datetime
 import logging
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
 from datetime import timedelta
-from typing import Iterable, Callable, TypeVar, Generic
+from time import perf_counter
+from typing import Iterable, Callable, TypeVar, Generic, ContextManager
 
 from fk.core import events
 from fk.core.abstract_cryptograph import AbstractCryptograph
@@ -29,8 +31,10 @@ from fk.core.abstract_settings import AbstractSettings, S
 from fk.core.abstract_strategy import AbstractStrategy
 from fk.core.backlog import Backlog
 from fk.core.category import Category
+from fk.core.checkpoint import archive_old_backlogs, snapshot_tenant, restore_tenant
 from fk.core.pomodoro import Pomodoro, POMODORO_TYPE_TRACKER
 from fk.core.pomodoro_strategies import AddPomodoroStrategy
+from fk.core.replay_profiler import ReplayProfiler, PHASE_AUTO_SEAL, PHASE_EXECUTE, PHASE_PERSIST, PHASE_EMIT
 from fk.core.tag import Tag
 from fk.core.tenant import ADMIN_USER, Tenant
 from fk.core.timer_data import TimerData
@@ -42,6 +46,17 @@ from fk.core.workitem import Workitem
 logger = logging.getLogger(__name__)
 TRoot = TypeVar('TRoot', bound=Tenant)
 
+# How often we look for old backlogs to archive while bulk-loading, in strategies
+ARCHIVE_CHECK_INTERVAL = 1000
+
+# How many in-memory snapshots get_state_at() keeps to go back in time. When there are more, we drop every
+# other one and take them half as often.
+MAX_STATE_SNAPSHOTS = 8
+
+
+def _ignore_event(event: str, params: dict[str, any], carry: any = None) -> None:
+    pass
+
 
 class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
 
@@ -52,6 +67,14 @@ class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
     _estimated_count: int
     _ignore_invalid_sequences: bool
     _ignore_errors: bool
+    _bulk_load: bool
+    _bulk_load_start: int
+    _archive_days: int
+    _profiler: ReplayProfiler | None
+    _state_cursor: AbstractEventSource[TRoot] | None
+    _state_cursor_seq: int
+    _state_snapshots: list[tuple[int, dict]]
+    _state_snapshot_interval: int
 
     def __init__(self,
                  serializer: AbstractSerializer,
@@ -132,6 +155,11 @@ class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
         self._estimated_count = 0
         self._ignore_invalid_sequences = settings.get(S.SOURCE_IGNORE_INVALID_SEQUENCE) == 'True'
         self._ignore_errors = settings.get(S.SOURCE_IGNORE_ERRORS) == 'True'
+        self._bulk_load = False
+        self._bulk_load_start = 0
+        self._archive_days = int(settings.get(S.SOURCE_ARCHIVE_DAYS))
+        self._profiler = None
+        self._reset_state_cursor()
 
     # Override
     @abstractmethod
@@ -160,6 +188,44 @@ class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
     def start(self, mute_events: bool = True) -> None:
         pass
 
+    def _start_bulk_load(self) -> None:
+        # UC-3: While replaying the history with muted events, event sources execute strategies with a no-op emitter and without the Before / AfterMessageProcessed events
+        # The only event the subscribers get is SourceMessagesProcessed, which the source emits at the end
+        self.mute()
+        self._bulk_load = True
+        self._bulk_load_start = self._estimated_count
+
+    def _finish_bulk_load(self) -> None:
+        self._archive_old_backlogs(datetime.datetime.now(datetime.timezone.utc))
+        self._bulk_load = False
+        self.unmute()
+        logger.debug(f'Bulk-loaded {self._estimated_count - self._bulk_load_start} strategies')
+
+    def _archive_old_backlogs(self, now: datetime.datetime) -> None:
+        # UC-3: If enabled, the backlogs which weren't modified for the configured number of days are archived after loading the history
+        if self._archive_days > 0:
+            archived = archive_old_backlogs(self.get_data(), now - timedelta(days=self._archive_days))
+            if archived > 0:
+                logger.debug(f'Archived {archived} old backlogs')
+
+    def _get_emitter(self) -> Callable[[str, dict[str, any], any], None]:
+        return _ignore_event if self._bulk_load else self._emit
+
+    def set_profiler(self, profiler: ReplayProfiler | None) -> None:
+        # UC-3: Event sources can collect the timings of replaying the strategies, which is off by default
+        self._profiler = profiler
+        self._serializer.set_profiler(profiler)
+
+    def get_profiler(self) -> ReplayProfiler | None:
+        return self._profiler
+
+    def _emit_profiled(self, event: str, params: dict[str, any], carry: any = None) -> None:
+        started = perf_counter()
+        try:
+            self._emit(event, params, carry)
+        finally:
+            self._profiler.record(PHASE_EMIT, event, started)
+
     def _auto_seal_at_the_end(self, last_executed: AbstractStrategy) -> None:
         if last_executed is not None:
             sealant = AutoSealInternalStrategy(last_executed.get_sequence(),
@@ -187,7 +253,7 @@ class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
                 # next pomodoro because the timer is still ticking" errors when loading strategies.
                 if strategy.get_when() + timedelta(seconds=1) >= expected_timer_ring:
                     # Timer rings, maybe even twice
-                    strategy.execute_another(self._emit,
+                    strategy.execute_another(self._get_emitter(),
                                              self.get_data(),
                                              TimerRingInternalStrategy,
                                              [],
@@ -205,27 +271,58 @@ class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
                                   strategy: AbstractStrategy[TRoot],
                                   auto: bool = False,
                                   persist: bool = False) -> None:
+        # The profiler is None most of the time, so we only check it between the phases
+        profiler = self._profiler
+        if profiler is not None:
+            name = strategy.__class__.__name__
+            started = perf_counter()
+
         if strategy.requires_sealing():
             self._auto_seal(strategy)
+            if profiler is not None:
+                started = profiler.record(PHASE_AUTO_SEAL, name, started)
 
+        if self._bulk_load:
+            # Nobody would hear the events anyway, so we don't even prepare them
+            strategy.execute(_ignore_event, self.get_data())
+            self._estimated_count += 1
+            if profiler is not None:
+                started = profiler.record(PHASE_EXECUTE, name, started)
+            if (self._estimated_count - self._bulk_load_start) % ARCHIVE_CHECK_INTERVAL == 0:
+                # Archive as we go, so that the history doesn't get fully materialized even while loading
+                self._archive_old_backlogs(strategy.get_when())
+            if persist:
+                self._append([strategy])
+                self._last_seq = strategy.get_sequence()
+                if profiler is not None:
+                    profiler.record(PHASE_PERSIST, name, started)
+            return
+
+        emit = self._emit if profiler is None else self._emit_profiled
         params = {
             'strategy': strategy,
             'auto': auto,
             'persist': persist,
         }
         # UC-2: All executed strategies are wrapped in BeforeMessageProcessed / AfterMessageProcessed events.
-        self._emit(events.BeforeMessageProcessed, params)
+        emit(events.BeforeMessageProcessed, params)
 
         try:
-            strategy.execute(self._emit, self.get_data())
+            if profiler is not None:
+                started = perf_counter()
+            strategy.execute(emit, self.get_data())
             self._estimated_count += 1
+            if profiler is not None:
+                started = profiler.record(PHASE_EXECUTE, name, started)
             if persist:
                 self._append([strategy])
                 # UC-2: Strategy sequence is incremented only after it is persisted
                 self._last_seq = strategy.get_sequence()   # Only save it if all went well
+                if profiler is not None:
+                    profiler.record(PHASE_PERSIST, name, started)
         finally:
             # UC-2: AfterMessageProcessed is triggered after the strategy is persisted, no matter what
-            self._emit(events.AfterMessageProcessed, params)
+            emit(events.AfterMessageProcessed, params)
 
     def execute(self,
                 strategy_class: type[AbstractStrategy[TRoot]],
@@ -247,6 +344,89 @@ class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
             carry)
         self.execute_prepared_strategy(s, auto, persist)
 
+    def get_strategies_from(self, seq: int) -> Iterable[AbstractStrategy[TRoot]]:
+        raise Exception('Reading the history is not supported on this type of event source')
+
+    def _find_sequence_at(self, when: datetime.datetime) -> int:
+        # Returns the sequence of the last strategy before the first one, which happened after "when"
+        last = 0
+        for strategy in self.get_strategies_from(1):
+            if strategy.get_when() > when:
+                break
+            last = strategy.get_sequence()
+        return last
+
+    def _get_persisted_state(self, seq: int) -> tuple[int, dict] | None:
+        # Returns the latest snapshot of the data, which the source has persisted at or before seq, if any
+        return None
+
+    def _create_replay_source(self) -> AbstractEventSource[TRoot]:
+        # A detached source, which never reads or writes anything, and which we only use to execute the strategies
+        return self.clone(Tenant(self._settings))
+
+    def _reset_state_cursor(self) -> None:
+        # Must be called whenever the history gets rewritten, e.g. on repair
+        self._state_cursor = None
+        self._state_cursor_seq = 0
+        self._state_snapshots = list()
+        self._state_snapshot_interval = int(self._settings.get(S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL))
+
+    def _rewind_state_cursor(self, seq: int) -> None:
+        base = None
+        for snapshot in reversed(self._state_snapshots):
+            if snapshot[0] <= seq:
+                base = snapshot
+                break
+        persisted = self._get_persisted_state(seq)
+        if persisted is not None and (base is None or persisted[0] > base[0]):
+            base = persisted
+        self._state_cursor = self._create_replay_source()
+        self._state_cursor._start_bulk_load()
+        self._state_cursor_seq = 0
+        if base is not None:
+            restore_tenant(base[1], self._state_cursor.get_data())
+            self._state_cursor_seq = base[0]
+        logger.debug(f'Reconstructing the data at {seq}, starting from {self._state_cursor_seq}')
+
+    def _take_state_snapshot(self) -> None:
+        self._state_snapshots.append((self._state_cursor_seq, snapshot_tenant(self._state_cursor.get_data())))
+        if len(self._state_snapshots) > MAX_STATE_SNAPSHOTS:
+            self._state_snapshots = self._state_snapshots[1::2]
+            self._state_snapshot_interval *= 2
+
+    def get_state_at(self, seq: int | None = None, when: datetime.datetime | None = None) -> Tenant:
+        # UC-3: Event sources can reconstruct the data as it was after the given strategy or at the given time.
+        #  They replay the history from the nearest in-memory snapshot or persisted checkpoint, and move forward
+        #  from the last reconstructed state if they can. The returned Tenant is a detached copy, which is not
+        #  connected to any source, so it must be treated as read-only.
+        if seq is None:
+            seq = self._find_sequence_at(when) if when is not None else self._last_seq
+        if self._state_cursor is None or self._state_cursor_seq > seq:
+            self._rewind_state_cursor(seq)
+
+        if self._state_cursor_seq < seq:
+            last_snapshot = self._state_snapshots[-1][0] if len(self._state_snapshots) > 0 else 0
+            for strategy in self.get_strategies_from(self._state_cursor_seq + 1):
+                if strategy.get_sequence() > seq:
+                    break
+                try:
+                    self._state_cursor.execute_prepared_strategy(strategy)
+                except Exception as ex:
+                    if self._ignore_errors:
+                        logger.warning(f'Error reconstructing {strategy} (ignored)', exc_info=ex)
+                    else:
+                        # The cursor might be half-modified at this point, so we can't continue with it
+                        self._state_cursor = None
+                        raise ex
+                self._state_cursor_seq = strategy.get_sequence()
+                if self._state_cursor_seq - last_snapshot >= self._state_snapshot_interval:
+                    self._take_state_snapshot()
+                    last_snapshot = self._state_cursor_seq
+
+        state = Tenant(self._settings)
+        restore_tenant(snapshot_tenant(self._state_cursor.get_data()), state)
+        return state
+
     def users(self) -> Iterable[User]:
         for user in self.get_data().values():
             yield user
@@ -266,28 +446,21 @@ class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
 
     def workitems(self) -> Iterable[Workitem]:
         for backlog in self.backlogs():
-            for workitem in backlog.values():
-                yield workitem
+            # UC-3: Going through all workitems inflates archived backlogs until the next maintenance or bulk load, as the callers may keep the workitems
+            yield from backlog.values()
 
+    # UC-3: Event sources find backlogs, workitems and tags by UID in constant time, using the Tenant-wide index
     def find_workitem(self, uid: str) -> Workitem | None:
-        for workitem in self.workitems():
-            if workitem.get_uid() == uid:
-                return workitem
+        return self.get_data().find_workitem(uid)
 
     def find_backlog(self, uid: str) -> Backlog | None:
-        for backlog in self.backlogs():
-            if backlog.get_uid() == uid:
-                return backlog
+        return self.get_data().find_backlog(uid)
 
     def find_tag(self, uid: str) -> Tag | None:
-        for tag in self.tags():
-            if tag.get_uid() == uid:
-                return tag
+        return self.get_data().find_tag(uid)
 
     def find_user(self, identity: str) -> User | None:
-        for user in self.users():
-            if user.get_identity() == identity:
-                return user
+        return self.get_data().get(identity)
 
     def pomodoros(self) -> Iterable[Pomodoro]:
         for workitem in self.workitems():
@@ -322,6 +495,11 @@ class AbstractEventSource(AbstractEventEmitter, ABC, Generic[TRoot]):
     def repair(self) -> tuple[list[str], str | None]:
         pass
 
+    def maintenance(self) -> ContextManager:
+        # Maintenance operations like repair, compression and export may share some state within
+        # this context, e.g. the records they decoded. By default, there's nothing to share.
+        return nullcontext()
+
     def connect(self):
         raise Exception('Connect is not supported on this type of event source')
 
@@ -13,16 +13,26 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import logging
+import mmap
+import os
 from abc import ABC, abstractmethod
-from typing import TypeVar, Generic
+from time import perf_counter
+from typing import TypeVar, Generic, BinaryIO, Iterable, Callable
 
 from fk.core.abstract_cryptograph import AbstractCryptograph
 from fk.core.abstract_settings import AbstractSettings
 from fk.core.abstract_strategy import AbstractStrategy
+from fk.core.record_cache import RecordCache, MISSING
+from fk.core.replay_profiler import ReplayProfiler, PHASE_DECRYPT, PHASE_PARSE
 
+logger = logging.getLogger(__name__)
 T = TypeVar('T')
 TRoot = TypeVar('TRoot')
 
+READ_CHUNK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 4 * 1024 * 1024    # Smaller files are read in chunks, it's cheaper than mapping them
+
 
 def sanitize_user_input(s: str) -> str:
     return s.replace('\n', ' ').replace('\r', '')
@@ -31,10 +41,21 @@ def sanitize_user_input(s: str) -> str:
 class AbstractSerializer(ABC, Generic[T, TRoot]):
     _settings: AbstractSettings
     _cryptograph: AbstractCryptograph
+    _cache: RecordCache | None
+    _profiler: ReplayProfiler | None
 
     def __init__(self, settings: AbstractSettings | None, cryptograph: AbstractCryptograph | None):
         self._settings = settings
         self._cryptograph = cryptograph
+        self._cache = None
+        self._profiler = None
+
+    def set_cache(self, cache: RecordCache | None) -> None:
+        # While it's set, the decrypted blocks and the parsed records are taken from the cache
+        self._cache = cache
+
+    def set_profiler(self, profiler: ReplayProfiler | None) -> None:
+        self._profiler = profiler
 
     @abstractmethod
     def serialize(self, s: AbstractStrategy[TRoot]) -> T:
@@ -43,3 +64,218 @@ class AbstractSerializer(ABC, Generic[T, TRoot]):
     @abstractmethod
     def deserialize(self, t: T) -> AbstractStrategy[TRoot] | None:
         pass
+
+    # The methods below define how serialized strategies are stored in files. By default,
+    # each strategy is stored on its own line of UTF-8 text.
+
+    def get_header(self) -> bytes:
+        # Written at the very beginning of new files, so that we can tell formats apart
+        return b''
+
+    def to_record(self, t: T) -> bytes:
+        return (t + '\n').encode('utf-8')
+
+    def find_record_end(self, buffer: bytes | mmap.mmap, start: int, eof: bool) -> int:
+        # Returns the position right after the record, which starts at "start", or -1 if
+        # the buffer doesn't contain a complete record yet
+        end = buffer.find(b'\n', start)
+        if end >= 0:
+            return end + 1
+        return len(buffer) if eof and len(buffer) > start else -1
+
+    def from_record(self, buffer: bytes | memoryview, start: int, end: int) -> T:
+        # Decodes straight from the (possibly memory-mapped) buffer, without copying the bytes first
+        return str(buffer[start:end], 'utf-8')
+
+    # Deserialization can be split into two steps. The first one is thread-safe and does the heavy
+    # lifting, like parsing and decryption, so that we can run it in parallel for many records. The
+    # second one creates the strategy, and is called for the records in order. By default, all the
+    # work is done in the second step.
+
+    def parse(self, t: T) -> any:
+        return t
+
+    # Parses a batch of records, which lets the serializers decrypt them all at once. Returns the
+    # parsed record or the parsing error for each one, in the same order.
+    def parse_many(self, records: list[T]) -> list[tuple[any, Exception | None]]:
+        if self._cache is None:
+            return self._parse_batch(records)
+        keys = [RecordCache.key('parsed', t) for t in records]
+        result = [self._cache.get(k) for k in keys]
+        missing = [i for i, r in enumerate(result) if r is MISSING]
+        if len(missing) > 0:
+            for i, r in zip(missing, self._parse_batch([records[i] for i in missing])):
+                # The errors are cached, too, so that we don't try to decrypt broken records again
+                self._cache.put(keys[i], r)
+                result[i] = r
+        return result
+
+    def _parse_batch(self, records: list[T]) -> list[tuple[any, Exception | None]]:
+        return self._parse_each(records, [None] * len(records))
+
+    def _decrypt_batch(self, decrypt_many: Callable[[list], list], tokens: list) -> list:
+        if self._profiler is None:
+            return decrypt_many(tokens)
+        started = perf_counter()
+        result = decrypt_many(tokens)
+        self._profiler.record(PHASE_DECRYPT, 'records', started, len(tokens))
+        return result
+
+    def parse_decrypted(self, plaintext: any) -> any:
+        return plaintext
+
+    def get_bound_sequence(self, t: T) -> int | None:
+        # The sequence number, which the encrypted record is authenticated with, if the cipher supports that
+        return None
+
+    def _parse_authenticated(self, t: T, plaintext: any) -> any:
+        # UC-2: Decrypted strategies must have the same sequence number as the one their encrypted record is bound to
+        parsed = self.parse_decrypted(plaintext)
+        bound = self.get_bound_sequence(t)
+        if bound is not None and (parsed is None or parsed[0] != bound):
+            raise Exception(f'Encrypted record is bound to sequence {bound}, '
+                            f'but contains {parsed[0] if parsed is not None else "nothing"}')
+        return parsed
+
+    def _parse_each(self, records: list[T], decrypted: list[any]) -> list[tuple[any, Exception | None]]:
+        # The decrypted list contains the plaintext for the records, which were decrypted in
+        # advance, and None for the rest, which go through parse() as usual
+        if self._profiler is not None and len(records) > 0:
+            started = perf_counter()
+            result = self._parse_each_unprofiled(records, decrypted)
+            self._profiler.record(PHASE_PARSE, self.__class__.__name__, started, len(records))
+            return result
+        return self._parse_each_unprofiled(records, decrypted)
+
+    def _parse_each_unprofiled(self, records: list[T], decrypted: list[any]) -> list[tuple[any, Exception | None]]:
+        result = list()
+        for t, plaintext in zip(records, decrypted):
+            try:
+                result.append((self.parse(t) if plaintext is None else self._parse_authenticated(t, plaintext), None))
+            except Exception as ex:
+                result.append((None, ex))
+        return result
+
+    def build(self, parsed: any) -> AbstractStrategy[TRoot] | None:
+        return self.deserialize(parsed)
+
+    def peek_sequence(self, t: T) -> int | None:
+        # Stateful serializers might be able to tell the sequence without deserializing everything
+        s = self.deserialize(t)
+        return s.get_sequence() if s is not None else None
+
+    def skip(self, t: T) -> None:
+        # Called for the records, which we skip when reading from the middle of the file. Stateful
+        # serializers must update their state here, as if the record was deserialized.
+        pass
+
+    # Block encryption groups several strategies into a single encrypted record. Blocks are split
+    # into the records of individual strategies while reading files, so that the rest of the code
+    # doesn't need to know about them.
+
+    def serialize_block(self, strategies: list[AbstractStrategy[TRoot]]) -> T:
+        raise Exception(f'{self} does not support encrypted blocks')
+
+    def split_block(self, t: T) -> list[T] | None:
+        # Returns None if the record is not a block
+        return None
+
+    def _split_block_safely(self, t: T) -> list[T] | None:
+        key = None
+        if self._cache is not None:
+            key = RecordCache.key('block', t)
+            cached = self._cache.get(key)
+            if cached is not MISSING:
+                return cached
+        try:
+            if self._profiler is None:
+                block = self.split_block(t)
+            else:
+                started = perf_counter()
+                block = self.split_block(t)
+                if block is not None:
+                    self._profiler.record(PHASE_DECRYPT, 'blocks', started)
+        except Exception as ex:
+            # We leave it as-is, so that whoever parses it reports the error in the usual way
+            logger.debug(f'Cannot split the block of strategies', exc_info=ex)
+            return None
+        if key is not None:
+            self._cache.put(key, block)
+        return block
+
+    def get_state(self) -> dict | None:
+        # Stateful serializers (e.g. the ones which intern some values) need their state
+        # to be stored in checkpoints, to be able to resume reading in the middle of the file
+        return None
+
+    def set_state(self, state: dict | None) -> None:
+        pass
+
+    def read_records(self, file: BinaryIO, complete_only: bool = False) -> Iterable[tuple[bytes | memoryview, T]]:
+        # Reads records from a binary file, starting at its current position. Yields the raw
+        # bytes of each record together with its content. If complete_only is set, it stops
+        # at the first incomplete record, e.g. if somebody is still writing it. Encrypted blocks
+        # are yielded record by record, with the raw bytes of the block going with the last one
+        # and empty bytes with the rest. This way the callers, who track the position in the
+        # file, see all of them at the block's offset.
+        start = file.tell()
+        size = os.fstat(file.fileno()).st_size
+        if size > start and size - start >= MMAP_THRESHOLD:
+            yield from self._read_mapped_records(file, start, size, complete_only)
+            return
+
+        buffer = b''
+        eof = False
+        while not eof:
+            chunk = file.read(READ_CHUNK_SIZE)
+            eof = len(chunk) == 0
+            buffer = buffer + chunk if len(buffer) > 0 else chunk
+            start = 0
+            while True:
+                end = self.find_record_end(buffer, start, eof and not complete_only)
+                if end < 0:
+                    break
+                record = self.from_record(buffer, start, end)
+                block = self._split_block_safely(record)
+                if block is None:
+                    yield buffer[start:end], record
+                else:
+                    yield from self._yield_block(buffer[start:end], block)
+                start = end
+            buffer = buffer[start:]
+
+    @staticmethod
+    def _yield_block(raw: bytes | memoryview, records: list[T]) -> Iterable[tuple[bytes | memoryview, T]]:
+        for i, record in enumerate(records):
+            yield raw if i == len(records) - 1 else b'', record
+
+    def _read_mapped_records(self,
+                             file: BinaryIO,
+                             start: int,
+                             size: int,
+                             complete_only: bool) -> Iterable[tuple[memoryview, T]]:
+        # Scans the record boundaries directly in the memory-mapped file, and passes the slices of
+        # it to from_record(), so that we don't allocate anything per record on top of what the
+        # serializer needs. We only map what's in the file now, the rest will be read next time.
+        mapped = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        pos = start
+        try:
+            while True:
+                end = self.find_record_end(mapped, pos, not complete_only)
+                if end < 0:
+                    break
+                record = self.from_record(view, pos, end)
+                block = self._split_block_safely(record)
+                if block is None:
+                    yield view[pos:end], record
+                else:
+                    yield from self._yield_block(view[pos:end], block)
+                pos = end
+        finally:
+            file.seek(pos)
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                pass    # Somebody still holds a slice of it, it will be unmapped once they are done
@@ -63,10 +63,22 @@ class S:
     SOURCE_TYPE: Final[str] = 'Source.type'
     SOURCE_IGNORE_ERRORS: Final[str] = 'Source.ignore_errors'
     SOURCE_IGNORE_INVALID_SEQUENCE: Final[str] = 'Source.ignore_invalid_sequence'
+    SOURCE_ARCHIVE_DAYS: Final[str] = 'Source.archive_days'
     FILEEVENTSOURCE_FILENAME: Final[str] = 'FileEventSource.filename'
     FILEEVENTSOURCE_WATCH_CHANGES: Final[str] = 'FileEventSource.watch_changes'
     FILEEVENTSOURCE_REPAIR: Final[str] = 'FileEventSource.repair'
     FILEEVENTSOURCE_COMPRESS: Final[str] = 'FileEventSource.compress'
+    FILEEVENTSOURCE_CHECKPOINTS: Final[str] = 'FileEventSource.checkpoints'
+    FILEEVENTSOURCE_CHECKPOINT_INTERVAL: Final[str] = 'FileEventSource.checkpoint_interval'
+    FILEEVENTSOURCE_FSYNC: Final[str] = 'FileEventSource.fsync'
+    FILEEVENTSOURCE_GROUP_COMMIT_MS: Final[str] = 'FileEventSource.group_commit_ms'
+    FILEEVENTSOURCE_FORMAT: Final[str] = 'FileEventSource.format'
+    FILEEVENTSOURCE_SEGMENTS: Final[str] = 'FileEventSource.segments'
+    FILEEVENTSOURCE_SEGMENT_SIZE: Final[str] = 'FileEventSource.segment_size'
+    FILEEVENTSOURCE_INDEX: Final[str] = 'FileEventSource.index'
+    FILEEVENTSOURCE_PARSE_WORKERS: Final[str] = 'FileEventSource.parse_workers'
+    FILEEVENTSOURCE_PARSE_CHUNK: Final[str] = 'FileEventSource.parse_chunk'
+    FILEEVENTSOURCE_MAINTENANCE_CACHE: Final[str] = 'FileEventSource.maintenance_cache'
     WEBSOCKETEVENTSOURCE_URL: Final[str] = 'WebsocketEventSource.url'
     WEBSOCKETEVENTSOURCE_AUTH_TYPE: Final[str] = 'WebsocketEventSource.auth_type'
     WEBSOCKETEVENTSOURCE_USERNAME: Final[str] = 'WebsocketEventSource.username'
@@ -80,6 +92,9 @@ class S:
     SOURCE_ENCRYPTION_ENABLED: Final[str] = 'Source.encryption_enabled'
     SOURCE_ENCRYPTION_KEY: Final[str] = 'Source.encryption_key!'
     SOURCE_ENCRYPTION_KEY_CACHE: Final[str] = 'Source.encryption_key_cache!'
+    SOURCE_ENCRYPTION_CIPHER: Final[str] = 'Source.encryption_cipher'
+    SOURCE_ENCRYPTION_BLOCK: Final[str] = 'Source.encryption_block'
+    SOURCE_ENCRYPTION_BLOCK_SIZE: Final[str] = 'Source.encryption_block_size'
     APPLICATION_TIMER_UI_MODE: Final[str] = 'Application.timer_ui_mode'
     APPLICATION_ALWAYS_ON_TOP: Final[str] = 'Application.always_on_top'
     APPLICATION_FOCUS_FLAVOR: Final[str] = 'Application.focus_flavor'
@@ -331,9 +346,38 @@ class AbstractSettings(AbstractEventEmitter, ABC):
                 ], _always_show),
                 (S.SOURCE_IGNORE_ERRORS, 'bool', 'Ignore errors', 'True', [], _always_show),
                 (S.SOURCE_IGNORE_INVALID_SEQUENCE, 'bool', 'Ignore invalid sequences', 'True', [], _always_show),
+                # UC-3: Backlogs, which weren't modified for longer than N days, are kept compact in memory, with 0 meaning "never"
+                (S.SOURCE_ARCHIVE_DAYS, 'int', 'Keep backlogs older than N days compact', '0', [0, 36500], _never_show),
                 ('', S.SEPARATOR, '', '', [], _hide_for_ephemeral_source),
                 (S.FILEEVENTSOURCE_FILENAME, 'file', 'Data file', str(Path(default_data_dir) / 'flowkeeper-data.txt'), ['*.txt'], _show_for_file_source),
                 (S.FILEEVENTSOURCE_WATCH_CHANGES, 'bool', 'Watch changes', 'False', [], _show_for_file_source),
+                # UC-3: Checkpoints are stored next to the data file and speed up loading large files
+                (S.FILEEVENTSOURCE_CHECKPOINTS, 'bool', 'Load faster with checkpoints', 'False', [], _show_for_file_source),
+                (S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL, 'int', 'Checkpoint every N strategies', '1000', [1, 1000000], _never_show),
+                (S.FILEEVENTSOURCE_FSYNC, 'choice', 'Flush data to disk', 'none', [
+                    "none:When the OS decides (fastest)",
+                    "batch:After each group of changes",
+                    "strategy:After each change (safest)",
+                ], _show_for_file_source),
+                (S.FILEEVENTSOURCE_GROUP_COMMIT_MS, 'int', 'Group changes within N ms', '0', [0, 5000], _never_show),
+                # UC-3: The data file format only applies to new files, the existing ones are read in whatever format they are
+                (S.FILEEVENTSOURCE_FORMAT, 'choice', 'New data file format', 'text', [
+                    "text:Text (human-readable)",
+                    "binary:Binary (compact and faster)",
+                ], _show_for_file_source),
+                # UC-3: Sealed segments of the data file never change, so they are cheap to back up and sync
+                (S.FILEEVENTSOURCE_SEGMENTS, 'choice', 'Split data file', 'none', [
+                    "none:Never",
+                    "size:When it grows too large",
+                    "month:Every month",
+                ], _show_for_file_source),
+                (S.FILEEVENTSOURCE_SEGMENT_SIZE, 'int', 'Maximum segment size, KB', '4096', [16, 1048576], _never_show),
+                # UC-3: The sequence index is stored next to the data file and is rebuilt if it's missing
+                (S.FILEEVENTSOURCE_INDEX, 'bool', 'Index strategies for fast lookup', 'False', [], _show_for_file_source),
+                # UC-3: Data file records are parsed in parallel on startup, with 0 meaning "pick the number of threads automatically"
+                (S.FILEEVENTSOURCE_PARSE_WORKERS, 'int', 'Parser threads', '0', [0, 64], _never_show),
+                (S.FILEEVENTSOURCE_PARSE_CHUNK, 'int', 'Records per parser task', '500', [1, 100000], _never_show),
+                (S.FILEEVENTSOURCE_MAINTENANCE_CACHE, 'int', 'Records cached for repair and export', '50000', [0, 10000000], _never_show),
                 (S.FILEEVENTSOURCE_REPAIR, 'button', 'Repair', '', [], _show_for_file_source),
                 (S.FILEEVENTSOURCE_COMPRESS, 'button', 'Compress', '', [], _show_for_file_source),
                 # UC-2: Setting "Server URL" is only shown for the "Self-hosted server" data source
@@ -360,6 +404,14 @@ class AbstractSettings(AbstractEventEmitter, ABC):
                 # UC-2: Setting "End-to-end encryption key" is only shown if "End-to-end encryption" is checked, or if the data source is "Flowkeeper.org"
                 (S.SOURCE_ENCRYPTION_KEY, 'key', 'End-to-end encryption key', '', [], _show_when_encryption_is_enabled),
                 (S.SOURCE_ENCRYPTION_KEY_CACHE, 'secret', 'Encryption key cache', '', [], _never_show),
+                # UC-2: Data encrypted with either algorithm can be read, the selected one is used for the new strategies
+                (S.SOURCE_ENCRYPTION_CIPHER, 'choice', 'Encryption algorithm', 'fernet', [
+                    "fernet:Fernet (AES-CBC with HMAC)",
+                    "aes-gcm:AES-GCM (faster and more compact)",
+                ], _show_when_encryption_is_enabled),
+                # UC-2: Data files and exports can encrypt strategies in blocks, with 0 meaning "encrypt each strategy separately"
+                (S.SOURCE_ENCRYPTION_BLOCK, 'int', 'Strategies per encrypted block', '0', [0, 100000], _never_show),
+                (S.SOURCE_ENCRYPTION_BLOCK_SIZE, 'int', 'Maximum encrypted block size, KB', '64', [1, 65536], _never_show),
             ],
             'Appearance': [
                 (S.APPLICATION_TIMER_UI_MODE, 'choice', 'When timer starts', 'keep' if _is_tiling_wm() else 'focus', [
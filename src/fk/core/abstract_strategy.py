@@ -16,8 +16,9 @@
 from __future__ import annotations
 
 import datetime
+import sys
 from abc import ABC, abstractmethod
-from typing import Callable, Type, Generic, TypeVar
+from typing import Callable, Type, Generic, TypeVar, Iterable
 
 from fk.core import events
 from fk.core.abstract_data_item import AbstractDataItem
@@ -29,9 +30,13 @@ TRoot = TypeVar('TRoot', bound=AbstractDataItem)
 
 
 class AbstractStrategy(ABC, Generic[TRoot]):
+    # We keep hundreds of thousands of those in memory while replaying, repairing or importing the history,
+    # so all strategies declare __slots__, which saves us a per-instance __dict__
+    __slots__ = ('_seq', '_when', '_params', '_settings', '_user_identity', '_carry')
+
     _seq: int
     _when: datetime.datetime
-    _params: list[str]
+    _params: tuple[str, ...]
     _settings: AbstractSettings
     _user_identity: str
     _carry: any
@@ -45,8 +50,9 @@ class AbstractStrategy(ABC, Generic[TRoot]):
                  carry: any = None):
         self._seq = seq
         self._when = when
-        self._user_identity = user_identity
-        self._params = params
+        # User identities are interned, as the same few of them are referenced by all strategies
+        self._user_identity = sys.intern(user_identity) if type(user_identity) is str else user_identity
+        self._params = tuple(params)
         self._settings = settings
         self._carry = carry
 
@@ -62,7 +68,7 @@ class AbstractStrategy(ABC, Generic[TRoot]):
         return self._user_identity
 
     def replace_user_identity(self, user_identity: str) -> None:
-        self._user_identity = user_identity
+        self._user_identity = sys.intern(user_identity)
 
     def get_sequence(self) -> int:
         return self._seq
@@ -84,7 +90,7 @@ class AbstractStrategy(ABC, Generic[TRoot]):
                 data: TRoot) -> None:
         pass
 
-    def get_params(self):
+    def get_params(self) -> tuple[str, ...]:
         return self._params
 
     # This is for "auto-executed" strategies only. Those won't be persisted. It doesn't support auto-sealing, but
@@ -120,3 +126,14 @@ class AbstractStrategy(ABC, Generic[TRoot]):
             raise Exception(f'User "{self._user_identity}" not found')
         else:
             return None
+
+
+def drain_strategies(strategies: Iterable[AbstractStrategy]) -> Iterable[AbstractStrategy]:
+    # Yields the strategies in order, removing them from the list, so that the replayed ones can be
+    # garbage-collected while we are still going through the rest of it
+    if not isinstance(strategies, list):
+        yield from strategies
+        return
+    strategies.reverse()
+    while len(strategies) > 0:
+        yield strategies.pop()
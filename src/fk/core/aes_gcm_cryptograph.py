@@ -0,0 +1,137 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import base64
+import logging
+import os
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from fk.core.abstract_settings import AbstractSettings, S
+from fk.core.fernet_cryptograph import FernetCryptograph
+
+logger = logging.getLogger(__name__)
+
+# Fernet tokens are URL-safe Base64 and always start with "gAAAAA", so the markers below let us
+# tell the two formats apart. The format of AES-GCM tokens is:
+#   marker, sequence number as decimal ASCII (might be empty), separator, nonce, ciphertext + tag
+# Text tokens encode the last two in URL-safe Base64.
+TEXT_MARKER = '~'
+BYTES_MARKER = 0x01
+SEPARATOR = '~'
+NONCE_SIZE = 12
+
+
+def _derive_key(fernet_key: str) -> bytes:
+    # We don't reuse the Fernet key as-is, as it's not a good idea to use the same key for two algorithms
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b'flowkeeper-aes-gcm',
+    )
+    return hkdf.derive(base64.urlsafe_b64decode(fernet_key))
+
+
+def _associated_data(seq: int | None) -> bytes:
+    return b'' if seq is None else str(seq).encode('ascii')
+
+
+class AesGcmCryptograph(FernetCryptograph):
+    """Encrypts new data with AES-GCM or Fernet, depending on the settings, and decrypts both. This
+    allows mixing both formats in the same data file, and migrating from one to the other by
+    simply exporting and importing the data. AES-GCM tokens are smaller and faster to process,
+    and they carry the strategy sequence number in clear text, authenticated as associated data.
+    This way the records can be ordered without decrypting them, and the sequence number can't
+    be tampered with. It is not secret, as it only tells the position of the record in the file.
+    The token alone can't tell whether it's in the right place, so the serializers check that the
+    bound sequence matches the decrypted strategy, and the readers check that it follows the
+    previous one. The key is derived from the same (cached) PBKDF2 key as for Fernet, so
+    switching between the two is instant."""
+
+    _aesgcm: AESGCM
+    _use_gcm: bool
+
+    def __init__(self, settings: AbstractSettings):
+        super().__init__(settings)
+        self._use_gcm = settings.get(S.SOURCE_ENCRYPTION_CIPHER) == 'aes-gcm'
+
+    def _create_fernet(self, key: bytes) -> Fernet:
+        fernet = super()._create_fernet(key)
+        self._aesgcm = AESGCM(_derive_key(key.decode('utf-8')))
+        return fernet
+
+    def _on_setting_changed(self, event: str, old_values: dict[str, str], new_values: dict[str, str]):
+        super()._on_setting_changed(event, old_values, new_values)
+        if S.SOURCE_ENCRYPTION_CIPHER in new_values:
+            self._use_gcm = new_values[S.SOURCE_ENCRYPTION_CIPHER] == 'aes-gcm'
+
+    def _encrypt_gcm(self, b: bytes, seq: int | None) -> tuple[bytes, bytes]:
+        self._wait_for_key()
+        nonce = os.urandom(NONCE_SIZE)
+        prefix = _associated_data(seq)
+        return prefix, nonce + self._aesgcm.encrypt(nonce, b, prefix)
+
+    def _decrypt_gcm(self, prefix: bytes, payload: bytes) -> bytes:
+        if len(prefix) > 0 and not prefix.isdigit():
+            raise Exception(f'Invalid sequence number in the encrypted data: {prefix}')
+        self._wait_for_key()
+        return self._aesgcm.decrypt(payload[:NONCE_SIZE], payload[NONCE_SIZE:], prefix)
+
+    def get_bound_sequence(self, token: str | bytes | memoryview) -> int | None:
+        if isinstance(token, str):
+            if not token.startswith(TEXT_MARKER):
+                return None
+            prefix, separator, _ = token[1:].partition(SEPARATOR)
+        else:
+            if len(token) == 0 or token[0] != BYTES_MARKER:
+                return None
+            # The prefix is short, so we don't need to copy the entire token to find it
+            prefix, separator, _ = bytes(token[1:32]).decode('ascii', 'replace').partition(SEPARATOR)
+        if separator == '' or not prefix.isascii() or not prefix.isdigit():
+            return None
+        return int(prefix)
+
+    def encrypt(self, s: str, seq: int | None = None) -> str:
+        if not self._use_gcm:
+            return super().encrypt(s, seq)
+        prefix, payload = self._encrypt_gcm(s.encode('utf-8'), seq)
+        return f'{TEXT_MARKER}{prefix.decode("ascii")}{SEPARATOR}{base64.urlsafe_b64encode(payload).decode("ascii")}'
+
+    def decrypt(self, s: str) -> str:
+        if not s.startswith(TEXT_MARKER):
+            return super().decrypt(s)
+        prefix, separator, payload = s[1:].partition(SEPARATOR)
+        if separator == '':
+            raise Exception('Invalid AES-GCM token')
+        return self._decrypt_gcm(prefix.encode('ascii'), base64.urlsafe_b64decode(payload)).decode('utf-8')
+
+    def encrypt_bytes(self, b: bytes, seq: int | None = None) -> bytes:
+        if not self._use_gcm:
+            return super().encrypt_bytes(b, seq)
+        prefix, payload = self._encrypt_gcm(b, seq)
+        return bytes([BYTES_MARKER]) + prefix + SEPARATOR.encode('ascii') + payload
+
+    def decrypt_bytes(self, b: bytes) -> bytes:
+        if len(b) == 0 or b[0] != BYTES_MARKER:
+            return super().decrypt_bytes(b)
+        b = bytes(b)
+        end = b.find(SEPARATOR.encode('ascii'), 1)
+        if end < 0:
+            raise Exception('Invalid AES-GCM token')
+        return self._decrypt_gcm(b[1:end], b[end + 1:])
@@ -0,0 +1,176 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Callable, BinaryIO
+
+logger = logging.getLogger(__name__)
+
+FSYNC_NONE = 'none'             # Leave it to the OS
+FSYNC_BATCH = 'batch'           # fsync() once per group of strategies written together
+FSYNC_STRATEGY = 'strategy'     # fsync() after every strategy
+
+
+class AppendWriter:
+    """Keeps the data file open for appending and coalesces the records appended
+    within a short window into a single write. After each write it reports the
+    range of bytes it wrote, so that the owner can tell its own changes apart
+    from the ones made by other processes. When the window expires, the write is
+    scheduled via the owner's callback invoker, so that it happens on the same
+    thread as everything else, and the errors are reported to the owner."""
+
+    _filename: str
+    _fsync: str
+    _window: float
+    _file: BinaryIO | None
+    _pending: list[bytes]
+    _truncate_to: int | None    # Where the last complete record ends, if a failed write left a torn one after it
+    _lock: threading.RLock
+    _timer: threading.Timer | None
+    _on_written: Callable[[int, int, list[bytes]], None]
+    _on_error: Callable[[Exception], None] | None
+    _invoker: Callable
+
+    def __init__(self,
+                 filename: str,
+                 fsync: str,
+                 window_ms: int,
+                 on_written: Callable[[int, int, list[bytes]], None],
+                 on_error: Callable[[Exception], None] | None = None,
+                 invoker: Callable = None,
+                 lock: threading.RLock | None = None):
+        if fsync not in (FSYNC_NONE, FSYNC_BATCH, FSYNC_STRATEGY):
+            raise Exception(f'Unknown fsync policy: {fsync}')
+        self._filename = filename
+        self._fsync = fsync
+        self._window = window_ms / 1000
+        self._file = None
+        self._pending = list()
+        self._truncate_to = None
+        # The owner may share its lock with us, so that its own state is safe to modify from on_written
+        self._lock = lock if lock is not None else threading.RLock()
+        self._timer = None
+        self._on_written = on_written
+        self._on_error = on_error
+        self._invoker = invoker if invoker is not None else (lambda fn, **kwargs: fn(**kwargs))
+
+    def append(self, records: list[bytes]) -> None:
+        with self._lock:
+            self._pending.extend(records)
+            if self._window <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._window, self._invoker, [self._flush_deferred])
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _open(self) -> BinaryIO:
+        if self._file is not None:
+            # Sync tools often replace the file instead of appending to it. In this case we
+            # must not keep writing into the old one, which is not visible anymore.
+            try:
+                if os.fstat(self._file.fileno()).st_ino == os.stat(self._filename).st_ino:
+                    return self._file
+            except FileNotFoundError:
+                pass
+            logger.info(f'Data file {self._filename} was replaced, will reopen it')
+            self._file.close()
+            self._truncate_to = None    # The torn record went away with the old file
+        # Unbuffered, so that we know how many bytes made it into the file if a write fails
+        self._file = open(self._filename, 'ab', buffering=0)
+        return self._file
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if len(self._pending) == 0:
+                return
+            records = self._pending
+            self._pending = list()
+
+            # If this fails, the exception goes to whoever called flush(). The records, which didn't
+            # make it into the file completely, stay pending, so that the next flush() retries them.
+            f = None
+            start = None
+            done = 0
+            try:
+                f = self._open()
+                if self._truncate_to is not None:
+                    # UC-3: File event source never leaves a partially written record in the data file, so that a retry doesn't follow a torn line
+                    os.ftruncate(f.fileno(), self._truncate_to)
+                    self._truncate_to = None
+                start = os.fstat(f.fileno()).st_size
+                for chunk in records if self._fsync == FSYNC_STRATEGY else [b''.join(records)]:
+                    view = memoryview(chunk)
+                    while len(view) > 0:
+                        n = f.write(view)
+                        done += n
+                        view = view[n:]
+                    if self._fsync == FSYNC_STRATEGY:
+                        os.fsync(f.fileno())
+                if self._fsync == FSYNC_BATCH:
+                    os.fsync(f.fileno())
+            except Exception:
+                self._keep_unwritten(records, f, start, done)
+                raise
+            end = start + done
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f'Appended {len(records)} record(s) to {self._filename} at {start}-{end}')
+            self._on_written(start, end, records)
+
+    def _keep_unwritten(self, records: list[bytes], f: BinaryIO | None, start: int | None, done: int) -> None:
+        # Called when we wrote the first "done" bytes of the records, and then failed
+        complete = 0
+        size = 0
+        for r in records:
+            if size + len(r) > done:
+                break
+            size += len(r)
+            complete += 1
+        self._pending[0:0] = records[complete:]
+        if done > size:
+            # We'll write the torn record again in full, so it has to go. If we can't truncate
+            # the file now, we'll try again before the next write.
+            self._truncate_to = start + size
+            try:
+                os.ftruncate(f.fileno(), self._truncate_to)
+                self._truncate_to = None
+            except Exception as ex:
+                logger.error(f'Cannot truncate {self._filename} to {self._truncate_to}', exc_info=ex)
+        if complete > 0:
+            self._on_written(start, start + size, records[:complete])
+
+    def _flush_deferred(self) -> None:
+        # Called via the invoker once the group commit window expires, i.e. not from any of the
+        # owner's calls, which could otherwise catch the exception
+        try:
+            self.flush()
+        except Exception as ex:
+            if self._on_error is None:
+                raise
+            self._on_error(ex)
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -24,8 +24,12 @@ from fk.core.workitem import Workitem
 
 
 class Backlog(AbstractDataContainer[Workitem, 'User']):
-    """Backlog is a named list of workitems, belonging to a User."""
+    """Backlog is a named list of workitems, belonging to a User. Old backlogs might be archived, i.e. keep
+    their workitems compressed in memory. They are inflated transparently the first time somebody accesses them.
+    The old backlogs, which weren't modified since, are archived again after the next maintenance or bulk load.
+    It can't happen earlier, as the UI and the stats keep references to their workitems."""
     _date_work_started: datetime.datetime | None
+    _archive: 'BacklogArchive | None'
 
     def __init__(self,
                  name: str,
@@ -34,11 +38,81 @@ class Backlog(AbstractDataContainer[Workitem, 'User']):
                  create_date: datetime.datetime):
         super().__init__(name=name, parent=user, uid=uid, create_date=create_date)
         self._date_work_started = None
+        self._archive = None
 
     def __str__(self):
         return f'Backlog "{self._name}"'
 
+    def is_archived(self) -> bool:
+        return self._archive is not None
+
+    def get_archived_uids(self) -> Iterable[str]:
+        return self._archive.get_uids() if self._archive is not None else ()
+
+    def inflate(self) -> None:
+        if self._archive is not None:
+            archive = self._archive
+            self._archive = None
+            archive.inflate(self)
+
+    def __getitem__(self, uid: str) -> Workitem:
+        self.inflate()
+        return super().__getitem__(uid)
+
+    def __contains__(self, uid: str):
+        # Strategies check it on every backlog to find their workitem, so it must not inflate anything
+        if self._archive is not None:
+            return self._archive.contains(uid)
+        return super().__contains__(uid)
+
+    def __setitem__(self, uid: str, value: Workitem):
+        self.inflate()
+        super().__setitem__(uid, value)
+
+    def __delitem__(self, uid: str):
+        self.inflate()
+        super().__delitem__(uid)
+
+    def __iter__(self) -> Iterable[str]:
+        self.inflate()
+        return super().__iter__()
+
+    def __len__(self):
+        if self._archive is not None:
+            return len(self._archive)
+        return super().__len__()
+
+    def values(self) -> list[Workitem]:
+        self.inflate()
+        return super().values()
+
+    def first(self) -> Workitem:
+        self.inflate()
+        return super().first()
+
+    def keys(self) -> Iterable[str]:
+        self.inflate()
+        return super().keys()
+
+    def move_child(self, child: Workitem, index_to: int) -> None:
+        self.inflate()
+        super().move_child(child, index_to)
+
+    def get(self, key: str, default: Workitem = None) -> Workitem:
+        self.inflate()
+        return super().get(key, default)
+
+    def summarize_workitems(self) -> Iterable[Tuple[str, str, bool]]:
+        # Returns (uid, name, is_sealed) for each workitem, without inflating the archived backlogs
+        if self._archive is not None:
+            yield from self._archive.summarize()
+        else:
+            for workitem in super().values():
+                yield workitem.get_uid(), workitem.get_name(), workitem.is_sealed()
+
     def get_running_workitem(self) -> Tuple[Workitem, Pomodoro] | Tuple[None, None]:
+        if self._archive is not None:
+            return None, None   # We never archive backlogs with running pomodoros
         for workitem in self.values():
             for pomodoro in workitem.values():
                 if pomodoro.is_running():
@@ -29,6 +29,7 @@ from fk.core.workitem_strategies import DeleteWorkitemStrategy
 # CreateBacklog("123-456-789", "The first backlog")
 @strategy
 class CreateBacklogStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_backlog_uid', '_backlog_name')
     _backlog_uid: str
     _backlog_name: str
 
@@ -70,6 +71,7 @@ class CreateBacklogStrategy(AbstractStrategy[Tenant]):
 # DeleteBacklog("123-456-789", "")
 @strategy
 class DeleteBacklogStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_backlog_uid',)
     _backlog_uid: str
 
     def get_backlog_uid(self) -> str:
@@ -122,6 +124,7 @@ class DeleteBacklogStrategy(AbstractStrategy[Tenant]):
 # RenameBacklog("123-456-789", "New name")
 @strategy
 class RenameBacklogStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_backlog_uid', '_backlog_new_name')
     _backlog_uid: str
     _backlog_new_name: str
 
@@ -166,6 +169,7 @@ class RenameBacklogStrategy(AbstractStrategy[Tenant]):
 # ReorderBacklog("123-456-789", "0")
 @strategy
 class ReorderBacklogStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_backlog_uid', '_new_index')
     _backlog_uid: str
     _new_index: int
 
@@ -0,0 +1,415 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+import datetime
+import logging
+import mmap
+from typing import TypeVar, BinaryIO
+
+from fk.core.abstract_cryptograph import AbstractCryptograph
+from fk.core.abstract_serializer import AbstractSerializer
+from fk.core.abstract_settings import AbstractSettings
+from fk.core.abstract_strategy import AbstractStrategy
+from fk.core.simple_serializer import SimpleSerializer
+from fk.core.strategy_factory import STRATEGIES
+
+logger = logging.getLogger(__name__)
+TRoot = TypeVar('TRoot')
+
+# Text files can't start with a zero byte, so this is enough to tell the formats apart
+BINARY_HEADER = b'\x00FKLOG1\n'
+
+RECORD_PLAIN = 1
+RECORD_ENCRYPTED = 2
+RECORD_BLOCK = 3
+
+# Those IDs are stored in the files, so they must never change. New strategies should get new
+# IDs at the end. The strategies which are not listed here are stored with ID 0 and their name.
+STRATEGY_IDS: dict[str, int] = {
+    'CreateUser': 1,
+    'DeleteUser': 2,
+    'RenameUser': 3,
+    'CreateBacklog': 4,
+    'DeleteBacklog': 5,
+    'RenameBacklog': 6,
+    'ReorderBacklog': 7,
+    'CreateWorkitem': 8,
+    'DeleteWorkitem': 9,
+    'RenameWorkitem': 10,
+    'CompleteWorkitem': 11,
+    'RestoreWorkitem': 12,
+    'ReorderWorkitem': 13,
+    'MoveWorkitem': 14,
+    'UpdateWorkitemCategories': 15,
+    'AddPomodoro': 16,
+    'RemovePomodoro': 17,
+    'AddInterruption': 18,
+    'StartWork': 19,
+    'StartTimer': 20,
+    'StopTimer': 21,
+    'VoidPomodoro': 22,
+    'FinishTracking': 23,
+    'CreateCategory': 24,
+    'DeleteCategory': 25,
+    'RenameCategory': 26,
+    'ReorderCategory': 27,
+}
+STRATEGY_NAMES: dict[int, str] = {v: k for k, v in STRATEGY_IDS.items()}
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    if value < 0:
+        raise Exception(f'Negative varint: {value}')
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(buffer: bytes | memoryview | mmap.mmap, pos: int) -> tuple[int, int]:
+    # Returns the value and the position right after it. Raises IndexError if the buffer ends too early.
+    result = 0
+    shift = 0
+    while True:
+        b = buffer[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _write_string(out: bytearray, s: str) -> None:
+    b = s.encode('utf-8')
+    write_varint(out, len(b))
+    out.extend(b)
+
+
+def _read_string(buffer: bytes | memoryview, pos: int) -> tuple[str, int]:
+    length, pos = read_varint(buffer, pos)
+    end = pos + length
+    if end > len(buffer):
+        raise Exception(f'String at {pos} is longer than the record')
+    return str(buffer[pos:end], 'utf-8'), end
+
+
+class BinarySerializer(AbstractSerializer[bytes, TRoot]):
+    """Stores each strategy as a length-prefixed record:
+
+    * Record type -- plain, encrypted or a block (1 byte),
+    * Strategy type ID from STRATEGY_IDS (varint), or 0 followed by the strategy name,
+    * Sequence number (varint),
+    * Timestamp in microseconds since epoch (zigzag varint) and UTC offset in seconds (zigzag varint),
+    * User ID (varint, see below),
+    * Number of parameters (varint), followed by the UTF-8 parameters, each prefixed with its length.
+
+    User identities are interned. The first time a user appears in a file, its ID is followed by the
+    identity itself, and all subsequent records refer to it by ID only. The lowest bit of the stored
+    value tells those two cases apart. Encrypted records always carry the identity inline, as they
+    can't define anything for the plain records, which follow them.
+
+    A block is an encrypted sequence of length-prefixed plain records, which carry the identities
+    inline for the same reason."""
+
+    _identities: dict[int, str]
+    _ids: dict[str, int]
+
+    def __init__(self, settings: AbstractSettings, cryptograph: AbstractCryptograph):
+        super().__init__(settings, cryptograph)
+        self._identities = dict()
+        self._ids = dict()
+
+    def get_header(self) -> bytes:
+        return BINARY_HEADER
+
+    def _define_user(self, user_id: int, identity: str) -> None:
+        # Another process might have appended to the same file, redefining this ID
+        old = self._identities.get(user_id)
+        if old is not None and self._ids.get(old) == user_id:
+            del self._ids[old]
+        self._identities[user_id] = identity
+        self._ids[identity] = user_id
+
+    def _encode(self, s: AbstractStrategy, out: bytearray, intern: bool) -> None:
+        name = s.get_name()
+        type_id = STRATEGY_IDS.get(name, 0)
+        write_varint(out, type_id)
+        if type_id == 0:
+            _write_string(out, name)
+
+        write_varint(out, s.get_sequence())
+
+        when = s.get_when()
+        if when is None or when.tzinfo is None:
+            raise Exception(f'Strategy {s} must have a timezone-aware timestamp to be stored in a binary file')
+        delta = when - EPOCH
+        write_varint(out, _zigzag((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds))
+        write_varint(out, _zigzag(int(when.utcoffset().total_seconds())))
+
+        identity = s.get_user_identity()
+        user_id = self._ids.get(identity) if intern else 0
+        if user_id is not None:
+            write_varint(out, user_id << 1)
+        else:
+            user_id = max(self._identities.keys(), default=0) + 1
+            self._define_user(user_id, identity)
+            write_varint(out, (user_id << 1) | 1)
+            _write_string(out, identity)
+        if user_id == 0:
+            _write_string(out, identity)
+
+        params = s.get_params()
+        write_varint(out, len(params))
+        for p in params:
+            _write_string(out, p)
+
+    def serialize(self, s: AbstractStrategy) -> bytes:
+        out = bytearray()
+        if self._cryptograph.enabled and s.encryptable():
+            out.append(RECORD_ENCRYPTED)
+            inner = bytearray()
+            self._encode(s, inner, False)
+            out.extend(self._cryptograph.encrypt_bytes(bytes(inner), s.get_sequence()))
+        else:
+            out.append(RECORD_PLAIN)
+            self._encode(s, out, True)
+        return bytes(out)
+
+    def serialize_block(self, strategies: list[AbstractStrategy]) -> bytes:
+        # UC-2: Strategies can be encrypted in blocks, which contain plain records with users inline
+        inner = bytearray()
+        for s in strategies:
+            record = bytearray([RECORD_PLAIN])
+            self._encode(s, record, False)
+            inner.extend(self.to_record(bytes(record)))
+        return bytes([RECORD_BLOCK]) + self._cryptograph.encrypt_bytes(bytes(inner), strategies[0].get_sequence())
+
+    def split_block(self, t: bytes | memoryview) -> list[bytes] | None:
+        if len(t) == 0 or t[0] != RECORD_BLOCK:
+            return None
+        plaintext = self._cryptograph.decrypt_bytes(t[1:])
+        records = list()
+        pos = 0
+        while pos < len(plaintext):
+            end = self.find_record_end(plaintext, pos, True)
+            if end < 0:
+                raise Exception(f'Truncated record in the block at {pos}')
+            records.append(self.from_record(plaintext, pos, end))
+            pos = end
+        bound = self._cryptograph.get_bound_sequence(t[1:])
+        if bound is not None and (len(records) == 0 or self.parse(records[0])[0] != bound):
+            raise Exception(f'Encrypted block is bound to sequence {bound}, but starts with another one')
+        return records
+
+    def get_bound_sequence(self, t: bytes | memoryview) -> int | None:
+        if len(t) == 0 or t[0] != RECORD_ENCRYPTED:
+            return None
+        return self._cryptograph.get_bound_sequence(t[1:])
+
+    @staticmethod
+    def _decode_name(buffer: bytes | memoryview, pos: int) -> tuple[str, int]:
+        type_id, pos = read_varint(buffer, pos)
+        if type_id == 0:
+            return _read_string(buffer, pos)
+        elif type_id in STRATEGY_NAMES:
+            return STRATEGY_NAMES[type_id], pos
+        else:
+            raise Exception(f'Unknown strategy type: {type_id}')
+
+    @staticmethod
+    def _read_user(buffer: bytes | memoryview, pos: int) -> tuple[int, str | None, int]:
+        # Returns the user ID, and the identity if it's defined in this record
+        user_ref, pos = read_varint(buffer, pos)
+        user_id = user_ref >> 1
+        if user_ref & 1 or user_id == 0:
+            user, pos = _read_string(buffer, pos)
+            return user_id, user, pos
+        return user_id, None, pos
+
+    def _resolve_user(self, user_id: int, identity: str | None, intern: bool) -> str:
+        if identity is not None:
+            if user_id != 0 and intern:
+                self._define_user(user_id, identity)
+            return identity
+        elif user_id in self._identities:
+            return self._identities[user_id]
+        else:
+            raise Exception(f'Unknown user ID: {user_id}')
+
+    def _decode_user(self, buffer: bytes | memoryview, pos: int, intern: bool) -> tuple[str, int]:
+        user_id, identity, pos = self._read_user(buffer, pos)
+        return self._resolve_user(user_id, identity, intern), pos
+
+    def _parse_body(self, buffer: bytes | memoryview, pos: int, intern: bool) -> tuple:
+        # Everything except resolving the interned user, which depends on the previous records
+        name, pos = self._decode_name(buffer, pos)
+        if name not in STRATEGIES:
+            raise Exception(f'Unknown strategy: {name}')
+
+        seq, pos = read_varint(buffer, pos)
+        micros, pos = read_varint(buffer, pos)
+        offset, pos = read_varint(buffer, pos)
+        tz = datetime.timezone(datetime.timedelta(seconds=_unzigzag(offset)))
+        when = (EPOCH + datetime.timedelta(microseconds=_unzigzag(micros))).astimezone(tz)
+
+        user_id, identity, pos = self._read_user(buffer, pos)
+
+        count, pos = read_varint(buffer, pos)
+        params = list()
+        for i in range(count):
+            p, pos = _read_string(buffer, pos)
+            params.append(p)
+        if pos != len(buffer):
+            raise Exception(f'Unexpected {len(buffer) - pos} bytes at the end of the record')
+
+        return seq, when, (user_id, identity, intern), name, params
+
+    def deserialize(self, t: bytes | memoryview) -> AbstractStrategy[TRoot] | None:
+        return self.build(self.parse(t))
+
+    def parse(self, t: bytes | memoryview) -> tuple | None:
+        if len(t) == 0:
+            return None
+        try:
+            if t[0] == RECORD_PLAIN:
+                return self._parse_body(t, 1, True)
+            elif t[0] == RECORD_ENCRYPTED:
+                return self._parse_authenticated(t, self._cryptograph.decrypt_bytes(t[1:]))
+            elif t[0] == RECORD_BLOCK:
+                # Blocks are split while reading, so we can only get here if we couldn't decrypt it
+                self.split_block(t)
+                raise Exception(f'Unexpected block of strategies')
+        except IndexError:
+            raise Exception(f'Truncated record: {bytes(t)}')
+        raise Exception(f'Unknown record type: {t[0]}')
+
+    def _parse_batch(self, records: list[bytes | memoryview]) -> list[tuple[tuple | None, Exception | None]]:
+        # UC-2: Encrypted strategies are decrypted in batches
+        encrypted = [i for i, t in enumerate(records) if len(t) > 0 and t[0] == RECORD_ENCRYPTED]
+        decrypted = [None] * len(records)
+        if len(encrypted) > 0:
+            for i, plaintext in zip(encrypted, self._decrypt_batch(self._cryptograph.decrypt_bytes_many,
+                                                                  [records[i][1:] for i in encrypted])):
+                decrypted[i] = plaintext
+        return self._parse_each(records, decrypted)
+
+    def parse_decrypted(self, plaintext: bytes) -> tuple:
+        # Encrypted records always have the user inline
+        try:
+            return self._parse_body(plaintext, 0, False)
+        except IndexError:
+            raise Exception(f'Truncated record: {bytes(plaintext)}')
+
+    def build(self, parsed: tuple | None) -> AbstractStrategy[TRoot] | None:
+        if parsed is None:
+            return None
+        seq, when, (user_id, identity, intern), name, params = parsed
+        user = self._resolve_user(user_id, identity, intern)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Deserialized record to strategy: '{seq}' / '{when}' / '{user}' / '{name}' / {params}")
+
+        return STRATEGIES[name](seq, when, user, params, self._settings, self._cryptograph)
+
+    def peek_sequence(self, t: bytes | memoryview) -> int | None:
+        if len(t) > 0 and t[0] == RECORD_PLAIN:
+            name, pos = self._decode_name(t, 1)
+            return read_varint(t, pos)[0]
+        return super().peek_sequence(t)
+
+    def skip(self, t: bytes | memoryview) -> None:
+        # Only the plain records can define users
+        if len(t) > 0 and t[0] == RECORD_PLAIN:
+            name, pos = self._decode_name(t, 1)
+            for i in range(3):  # Sequence, timestamp and UTC offset
+                pos = read_varint(t, pos)[1]
+            self._decode_user(t, pos, True)
+
+    def to_record(self, t: bytes) -> bytes:
+        out = bytearray()
+        write_varint(out, len(t))
+        out.extend(t)
+        return bytes(out)
+
+    def find_record_end(self, buffer: bytes | mmap.mmap, start: int, eof: bool) -> int:
+        try:
+            length, pos = read_varint(buffer, start)
+        except IndexError:
+            return -1
+        end = pos + length
+        return end if end <= len(buffer) else -1
+
+    def from_record(self, buffer: bytes | memoryview, start: int, end: int) -> bytes | memoryview:
+        # When reading a memory-mapped file, this is a zero-copy slice of it
+        length, pos = read_varint(buffer, start)
+        return buffer[pos:end]
+
+    def get_state(self) -> dict | None:
+        return {'users': {str(k): v for k, v in self._identities.items()}}
+
+    def set_state(self, state: dict | None) -> None:
+        self._identities.clear()
+        self._ids.clear()
+        if state is not None:
+            for k, v in state['users'].items():
+                self._define_user(int(k), v)
+
+    def __str__(self):
+        return f'BinarySerializer with settings {self._settings} and cryptograph {self._cryptograph}'
+
+
+def create_serializer(file: BinaryIO,
+                      settings: AbstractSettings,
+                      cryptograph: AbstractCryptograph) -> AbstractSerializer:
+    # Picks the serializer by the file header, and positions the file right after it
+    header = file.read(len(BINARY_HEADER))
+    if header == BINARY_HEADER:
+        return BinarySerializer(settings, cryptograph)
+    file.seek(0)
+    return SimpleSerializer(settings, cryptograph)
+
+
+def convert_file(source_filename: str,
+                 target_filename: str,
+                 to_binary: bool,
+                 settings: AbstractSettings,
+                 cryptograph: AbstractCryptograph) -> int:
+    # Converts a data file between the text and binary formats, preserving every strategy as-is,
+    # including its sequence number and timestamp. Empty lines and comments are not preserved.
+    # Encrypted strategies are re-encrypted with the same key. Returns the number of strategies.
+    count = 0
+    with open(source_filename, 'rb') as src, open(target_filename, 'wb') as dst:
+        reader = create_serializer(src, settings, cryptograph)
+        writer = BinarySerializer(settings, cryptograph) if to_binary else SimpleSerializer(settings, cryptograph)
+        dst.write(writer.get_header())
+        for raw, record in reader.read_records(src):
+            s = reader.deserialize(record)
+            if s is not None:
+                dst.write(writer.to_record(writer.serialize(s)))
+                count += 1
+    logger.info(f'Converted {count} strategies from {source_filename} to {target_filename}')
+    return count
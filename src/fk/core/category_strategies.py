@@ -47,6 +47,7 @@ def get_custom_categories(root_category: Category) -> Iterable[Category]:
 # CreateCategory("123-456-789", "234-567-890", "Important")
 @strategy
 class CreateCategoryStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_category_uid', '_parent_uid', '_category_name')
     _category_uid: str
     _parent_uid: str
     _category_name: str
@@ -92,6 +93,7 @@ class CreateCategoryStrategy(AbstractStrategy[Tenant]):
 # DeleteCategory("123-456-789", "")
 @strategy
 class DeleteCategoryStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_category_uid',)
     _category_uid: str
 
     def __init__(self,
@@ -142,6 +144,7 @@ class DeleteCategoryStrategy(AbstractStrategy[Tenant]):
 # RenameCategory("123-456-789", "New name")
 @strategy
 class RenameCategoryStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_category_uid', '_category_new_name')
     _category_uid: str
     _category_new_name: str
 
@@ -185,6 +188,7 @@ class RenameCategoryStrategy(AbstractStrategy[Tenant]):
 # ReorderCategory("123-456-789", "0")
 @strategy
 class ReorderCategoryStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_category_uid', '_new_index')
     _category_uid: str
     _new_index: int
 
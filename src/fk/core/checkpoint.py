@@ -0,0 +1,588 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import zlib
+from os import path
+from typing import Iterable
+
+from fk.core.abstract_cryptograph import AbstractCryptograph
+from fk.core.abstract_data_container import AbstractDataContainer
+from fk.core.abstract_data_item import AbstractDataItem
+from fk.core.backlog import Backlog
+from fk.core.category import Category
+from fk.core.interruption import Interruption
+from fk.core.pomodoro import Pomodoro
+from fk.core.tag import Tag
+from fk.core.tenant import Tenant
+from fk.core.user import User
+from fk.core.workitem import Workitem, Interval, TAG_REGEX
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+# A checkpoint is a snapshot of the Tenant, taken after executing a strategy with a known sequence number.
+# It is only valid for the data file, which starts with exactly the same bytes as the file it was taken
+# from, which we verify with a SHA-256 hash of the log prefix. Everything after that prefix is replayed
+# as usual. Checkpoints are just a cache -- they can be deleted at any moment without losing any data.
+
+
+def get_checkpoint_filename(filename: str) -> str:
+    return f'{filename}-checkpoint'
+
+
+def _date(d: datetime.datetime | datetime.date | None) -> str | None:
+    return d.isoformat() if d is not None else None
+
+
+def _parse_date(s: str | None, dates: dict[str, datetime.datetime] | None = None) -> datetime.datetime | None:
+    # If the dates cache is passed, the items with the same timestamps will share the same object
+    if s is None:
+        return None
+    if dates is None:
+        return datetime.datetime.fromisoformat(s)
+    parsed = dates.get(s)
+    if parsed is None:
+        parsed = datetime.datetime.fromisoformat(s)
+        dates[s] = parsed
+    return parsed
+
+
+def _item(item: AbstractDataItem) -> dict:
+    return {
+        'uid': item.get_uid(),
+        'create_date': _date(item._create_date),
+        'last_modified_date': _date(item._last_modified_date),
+    }
+
+
+def _restore_item(item: AbstractDataItem, d: dict, dates: dict[str, datetime.datetime] | None = None) -> None:
+    item._create_date = _parse_date(d['create_date'], dates)
+    item._last_modified_date = _parse_date(d['last_modified_date'], dates)
+
+
+def _snapshot_category(category: Category, workitems: dict[Workitem, str]) -> dict:
+    d = _item(category)
+    d['name'] = category.get_name()
+    d['is_system'] = category.is_system()
+    d['info'] = category._info
+    # Uses might refer to the workitems, which were deleted together with their backlog
+    d['uses'] = [u.get_uid() for u in category.get_uses() if u in workitems]
+    d['children'] = [_snapshot_category(c, workitems) for c in category.values()]
+    return d
+
+
+def _snapshot_workitem(workitem: Workitem) -> dict:
+    d = _item(workitem)
+    d['name'] = workitem.get_name()
+    d['state'] = workitem._state
+    d['date_work_started'] = _date(workitem._date_work_started)
+    d['date_work_ended'] = _date(workitem._date_work_ended)
+    d['categories'] = [c.get_uid() for c in workitem.get_categories()]
+    d['intervals'] = [[_date(i.get_started()),
+                       _date(i.get_ended()),
+                       i.get_work_duration(),
+                       i.get_rest_duration()] for i in workitem.get_intervals()]
+    pomodoros = list()
+    for pomodoro in workitem.values():
+        p = _item(pomodoro)
+        p['name'] = pomodoro.get_name()
+        p['is_planned'] = pomodoro._is_planned
+        p['state'] = pomodoro._state
+        p['type'] = pomodoro._type
+        p['work_duration'] = pomodoro._work_duration
+        p['rest_duration'] = pomodoro._rest_duration
+        p['date_work_started'] = _date(pomodoro._date_work_started)
+        p['date_rest_started'] = _date(pomodoro._date_rest_started)
+        p['date_completed'] = _date(pomodoro._date_completed)
+        interruptions = list()
+        for interruption in pomodoro.values():
+            i = _item(interruption)
+            i['reason'] = interruption.get_reason()
+            duration = interruption.get_duration()
+            i['duration'] = duration // datetime.timedelta(microseconds=1) if duration is not None else None
+            i['void'] = interruption._void
+            interruptions.append(i)
+        p['interruptions'] = interruptions
+        pomodoros.append(p)
+    d['pomodoros'] = pomodoros
+    return d
+
+
+def _snapshot_user(user: User) -> dict:
+    d = _item(user)
+    d['name'] = user.get_name()
+    d['is_system_user'] = user.is_system_user()
+
+    backlogs = list()
+    workitems = dict[Workitem, str]()
+    for backlog in user.values():
+        b = _item(backlog)
+        b['name'] = backlog.get_name()
+        b['date_work_started'] = _date(backlog.get_start_date())
+        if backlog.is_archived():
+            # Archived workitems are already in the right format, and are restored archived, too
+            b['archived'] = True
+            b['workitems'] = backlog._archive.get_workitems()
+            backlogs.append(b)
+            continue
+        b['workitems'] = list()
+        for workitem in backlog.values():
+            b['workitems'].append(_snapshot_workitem(workitem))
+            workitems[workitem] = workitem.get_uid()
+        backlogs.append(b)
+    d['backlogs'] = backlogs
+
+    tags = user.get_tags()
+    d['tags'] = _item(tags)
+    d['tags']['values'] = list()
+    for tag in tags.values():
+        t = _item(tag)
+        t['workitems'] = [w.get_uid() for w in tag._workitems]   # Archived backlogs re-register on restore
+        d['tags']['values'].append(t)
+
+    d['root_category'] = _snapshot_category(user.get_root_category(), workitems)
+
+    timer = user.get_timer()
+    pomodoro = timer.get_running_pomodoro()
+    d['timer'] = _item(timer)
+    d['timer'].update({
+        'state': timer._state,
+        'pomodoro': pomodoro.get_uid() if pomodoro is not None else None,
+        'planned_duration': timer._planned_duration,
+        'remaining_duration': timer._remaining_duration,
+        'last_state_change': _date(timer._last_state_change),
+        'next_state_change': _date(timer._next_state_change),
+        'last_date': _date(timer._last_date),
+        'pomodoro_in_series': timer._pomodoro_in_series,
+    })
+    return d
+
+
+def snapshot_tenant(tenant: Tenant) -> dict:
+    # This must be called on the thread which executes strategies, as it walks the
+    # live data. The result is a plain dict, which can be serialized anywhere.
+    d = _item(tenant)
+    d['users'] = [_snapshot_user(user) for user in tenant.values()]
+    return d
+
+
+def _restore_category(d: dict,
+                      parent: Category | User,
+                      workitems: dict[str, Workitem],
+                      categories: dict[str, Category]) -> Category:
+    category = Category(d['name'], d['uid'], d['is_system'], d['info'], parent, None)
+    _restore_item(category, d)
+    for uid in d['uses']:
+        if uid in workitems:
+            category.add_usage(workitems[uid])
+    categories[category.get_uid()] = category
+    for c in d['children']:
+        child = _restore_category(c, category, workitems, categories)
+        category[child.get_uid()] = child
+    return category
+
+
+def _restore_workitem(d: dict, backlog: Backlog, pomodoros: dict[str, Pomodoro]) -> Workitem:
+    # The pomodoros, their intervals and interruptions have lots of timestamps in common
+    dates = dict[str, datetime.datetime]()
+    workitem = Workitem(d['name'], d['uid'], backlog, None, set())
+    _restore_item(workitem, d, dates)
+    workitem._state = d['state']
+    workitem._date_work_started = _parse_date(d['date_work_started'], dates)
+    workitem._date_work_ended = _parse_date(d['date_work_ended'], dates)
+    for i in d['intervals']:
+        workitem._intervals.append(Interval(_parse_date(i[0], dates), i[2], i[3], _parse_date(i[1], dates)))
+    for p in d['pomodoros']:
+        pomodoro = Pomodoro(1,
+                            p['is_planned'],
+                            p['state'],
+                            p['work_duration'],
+                            p['rest_duration'],
+                            p['type'],
+                            p['uid'],
+                            workitem,
+                            None)
+        _restore_item(pomodoro, p, dates)
+        pomodoro.set_name(sys.intern(p['name']))
+        pomodoro._date_work_started = _parse_date(p['date_work_started'], dates)
+        pomodoro._date_rest_started = _parse_date(p['date_rest_started'], dates)
+        pomodoro._date_completed = _parse_date(p['date_completed'], dates)
+        for i in p['interruptions']:
+            duration = datetime.timedelta(microseconds=i['duration']) if i['duration'] is not None else None
+            interruption = Interruption(i['reason'], duration, i['void'], i['uid'], pomodoro, None)
+            _restore_item(interruption, i, dates)
+            pomodoro[interruption.get_uid()] = interruption
+        workitem[pomodoro.get_uid()] = pomodoro
+        pomodoros[pomodoro.get_uid()] = pomodoro
+    return workitem
+
+
+def _restore_user(d: dict, tenant: Tenant) -> User:
+    user = User(tenant, d['uid'], d['name'], _parse_date(d['create_date']), d['is_system_user'])
+    _restore_item(user, d)
+
+    workitems = dict[str, Workitem]()
+    workitem_categories = dict[str, list[str]]()
+    pomodoros = dict[str, Pomodoro]()
+    archived = list[Backlog]()
+    for b in d['backlogs']:
+        backlog = Backlog(b['name'], user, b['uid'], None)
+        _restore_item(backlog, b)
+        backlog._date_work_started = _parse_date(b['date_work_started'])
+        if b.get('archived', False):
+            backlog._archive = BacklogArchive(b['workitems'])
+            archived.append(backlog)
+            user[backlog.get_uid()] = backlog
+            continue
+        for w in b['workitems']:
+            workitem = _restore_workitem(w, backlog, pomodoros)
+            backlog[workitem.get_uid()] = workitem
+            workitems[workitem.get_uid()] = workitem
+            workitem_categories[workitem.get_uid()] = w['categories']
+        user[backlog.get_uid()] = backlog
+
+    categories = dict[str, Category]()
+    user._root_category = _restore_category(d['root_category'], user, workitems, categories)
+    for uid, category_uids in workitem_categories.items():
+        workitems[uid].set_categories(set(categories[c] for c in category_uids if c in categories))
+
+    tags = user.get_tags()
+    _restore_item(tags, d['tags'])
+    for t in d['tags']['values']:
+        tag = Tag(t['uid'], user, None)
+        _restore_item(tag, t)
+        for uid in t['workitems']:
+            if uid in workitems:
+                tag.add_workitem(workitems[uid])
+        tags[tag.get_uid()] = tag
+    for backlog in archived:
+        backlog._archive.register_tags(backlog)
+
+    t = d['timer']
+    timer = user.get_timer()
+    _restore_item(timer, t)
+    timer._uid = t['uid']
+    timer._state = t['state']
+    timer._pomodoro = pomodoros.get(t['pomodoro'], None) if t['pomodoro'] is not None else None
+    timer._planned_duration = t['planned_duration']
+    timer._remaining_duration = t['remaining_duration']
+    timer._last_state_change = _parse_date(t['last_state_change'])
+    timer._next_state_change = _parse_date(t['next_state_change'])
+    timer._last_date = datetime.date.fromisoformat(t['last_date'])
+    timer._pomodoro_in_series = t['pomodoro_in_series']
+    return user
+
+
+def restore_tenant(d: dict, tenant: Tenant) -> None:
+    # Restores the snapshot into an existing, freshly created Tenant
+    for uid in list(tenant.keys()):
+        del tenant[uid]
+    for u in d['users']:
+        user = _restore_user(u, tenant)
+        tenant[user.get_uid()] = user
+    _restore_item(tenant, d)
+
+
+class BacklogArchive:
+    """The workitems of an archived backlog, compressed in the same format as in the checkpoints. We only keep
+    what we need to answer the common questions without inflating the backlog, i.e. the workitem UIDs
+    and the tags they use. Archived workitems are not referenced from their categories or tags -- the tags
+    reference the archived backlog instead."""
+    _blob: bytes
+    _uids: frozenset[str]
+    _tags: frozenset[str]
+
+    def __init__(self, workitems: list[dict]):
+        self._blob = zlib.compress(json.dumps(workitems, separators=(',', ':')).encode('utf-8'))
+        self._uids = frozenset(w['uid'] for w in workitems)
+        self._tags = frozenset(t.group(1).lower() for w in workitems for t in TAG_REGEX.finditer(w['name']))
+
+    def __len__(self):
+        return len(self._uids)
+
+    def contains(self, uid: str) -> bool:
+        return uid in self._uids
+
+    def get_uids(self) -> frozenset[str]:
+        return self._uids
+
+    def get_workitems(self) -> list[dict]:
+        return json.loads(zlib.decompress(self._blob))
+
+    def summarize(self) -> Iterable[tuple[str, str, bool]]:
+        for w in self.get_workitems():
+            yield w['uid'], w['name'], w['state'] in ('finished', 'canceled')
+
+    def register_tags(self, backlog: Backlog) -> None:
+        tags = backlog.get_owner().get_tags()
+        for name in self._tags:
+            if name in tags:
+                tags[name].add_archived(backlog)
+
+    def inflate(self, backlog: Backlog) -> None:
+        # The backlog has already forgotten about this archive, so we can fill it in via the base class
+        user: User = backlog.get_owner()
+        categories = dict[str, Category]()
+        _collect_categories(user.get_root_category(), categories)
+        tags = user.get_tags()
+        pomodoros = dict[str, Pomodoro]()
+        for w in self.get_workitems():
+            workitem = _restore_workitem(w, backlog, pomodoros)
+            workitem.set_categories(set(categories[c] for c in w['categories'] if c in categories))
+            for category in workitem.get_categories():
+                category.add_usage(workitem)
+            for name in workitem.get_tags():
+                if name in tags:
+                    tags[name].add_workitem(workitem)
+            AbstractDataContainer.__setitem__(backlog, workitem.get_uid(), workitem)
+        for name in self._tags:
+            if name in tags:
+                tags[name].remove_archived(backlog)
+        logger.debug(f'Inflated {backlog} with {len(self._uids)} workitems')
+
+
+def _collect_categories(category: Category, categories: dict[str, Category]) -> None:
+    categories[category.get_uid()] = category
+    for child in category.values():
+        _collect_categories(child, categories)
+
+
+def archive_backlog(backlog: Backlog) -> bool:
+    # Returns False if the backlog can't be archived, e.g. because the timer is running for one of its workitems
+    if backlog.is_archived() or len(backlog) == 0:
+        return False
+    user: User = backlog.get_owner()
+    running = user.get_timer().get_running_workitem()
+    if (running is not None and running.get_parent() == backlog) or backlog.get_running_workitem()[0] is not None:
+        return False
+    tags = user.get_tags()
+    workitems = list()
+    for workitem in backlog.values():
+        workitems.append(_snapshot_workitem(workitem))
+        for category in workitem.get_categories():
+            if workitem in category.get_uses():
+                category.remove_usage(workitem)
+        for name in workitem.get_tags():
+            if name in tags and tags[name].has_workitem(workitem):
+                tags[name].remove_workitem(workitem)
+    backlog._archive = BacklogArchive(workitems)
+    backlog._archive.register_tags(backlog)
+    backlog._reset_children()
+    index = backlog.get_uid_index()
+    if index is not None:
+        index.add_archived(backlog)
+    return True
+
+
+def archive_old_backlogs(tenant: Tenant, older_than: datetime.datetime) -> int:
+    # UC-3: Backlogs which weren't modified since the specified date are archived, i.e. compressed in memory until somebody accesses them
+    archived = 0
+    for user in tenant.values():
+        for backlog in user.values():
+            last_modified = backlog.get_last_modified_date()
+            if last_modified is not None and last_modified < older_than and archive_backlog(backlog):
+                archived += 1
+    return archived
+
+
+def hash_file_prefix(filename: str, size: int) -> 'hashlib._Hash':
+    h = hashlib.sha256()
+    remaining = size
+    with open(filename, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            h.update(chunk)
+            remaining -= len(chunk)
+    if remaining > 0:
+        raise Exception(f'File {filename} is shorter than {size} bytes')
+    return h
+
+
+class Checkpoint:
+    # What the checkpoint covers -- the first "offset" bytes of the data file
+    last_seq: int
+    offset: int
+    prefix_hash: str
+    count: int
+    last_strategy: str | None
+    tenant: dict
+    serializer_state: dict | None   # Needed to continue reading binary files from the offset
+    segment: int                    # The index of the data file segment, which the offset belongs to
+
+    def __init__(self,
+                 last_seq: int,
+                 offset: int,
+                 prefix_hash: str,
+                 count: int,
+                 last_strategy: str | None,
+                 tenant: dict,
+                 serializer_state: dict | None = None,
+                 segment: int = 0):
+        self.last_seq = last_seq
+        self.offset = offset
+        self.prefix_hash = prefix_hash
+        self.count = count
+        self.last_strategy = last_strategy
+        self.tenant = tenant
+        self.serializer_state = serializer_state
+        self.segment = segment
+
+    def __str__(self):
+        return f'Checkpoint at seq {self.last_seq}, segment {self.segment}, offset {self.offset}'
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'version': CHECKPOINT_VERSION,
+            'last_seq': self.last_seq,
+            'offset': self.offset,
+            'prefix_hash': self.prefix_hash,
+            'count': self.count,
+            'last_strategy': self.last_strategy,
+            'tenant': self.tenant,
+            'serializer_state': self.serializer_state,
+            'segment': self.segment,
+        })
+
+    @staticmethod
+    def from_json(s: str) -> Checkpoint:
+        d = json.loads(s)
+        if d['version'] != CHECKPOINT_VERSION:
+            raise Exception(f'Unsupported checkpoint version {d["version"]}')
+        return Checkpoint(d['last_seq'],
+                          d['offset'],
+                          d['prefix_hash'],
+                          d['count'],
+                          d['last_strategy'],
+                          d['tenant'],
+                          d.get('serializer_state'),
+                          d.get('segment', 0))
+
+    def verify(self, filename: str) -> 'hashlib._Hash | None':
+        # UC-3: A checkpoint is only used if the data file starts with exactly the same content as it was taken from
+        # Returns the hash of the prefix, so that the caller can keep updating it with the rest of the file
+        try:
+            if path.getsize(filename) >= self.offset:
+                h = hash_file_prefix(filename, self.offset)
+                if h.hexdigest() == self.prefix_hash:
+                    return h
+        except Exception as ex:
+            logger.warning(f'Cannot verify checkpoint for {filename}', exc_info=ex)
+        return None
+
+
+def load_checkpoint(filename: str,
+                    cryptograph: AbstractCryptograph,
+                    segments: list[str] | None = None) -> tuple[Checkpoint, 'hashlib._Hash'] | tuple[None, None]:
+    # Returns (None, None) if there's no checkpoint, or if it is unreadable / doesn't match the data file.
+    # Invalid checkpoints are deleted, so that we don't attempt to read them again next time. For the
+    # segmented data files, the checkpoint is verified against the segment it was taken in.
+    if segments is None:
+        segments = [filename]
+    checkpoint_filename = get_checkpoint_filename(filename)
+    if not path.isfile(checkpoint_filename):
+        return None, None
+    try:
+        with open(checkpoint_filename, encoding='UTF-8') as f:
+            content = f.read()
+        if content.startswith('+'):
+            content = cryptograph.decrypt(content[1:])
+        checkpoint = Checkpoint.from_json(content)
+        prefix_hash = checkpoint.verify(segments[checkpoint.segment]) \
+            if checkpoint.segment < len(segments) else None
+        if prefix_hash is not None:
+            logger.info(f'Loaded {checkpoint} for {filename}')
+            return checkpoint, prefix_hash
+        logger.info(f'Discarding checkpoint {checkpoint_filename}, as it does not match the data file')
+    except Exception as ex:
+        logger.warning(f'Discarding invalid checkpoint {checkpoint_filename}', exc_info=ex)
+    delete_checkpoint(filename)
+    return None, None
+
+
+def delete_checkpoint(filename: str) -> None:
+    checkpoint_filename = get_checkpoint_filename(filename)
+    if path.isfile(checkpoint_filename):
+        try:
+            os.unlink(checkpoint_filename)
+        except Exception as ex:
+            logger.warning(f'Cannot delete checkpoint {checkpoint_filename}', exc_info=ex)
+
+
+class CheckpointWriter:
+    # Serializes, encrypts and writes checkpoints on a background thread. Only one checkpoint
+    # is written at a time -- if we get a new one while the previous is still being written,
+    # then the newer one wins once the thread is done.
+    _filename: str
+    _cryptograph: AbstractCryptograph
+    _lock: threading.Lock
+    _pending: Checkpoint | None
+    _thread: threading.Thread | None
+
+    def __init__(self, filename: str, cryptograph: AbstractCryptograph):
+        self._filename = filename
+        self._cryptograph = cryptograph
+        self._lock = threading.Lock()
+        self._pending = None
+        self._thread = None
+
+    def write(self, checkpoint: Checkpoint) -> None:
+        with self._lock:
+            self._pending = checkpoint
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='CheckpointWriter', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                checkpoint = self._pending
+                self._pending = None
+                if checkpoint is None:
+                    self._thread = None
+                    return
+            try:
+                self._write_now(checkpoint)
+            except Exception as ex:
+                logger.warning(f'Failed to write checkpoint for {self._filename}', exc_info=ex)
+
+    def _write_now(self, checkpoint: Checkpoint) -> None:
+        content = checkpoint.to_json()
+        if self._cryptograph.enabled:
+            content = '+' + self._cryptograph.encrypt(content)
+        checkpoint_filename = get_checkpoint_filename(self._filename)
+        # Write to a temporary file first, so that we never end up with a half-written checkpoint
+        temp_filename = f'{checkpoint_filename}-tmp'
+        with open(temp_filename, 'w', encoding='UTF-8') as f:
+            f.write(content)
+        os.replace(temp_filename, checkpoint_filename)
+        logger.debug(f'Saved {checkpoint} to {checkpoint_filename}')
+
+    def wait(self) -> None:
+        thread = self._thread
+        if thread is not None:
+            thread.join()
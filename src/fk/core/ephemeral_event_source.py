@@ -48,7 +48,7 @@ class EphemeralEventSource(AbstractEventSource[TRoot]):
         logger.debug(f'Ephemeral event source -- starting. Muting events -- {mute_events}')
         self._emit(events.SourceMessagesRequested, dict())
         if mute_events:
-            self.mute()
+            self._start_bulk_load()
 
         # UC-3: Ephemeral source always starts with a CreateUser strategy, based on the username from the settings
         strategy = self.get_init_strategy(self._emit)
@@ -56,7 +56,7 @@ class EphemeralEventSource(AbstractEventSource[TRoot]):
         self.execute_prepared_strategy(strategy)
 
         if mute_events:
-            self.unmute()
+            self._finish_bulk_load()
         self._emit(events.SourceMessagesProcessed, {'source': self})
 
     def _append(self, strategies: list[AbstractStrategy[TRoot]]) -> None:
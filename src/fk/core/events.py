@@ -101,6 +101,9 @@ AfterTenantCreate = "AfterTenantCreate"
 WentOnline = "WentOnline"
 WentOffline = "WentOffline"
 
+KeyDerivationProgress = "KeyDerivationProgress"
+KeyDerivationComplete = "KeyDerivationComplete"
+
 TimerWorkStart = "TimerWorkStart"
 TimerWorkComplete = "TimerWorkComplete"
 TimerRestComplete = "TimerRestComplete"
@@ -15,54 +15,215 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import base64
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
 
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+from fk.core import events
 from fk.core.abstract_cryptograph import AbstractCryptograph
+from fk.core.abstract_event_emitter import AbstractEventEmitter
 from fk.core.abstract_settings import AbstractSettings, S
 
 logger = logging.getLogger(__name__)
+T = TypeVar('T')
 
+# Smaller batches are decrypted on the calling thread, as it's not worth the overhead
+PARALLEL_THRESHOLD = 64
 
-class FernetCryptograph(AbstractCryptograph):
-    _fernet: Fernet
+SALT = b'e1a7a49b5bad75ec81fcb8cded4bbc0c'   # TODO: GitHub Security complains about hardcoded salt --
+                                            #  see if we can fix it somehow
+ITERATIONS = 480000
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+# Derived keys are cached for the life of the process, so that switching sources or
+# re-entering the same passphrase in Settings doesn't run PBKDF2 again
+_derived_keys: dict[tuple[str, bytes], bytes] = dict()
+_derived_keys_lock = threading.Lock()
+
+
+def _get_workers() -> int:
+    return min(4, os.cpu_count() or 1)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # All Fernet instances share the same pool of decryption threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_get_workers(), thread_name_prefix='FernetCryptograph')
+        return _executor
+
+
+def _derive_fernet_key(passphrase: str) -> bytes:
+    with _derived_keys_lock:
+        if (passphrase, SALT) in _derived_keys:
+            return _derived_keys[(passphrase, SALT)]
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=SALT,
+        iterations=ITERATIONS,
+    )
+    key = base64.urlsafe_b64encode(kdf.derive(passphrase.encode('utf-8')))
+    with _derived_keys_lock:
+        _derived_keys[(passphrase, SALT)] = key
+    return key
+
+
+def get_cached_fernet_key(passphrase: str) -> bytes | None:
+    with _derived_keys_lock:
+        return _derived_keys.get((passphrase, SALT))
+
+
+class FernetCryptograph(AbstractCryptograph, AbstractEventEmitter):
+    _fernet: Fernet | None
+    _key_ready: threading.Event
+    _key_error: Exception | None
+    _generation: int
+    _key_callbacks: list[Callable[[], None]]
+    _key_callbacks_lock: threading.Lock
 
     def __init__(self, settings: AbstractSettings):
+        AbstractEventEmitter.__init__(self, [
+            events.KeyDerivationProgress,
+            events.KeyDerivationComplete,
+        ], settings.invoke_callback)
+        self._fernet = None
+        self._key_ready = threading.Event()
+        self._key_error = None
+        self._generation = 0
+        self._key_callbacks = list()
+        self._key_callbacks_lock = threading.Lock()
         super().__init__(settings)
         # UC-2: The "final" e2e encryption key is cached in the keychain
         cached_key = self._settings.get(S.SOURCE_ENCRYPTION_KEY_CACHE)
-        self._fernet = self._create_fernet(cached_key)
-
-    def _create_fernet(self, cached_key) -> Fernet:
         if cached_key is None or cached_key == '':
-            logger.debug(f'There is no cached key, will generate it')
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=b'e1a7a49b5bad75ec81fcb8cded4bbc0c',   # TODO: GitHub Security complains about hardcoded salt --
-                                                            #  see if we can fix it somehow
-                iterations=480000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(self.key.encode('utf-8')))
-            self._settings.set({S.SOURCE_ENCRYPTION_KEY_CACHE: key.decode('utf-8')})
+            if self._generation == 0:   # We might have started it already for a newly generated passphrase
+                self._derive_key()
         else:
-            key = cached_key.encode('utf-8')
+            self._set_key(cached_key.encode('utf-8'))
+
+    def _create_fernet(self, key: bytes) -> Fernet:
         # TODO: This doesn't look safe -- check other occurrences to ensure we don't log credentials,
         #  since we store them in the keychain
         logger.debug(f'Fernet encryption key: {key}')
         return Fernet(key)
 
+    def _set_key(self, key: bytes) -> None:
+        self._fernet = self._create_fernet(key)
+        self._key_error = None
+        self._key_ready.set()
+        self._run_key_callbacks()
+
+    def when_key_ready(self, callback: Callable[[], None]) -> None:
+        # UC-2: The UI defers the work, which needs the e2e encryption key, until it's derived, instead of waiting for it on the main thread
+        # The callback is executed via the settings callback invoker, also if the key derivation failed
+        with self._key_callbacks_lock:
+            if not self._key_ready.is_set():
+                self._key_callbacks.append(callback)
+                return
+        self._settings.invoke_callback(callback)
+
+    def _run_key_callbacks(self) -> None:
+        with self._key_callbacks_lock:
+            callbacks, self._key_callbacks = self._key_callbacks, list()
+        for callback in callbacks:
+            self._settings.invoke_callback(callback)
+
+    def _derive_key(self) -> None:
+        # UC-2: The e2e encryption key is derived from the passphrase in background, without freezing the UI
+        self._key_ready.clear()
+        self._generation += 1
+        passphrase = self.key
+        cached = get_cached_fernet_key(passphrase)
+        if cached is not None:
+            logger.debug('Reusing the encryption key derived earlier')
+            self._set_key(cached)
+            self._settings.set({S.SOURCE_ENCRYPTION_KEY_CACHE: cached.decode('utf-8')})
+            self._emit(events.KeyDerivationComplete, {})
+            return
+        logger.debug(f'There is no cached key, will generate it')
+        # Until the new key is ready, the old cached one must not be used after a restart
+        self._settings.set({S.SOURCE_ENCRYPTION_KEY_CACHE: ''})
+        threading.Thread(target=self._derive_key_in_background,
+                         args=(self._generation, passphrase),
+                         name='FernetKeyDerivation',
+                         daemon=True).start()
+
+    def _derive_key_in_background(self, generation: int, passphrase: str) -> None:
+        # PBKDF2 can't be resumed half-way, so we can only report its start and end
+        self._emit(events.KeyDerivationProgress, {'value': 0, 'total': ITERATIONS})
+        try:
+            key = _derive_fernet_key(passphrase)
+        except Exception as ex:
+            logger.error('Failed to derive the encryption key', exc_info=ex)
+            if generation == self._generation:
+                self._key_error = ex
+                self._key_ready.set()
+                self._run_key_callbacks()
+            return
+        if generation != self._generation:
+            return  # The passphrase changed while we were deriving the key for the previous one
+        self._set_key(key)
+        self._emit(events.KeyDerivationProgress, {'value': ITERATIONS, 'total': ITERATIONS})
+        self._settings.invoke_callback(self._on_key_derived, key=key)
+
+    def _on_key_derived(self, key: bytes) -> None:
+        # Executed via the settings callback invoker, i.e. on the main thread in the desktop app
+        if get_cached_fernet_key(self.key) == key:
+            self._settings.set({S.SOURCE_ENCRYPTION_KEY_CACHE: key.decode('utf-8')})
+            self._emit(events.KeyDerivationComplete, {})
+
+    def _wait_for_key(self) -> None:
+        # UC-2: Encryption and decryption wait until the e2e encryption key is derived
+        # The desktop app doesn't start its event source until then (see when_key_ready()), so it's
+        # only the worker threads, tests and scripts, which end up waiting here.
+        self._key_ready.wait()
+        if self._key_error is not None:
+            raise Exception(f'Encryption key is not available: {self._key_error}')
+
+    def _get_fernet(self) -> Fernet:
+        self._wait_for_key()
+        return self._fernet
+
+    def is_key_ready(self) -> bool:
+        return self._key_ready.is_set()
+
     def _on_key_changed(self) -> None:
-        self._fernet = self._create_fernet('')
+        self._derive_key()
 
-    def encrypt(self, s: str) -> str:
-        return self._fernet.encrypt(
+    def encrypt(self, s: str, seq: int | None = None) -> str:
+        return self._get_fernet().encrypt(
             s.encode('utf-8')
         ).decode('utf-8')
 
     def decrypt(self, s: str) -> str:
-        return self._fernet.decrypt(
+        return self._get_fernet().decrypt(
             s.encode('utf-8')
         ).decode('utf-8')
+
+    def encrypt_bytes(self, b: bytes, seq: int | None = None) -> bytes:
+        return self._get_fernet().encrypt(b)
+
+    def decrypt_bytes(self, b: bytes) -> bytes:
+        # Fernet only accepts bytes, so the memory-mapped records have to be copied here
+        return self._get_fernet().decrypt(bytes(b))
+
+    def _map(self, fn: Callable[[T], T], tokens: list[T]) -> list[T | None]:
+        # UC-2: Large batches of encrypted strategies are decrypted in parallel, as the cryptography backend releases the GIL
+        workers = _get_workers()
+        if len(tokens) < PARALLEL_THRESHOLD or workers == 1:
+            return super()._map(fn, tokens)
+        size = (len(tokens) + workers - 1) // workers
+        slices = [tokens[i:i + size] for i in range(0, len(tokens), size)]
+        result = list()
+        for decrypted in _get_executor().map(lambda s: AbstractCryptograph._map(self, fn, s), slices):
+            result.extend(decrypted)
+        return result
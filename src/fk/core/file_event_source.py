@@ -15,23 +15,37 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 
+import datetime
+import hashlib
 import logging
 import os
+import threading
 import time
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from os import path
-from typing import TypeVar, Iterable
+from typing import TypeVar, Iterable, Iterator
 
 from fk.core import events
 from fk.core.abstract_cryptograph import AbstractCryptograph
 from fk.core.abstract_data_item import generate_uid
 from fk.core.abstract_event_source import AbstractEventSource
 from fk.core.abstract_filesystem_watcher import AbstractFilesystemWatcher
+from fk.core.abstract_serializer import AbstractSerializer
 from fk.core.abstract_settings import AbstractSettings, prepare_file_for_writing, S
-from fk.core.abstract_strategy import AbstractStrategy
+from fk.core.abstract_strategy import AbstractStrategy, drain_strategies
+from fk.core.append_writer import AppendWriter
 from fk.core.backlog_strategies import CreateBacklogStrategy, DeleteBacklogStrategy, RenameBacklogStrategy
+from fk.core.binary_serializer import create_serializer, BinarySerializer
+from fk.core.checkpoint import Checkpoint, CheckpointWriter, load_checkpoint, delete_checkpoint, snapshot_tenant, \
+    restore_tenant
 from fk.core.import_export import compressed_strategies
+from fk.core.record_cache import RecordCache
 from fk.core.pomodoro_strategies import AddPomodoroStrategy, RemovePomodoroStrategy, AddInterruptionStrategy
+from fk.core.segments import Manifest
+from fk.core.sequence_index import SequenceIndex
 from fk.core.simple_serializer import SimpleSerializer
 from fk.core.tenant import Tenant, ADMIN_USER
 from fk.core.timer_strategies import StartWorkStrategy, StartTimerStrategy
@@ -49,6 +63,28 @@ class FileEventSource(AbstractEventSource[TRoot]):
     _watcher: AbstractFilesystemWatcher | None
     _existing_strategies: Iterable[AbstractStrategy] | None
     _last_strategy: AbstractStrategy | None
+    _offset: int
+    _inode: int | None
+    _prefix_hash: 'hashlib._Hash | None'
+    _checkpoint_writer: CheckpointWriter | None
+    _checkpoint_interval: int
+    _checkpoint_count: int
+    _writer: AppendWriter | None
+    _in_sync: bool
+    _manifest: Manifest | None
+    _segment_index: int
+    _segment_first_seq: int
+    _segment_last_seq: int
+    _segment_count: int | None     # None if we didn't see the whole active segment
+    _index: SequenceIndex | None
+    _memory_index: SequenceIndex | None     # Rebuilt on demand, if the index file is disabled
+    _record_offset: int
+    _pending_index: deque[list[tuple[int, datetime.datetime]]]
+    _open_block: list[AbstractStrategy]
+    _record_cache: RecordCache | None
+    _maintenance_depth: int
+    _lock: threading.RLock
+    _write_error: Exception | None
 
     def __init__(self,
                  settings: AbstractSettings,
@@ -64,6 +100,30 @@ class FileEventSource(AbstractEventSource[TRoot]):
         self._watcher = None
         self._existing_strategies = existing_strategies
         self._last_strategy = None
+        self._offset = 0
+        self._inode = None
+        self._prefix_hash = None
+        self._checkpoint_writer = None
+        self._checkpoint_interval = int(self.get_config_parameter(S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL))
+        self._checkpoint_count = 0
+        self._writer = None
+        self._in_sync = True
+        self._manifest = None
+        self._segment_index = 0
+        self._segment_first_seq = 0
+        self._segment_last_seq = 0
+        self._segment_count = None
+        self._index = None
+        self._memory_index = None
+        self._record_offset = 0
+        self._pending_index = deque()
+        self._open_block = list()
+        self._record_cache = None
+        self._maintenance_depth = 0
+        self._lock = threading.RLock()
+        self._write_error = None
+        if self._is_checkpoints_enabled() and existing_strategies is None:
+            self._checkpoint_writer = CheckpointWriter(self._get_filename(), cryptograph)
         if self._is_watch_changes() and filesystem_watcher is not None:
             self._watcher = filesystem_watcher
             self._watcher.watch(self._get_filename(), self._on_file_change)
@@ -72,39 +132,179 @@ class FileEventSource(AbstractEventSource[TRoot]):
         return self._last_strategy
 
     def _on_file_change(self, filename: str) -> None:
+        # The writer shares this lock, so that it doesn't move our position while we read
+        with self._lock:
+            self._read_file_change(filename)
+
+    def _read_file_change(self, filename: str) -> None:
         # This method is called when we get updates from "remote"
+        self._memory_index = None
         logger.info(f'Data file content changed: {filename}')
         # UC-1: File event source: If file watching is enabled, the strategies with the sequence > last_seq are executed
         # UC-3: Any event source fires all events for the incremental processing
         # We open the file as r+ to make sure that another process finished writing and
         # released the file handler. By default, OSes won't allow concurrent writes to the
         # file, so if something is still writing into it, then this call will fail.
-        with open(filename, 'r+', encoding='UTF-8') as file:
-            last_executed = None
-            for line in file:
-                try:
-                    strategy = self._serializer.deserialize(line)
-                    if strategy is None:
-                        continue
-                    self._last_strategy = strategy
-                    seq = strategy.get_sequence()
-                    if seq > self._last_seq:
-                        if not self._ignore_invalid_sequences and seq != self._last_seq + 1:
-                            self._sequence_error(self._last_seq, seq)
-                        self._last_seq = seq
-                        if logger.isEnabledFor(logging.DEBUG):
-                            logger.debug(f"Will execute new strategy: {strategy}")
-                        # UC-1: For any event source, whenever it executes a strategy with seq_num != last_seq + 1, and "ignore sequence" settings is disables, it fails
-                        self.execute_prepared_strategy(strategy)
-                        last_executed = strategy
-                except Exception as ex:
-                    if self._ignore_errors:
-                        logger.warning(f'Error processing {line} (ignored)', exc_info=ex)
-                    else:
-                        raise ex
-                finally:
-                    if last_executed is not None:
-                        self._auto_seal_at_the_end(last_executed)
+        if self._writer is not None:
+            self._writer.flush()
+        # UC-3: File event source reads the changes from the file watcher without the maintenance cache, as they might arrive while the maintenance is in progress
+        self._serializer.set_cache(None)
+        with open(filename, 'rb+') as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                # UC-3: File event source rescans the entire file if it was replaced or truncated, e.g. by a sync tool
+                logger.info(f'Data file was replaced or truncated, will rescan it fully')
+                self._offset = 0
+                self._inode = stat.st_ino
+                # The new file content may differ from what we've replayed, so we can't checkpoint it anymore
+                self._prefix_hash = None
+                # The offsets we indexed might not be valid anymore
+                self._invalidate_index()
+                # UC-3: If another process sealed the active segment of the data file, we read the rest of it
+                self._catch_up_segments()
+                self._detect_format(file, False)
+            elif stat.st_size == self._offset:
+                # UC-3: File event source ignores notifications about its own writes
+                logger.debug(f'Data file has no new data after position {self._offset}')
+                return
+            else:
+                # UC-3: File event source only reads the data appended since the last read
+                file.seek(self._offset)
+            self._execute_new_records(file, True)
+            if self._index is not None:
+                self._index.flush()
+
+    def _execute_new_records(self, file, complete_only: bool) -> None:
+        last_executed = None
+        for line in self._read_records(file, complete_only):
+            try:
+                strategy = self._serializer.deserialize(line)
+                if strategy is None:
+                    continue
+                self._last_strategy = strategy
+                seq = strategy.get_sequence()
+                # After a rescan we see the strategies we executed before, but they are still in this segment
+                self._track_segment(seq)
+                if seq > self._last_seq:
+                    if not self._ignore_invalid_sequences and seq != self._last_seq + 1:
+                        self._sequence_error(self._last_seq, seq)
+                    self._check_bound_sequence(line, seq)
+                    self._last_seq = seq
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"Will execute new strategy: {strategy}")
+                    # UC-1: For any event source, whenever it executes a strategy with seq_num != last_seq + 1, and "ignore sequence" settings is disables, it fails
+                    self.execute_prepared_strategy(strategy)
+                    self._index_strategy(strategy)
+                    last_executed = strategy
+            except Exception as ex:
+                if self._ignore_errors:
+                    logger.warning(f'Error processing {line} (ignored)', exc_info=ex)
+                else:
+                    raise ex
+            finally:
+                if last_executed is not None:
+                    self._auto_seal_at_the_end(last_executed)
+
+    def _check_bound_sequence(self, record, seq: int) -> None:
+        # UC-2: Records, which are authenticated together with their sequence numbers, must follow the previous strategy without gaps, even if we ignore invalid sequences otherwise. Otherwise somebody swapped or copied the encrypted records.
+        if seq != self._last_seq + 1 and self._serializer.get_bound_sequence(record) is not None:
+            raise Exception(f'Encrypted strategy {seq} is out of place after {self._last_seq}')
+
+    def _catch_up_segments(self) -> None:
+        self._manifest = Manifest.load(self._get_filename(), self._settings, self._cryptograph)
+        for i, segment in enumerate(self._manifest.segments):
+            if segment.last_seq > self._last_seq:
+                logger.info(f'Reading new strategies from {segment}')
+                self._segment_index = i
+                with open(self._manifest.get_files()[i], 'rb') as f:
+                    self._detect_format(f, False)
+                    self._execute_new_records(f, False)
+        self._segment_index = len(self._manifest.segments)
+
+    def _read_records(self, file, complete_only: bool = False) -> Iterable:
+        # Reads a file opened in binary mode, keeping track of the position and the hash of
+        # what we've read so far. Those are needed to resume reading from a checkpoint, or
+        # to read only the new data when the file changes. If complete_only is set, then
+        # it stops at the incomplete record, which somebody is still writing.
+        for raw, record in self._serializer.read_records(file, complete_only):
+            self._record_offset = self._offset
+            self._offset += len(raw)
+            if self._prefix_hash is not None:
+                self._prefix_hash.update(raw)
+            yield record
+
+    def _get_parse_workers(self) -> int:
+        workers = int(self.get_config_parameter(S.FILEEVENTSOURCE_PARSE_WORKERS))
+        if workers <= 0:
+            workers = min(4, os.cpu_count() or 1)
+        return workers
+
+    def _parse_chunk(self, chunk: list[tuple[int, any]]) -> list[tuple[int, any, any, Exception | None]]:
+        # The serializer's parse() is stateless, so it's safe to call it from the worker threads.
+        # We don't raise errors here, as they have to be reported in order.
+        parsed = self._serializer.parse_many([record for offset, record in chunk])
+        return [(offset, record, p, error) for (offset, record), (p, error) in zip(chunk, parsed)]
+
+    def _parse_records(self, file) -> Iterable[tuple[int, any, any, Exception | None]]:
+        # UC-3: File event source parses and decrypts the records in parallel, but executes the strategies strictly in order
+        # Yields record offset, raw record, parsed record and the parsing error, if any
+        workers = self._get_parse_workers()
+        chunk_size = int(self.get_config_parameter(S.FILEEVENTSOURCE_PARSE_CHUNK))
+        if workers == 1:
+            # Still in chunks, so that the cryptograph can decrypt them in batches
+            chunk = list()
+            for record in self._read_records(file):
+                chunk.append((self._record_offset, record))
+                if len(chunk) >= chunk_size:
+                    yield from self._parse_chunk(chunk)
+                    chunk = list()
+            yield from self._parse_chunk(chunk)
+            return
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='FileEventSourceParser') as executor:
+            in_flight = deque()
+            chunk = list()
+            for record in self._read_records(file):
+                chunk.append((self._record_offset, record))
+                if len(chunk) >= chunk_size:
+                    in_flight.append(executor.submit(self._parse_chunk, chunk))
+                    chunk = list()
+                    # Read ahead just enough to keep all workers busy
+                    while len(in_flight) > workers * 2:
+                        yield from in_flight.popleft().result()
+            if len(chunk) > 0:
+                in_flight.append(executor.submit(self._parse_chunk, chunk))
+            while len(in_flight) > 0:
+                yield from in_flight.popleft().result()
+
+    def _get_reader(self, file, use_cache: bool = True) -> AbstractSerializer:
+        # UC-3: File event source supports text and binary data files, telling them apart by the file header
+        cache = self._record_cache if use_cache else None
+        detected = create_serializer(file, self._settings, self._cryptograph)
+        if cache is None and len(detected.get_header()) == 0 and len(self._serializer.get_header()) == 0:
+            # The text serializer is stateless, so we keep using it. This lets us wrap it in tests.
+            # The binary one has to start from scratch with each new file, as it interns users.
+            # The maintenance readers get their own one, so that the cache doesn't leak elsewhere.
+            detected = self._serializer
+        detected.set_cache(cache)
+        detected.set_profiler(self._profiler)
+        return detected
+
+    def _detect_format(self, file, use_cache: bool = True) -> None:
+        self._serializer = self._get_reader(file, use_cache)
+        header = self._serializer.get_header()
+        self._offset = len(header)
+        self._reset_segment_tracking()
+        if self._prefix_hash is not None:
+            self._prefix_hash.update(header)
+
+    def _create_file_serializer(self) -> AbstractSerializer:
+        # UC-3: New data files are created in the format, selected in the settings
+        if self.get_config_parameter(S.FILEEVENTSOURCE_FORMAT) == 'binary':
+            return BinarySerializer(self._settings, self._cryptograph)
+        elif self._serializer.get_header() == b'':
+            return self._serializer
+        else:
+            return SimpleSerializer(self._settings, self._cryptograph)
 
     def _get_filename(self) -> str:
         return self.get_config_parameter(S.FILEEVENTSOURCE_FILENAME)
@@ -112,6 +312,237 @@ class FileEventSource(AbstractEventSource[TRoot]):
     def _is_watch_changes(self) -> bool:
         return self.get_config_parameter(S.FILEEVENTSOURCE_WATCH_CHANGES) == "True"
 
+    def _is_checkpoints_enabled(self) -> bool:
+        return self.get_config_parameter(S.FILEEVENTSOURCE_CHECKPOINTS) == "True"
+
+    def _restore_checkpoint(self, checkpoint: Checkpoint, prefix_hash: 'hashlib._Hash') -> None:
+        try:
+            restore_tenant(checkpoint.tenant, self._data)
+            self._last_seq = checkpoint.last_seq
+            self._estimated_count = checkpoint.count
+            self._checkpoint_count = checkpoint.count
+            self._offset = checkpoint.offset
+            self._prefix_hash = prefix_hash
+            self._serializer.set_state(checkpoint.serializer_state)
+            if checkpoint.last_strategy is not None:
+                self._last_strategy = SimpleSerializer(self._settings, self._cryptograph).deserialize(
+                    checkpoint.last_strategy)
+        except Exception as ex:
+            # The Tenant might be half-restored at this point, so we can't continue with it
+            logger.error(f'Failed to restore from {checkpoint}', exc_info=ex)
+            delete_checkpoint(self._get_filename())
+            raise ex
+
+    def _save_checkpoint(self) -> None:
+        # Takes a snapshot synchronously, and writes it to disk in the background
+        if self._checkpoint_writer is None or self._prefix_hash is None or self._last_strategy is None:
+            return
+        checkpoint = Checkpoint(self._last_strategy.get_sequence(),
+                                self._offset,
+                                self._prefix_hash.hexdigest(),
+                                self._estimated_count,
+                                SimpleSerializer(self._settings, self._cryptograph).serialize(self._last_strategy),
+                                snapshot_tenant(self._data),
+                                self._serializer.get_state(),
+                                self._segment_index)
+        self._checkpoint_count = self._estimated_count
+        self._checkpoint_writer.write(checkpoint)
+
+    def _is_checkpoint_due(self) -> bool:
+        # A checkpoint must not get ahead of the file, and the open block is not in it yet
+        return self._estimated_count - self._checkpoint_count >= self._checkpoint_interval \
+            and len(self._open_block) == 0
+
+    def _is_index_enabled(self) -> bool:
+        return self.get_config_parameter(S.FILEEVENTSOURCE_INDEX) == "True"
+
+    def _open_index(self, files: list[str], checkpoint: Checkpoint | None) -> None:
+        filename = self._get_filename()
+        index = SequenceIndex.load(filename)
+        if index is not None and not self._is_index_valid(index, files, checkpoint):
+            logger.info(f'Discarding {index}, as it does not match the data file')
+            SequenceIndex.delete(filename)
+            index = None
+        if index is None and checkpoint is None:
+            # We are going to read the whole file anyway, so it costs us nothing to index it
+            index = SequenceIndex(filename)
+            index.create()
+        # UC-3: If the sequence index is missing, and we load from a checkpoint, it is rebuilt on first use
+        self._index = index
+
+    def _is_index_valid(self, index: SequenceIndex, files: list[str], checkpoint: Checkpoint | None) -> bool:
+        # We only check the last entry. If it points to the right strategy, then it's unlikely
+        # that the data file changed under the index.
+        last = index.get_last_position()
+        if last is None:
+            return checkpoint is None
+        if checkpoint is not None and last[0] < checkpoint.last_seq:
+            return False    # We won't see the strategies between them, so there would be a gap
+        seq, segment, offset = last
+        if segment >= len(files) or path.getsize(files[segment]) <= offset:
+            return False
+        try:
+            with open(files[segment], 'rb') as f:
+                serializer = self._get_reader(f)
+                f.seek(offset)
+                for raw, record in serializer.read_records(f, True):
+                    # The strategies from the same block share the offset
+                    if serializer.peek_sequence(record) == seq:
+                        return True
+                    if len(raw) > 0:
+                        break
+        except Exception as ex:
+            logger.debug(f'Cannot verify the index entry for seq {seq}', exc_info=ex)
+        return False
+
+    def _index_strategy(self, strategy: AbstractStrategy) -> None:
+        if self._index is not None and strategy.get_sequence() > self._index.get_last_seq():
+            self._index.add(strategy.get_sequence(), self._segment_index, self._record_offset, strategy.get_when())
+
+    def _reset_segment_tracking(self) -> None:
+        # Called when we start reading or writing a segment from its beginning
+        self._segment_first_seq = 0
+        self._segment_last_seq = 0
+        self._segment_count = 0
+
+    def _track_segment(self, seq: int) -> None:
+        # UC-3: File event source keeps track of the sequences in the active segment, so that it doesn't have to read it again to seal it
+        if self._segment_count is not None:
+            if self._segment_count == 0:
+                self._segment_first_seq = seq
+            self._segment_last_seq = seq
+            self._segment_count += 1
+
+    def _invalidate_index(self) -> None:
+        self._memory_index = None
+        if self._index is not None:
+            SequenceIndex.delete(self._get_filename())
+            self._index = None
+
+    def _get_index(self) -> SequenceIndex:
+        with self._lock:
+            if self._index is not None:
+                return self._index
+            if self._memory_index is not None:
+                return self._memory_index
+            if self._writer is not None:
+                self._writer.flush()
+            filename = self._get_filename()
+            logger.info(f'Rebuilding the sequence index for {filename}')
+            index = SequenceIndex(filename, not self._is_index_enabled())
+            files = Manifest.load(filename, self._settings, self._cryptograph).get_files()
+            for i, f in enumerate(files):
+                with open(f, 'rb') as file:
+                    serializer = self._get_reader(file)
+                    offset = file.tell()
+                    for raw, record in serializer.read_records(file):
+                        try:
+                            strategy = serializer.deserialize(record)
+                            if strategy is not None and strategy.get_sequence() > index.get_last_seq():
+                                index.add(strategy.get_sequence(), i, offset, strategy.get_when())
+                        except Exception as ex:
+                            logger.debug(f'Skipped invalid strategy while indexing', exc_info=ex)
+                        offset += len(raw)
+            if self._is_index_enabled():
+                index.create()
+                index.flush()
+                self._index = index
+            else:
+                # UC-3: Without the sequence index file, the rebuilt index is kept in memory until the data file changes
+                self._memory_index = index
+            return index
+
+    def get_strategies_from(self, seq: int) -> Iterable[AbstractStrategy]:
+        # UC-3: File event source can read the strategies starting from any sequence number, without reading the ones before it
+        index = self._get_index()
+        position = index.find(seq)
+        if position is not None:
+            yield from self._read_strategies_from(seq, position)
+        # UC-2: The strategies from the open encrypted block are not in the data file yet
+        for strategy in list(self._open_block):
+            if strategy.get_sequence() >= seq:
+                yield strategy
+
+    def _read_strategies_from(self, seq: int, position: tuple[int, int]) -> Iterable[AbstractStrategy]:
+        files = Manifest.load(self._get_filename(), self._settings, self._cryptograph).get_files()
+        segment, offset = position
+        found = False
+        for i in range(segment, len(files)):
+            with open(files[i], 'rb') as f:
+                serializer = self._get_reader(f)
+                if i == segment:
+                    if len(serializer.get_header()) > 0:
+                        # Stateful serializers need to see what's before the offset, but it's
+                        # still much cheaper than deserializing those strategies
+                        pos = f.tell()
+                        records = serializer.read_records(f)
+                        for raw, record in records:
+                            if pos >= offset:
+                                break
+                            serializer.skip(record)
+                            pos += len(raw)
+                        records.close()
+                    f.seek(offset)
+                for raw, record in serializer.read_records(f):
+                    strategy = serializer.deserialize(record)
+                    if strategy is None:
+                        continue
+                    if i == segment and strategy.get_sequence() < seq and not found:
+                        continue    # The block, which contains this strategy, starts with the earlier ones
+                    found = True
+                    yield strategy
+
+    def get_last_strategies(self, count: int) -> list[AbstractStrategy]:
+        in_block = self._open_block[-count:] if count > 0 else list()
+        seq = self._get_index().get_tail_seq(count - len(in_block)) if count > len(in_block) else None
+        return list(self.get_strategies_from(seq)) if seq is not None else in_block
+
+    def get_strategies_between(self,
+                               start: datetime.datetime,
+                               end: datetime.datetime) -> Iterable[AbstractStrategy]:
+        # UC-3: File event source can read the strategies within a time window, without reading the ones before it
+        seq = self._get_index().find_first_after(start)
+        if seq is None:
+            in_block = [s for s in self._open_block if s.get_when() >= start]
+            if len(in_block) == 0:
+                return
+            seq = in_block[0].get_sequence()
+        for strategy in self.get_strategies_from(seq):
+            if strategy.get_when() > end:
+                break
+            yield strategy
+
+    def get_state_at(self, seq: int | None = None, when: datetime.datetime | None = None) -> Tenant:
+        # UC-3: File event source reconstructs the past states holding its lock, as it might be called from another
+        #  thread than the one replaying and appending the strategies, e.g. via ThreadedEventSource
+        with self._lock:
+            return super().get_state_at(seq, when)
+
+    def _find_sequence_at(self, when: datetime.datetime) -> int:
+        # UC-3: File event source finds the strategy at the given time using the sequence index
+        seq = self._get_index().find_first_after(when + datetime.timedelta(microseconds=1))
+        if seq is None:
+            in_block = [s for s in self._open_block if s.get_when() > when]
+            return in_block[0].get_sequence() - 1 if len(in_block) > 0 else self._last_seq
+        return seq - 1
+
+    def _get_persisted_state(self, seq: int) -> tuple[int, dict] | None:
+        if not self._is_checkpoints_enabled() or self._existing_strategies is not None:
+            return None
+        files = Manifest.load(self._get_filename(), self._settings, self._cryptograph).get_files()
+        checkpoint, _ = load_checkpoint(self._get_filename(), self._cryptograph, files)
+        if checkpoint is not None and checkpoint.last_seq <= seq:
+            return checkpoint.last_seq, checkpoint.tenant
+        return None
+
+    def _create_replay_source(self) -> FileEventSource[TRoot]:
+        # Without the filesystem watcher and the checkpoints
+        return FileEventSource[TRoot](self._settings, self._cryptograph, Tenant(self._settings), None, list())
+
+    def check_sequences(self) -> list[tuple[int, int]]:
+        # Returns the gaps in the strategy sequence numbers, using the index only
+        return self._get_index().check_continuity()
+
     def start(self, mute_events: bool = True, fail_early: bool = False) -> None:
         if self._existing_strategies is None:
             self._process_from_file(mute_events)
@@ -125,11 +556,13 @@ class FileEventSource(AbstractEventSource[TRoot]):
         #  It checks sequences and triggers SourceMessagesRequested events.
         #  All events are muted during processing.
         self._emit(events.SourceMessagesRequested, dict())
-        self.mute()
+        self._start_bulk_load()
         is_first = True
         last_executed = None
         seq = 1
-        for strategy in self._existing_strategies:
+        # The source takes over the existing strategies and lets them go once they are executed
+        existing, self._existing_strategies = self._existing_strategies, list()
+        for strategy in drain_strategies(existing):
             try:
                 if strategy is None:
                     continue
@@ -151,66 +584,110 @@ class FileEventSource(AbstractEventSource[TRoot]):
                 else:
                     raise ex
         self._auto_seal_at_the_end(last_executed)
-        self.unmute()
+        self._finish_bulk_load()
         self._emit(events.SourceMessagesProcessed, {'source': self})
 
     def _process_from_file(self, mute_events=True) -> None:
         # This method is called when we read the history
         self._emit(events.SourceMessagesRequested, dict(), None)
         if mute_events:
-            self.mute()
+            self._start_bulk_load()
 
         filename = self._get_filename()
         if path.isdir(filename):
             raise IsADirectoryError(f'{filename} is a directory. Expected a filename.')
-        elif not path.isfile(filename):
+        # UC-3: File event source reads all sealed segments of the data file, listed in its manifest, followed by the active one
+        self._manifest = Manifest.load(filename, self._settings, self._cryptograph)
+        if not path.isfile(filename):
             prepare_file_for_writing(filename)
-            with open(filename, 'w', encoding='UTF-8') as f:
-                s = self.get_init_strategy(self._emit)
-                f.write(f'{self._serializer.serialize(s)}\n')
+            with open(filename, 'wb') as f:
+                serializer = self._create_file_serializer()
+                f.write(serializer.get_header())
+                if len(self._manifest.segments) == 0:
+                    # UC-1: The file event source always creates a new file with CreateUser strategy, if it doesn't exist
+                    s = self.get_init_strategy(self._emit)
+                    f.write(serializer.to_record(serializer.serialize(s)))
                 logger.info(f'Created empty data file {filename}')
-                # UC-1: The file event source always creates a new file with CreateUser strategy, if it doesn't exist
 
         is_first = True
         last_executed = None
         seq = 1
-        logger.info(f'FileEventSource: Reading file {filename}')
-        with open(filename, encoding='UTF-8') as f:
-            # TODO: If we wrap this for into a generator, we'll be able to reuse a this entire loop
-            #  with _process_from_existing() and _on_file_change()
-            for line in f:
-                try:
-                    strategy = self._serializer.deserialize(line)
-                    if strategy is None:
-                        continue
-                    self._last_strategy = strategy
-
-                    if is_first:
-                        is_first = False
-                    else:
-                        seq = strategy.get_sequence()
-                        if not self._ignore_invalid_sequences and seq != self._last_seq + 1:
-                            self._sequence_error(self._last_seq, seq)
-                    # UC-3: Strategies may start with any sequence number
-                    self._last_seq = seq
-                    self.execute_prepared_strategy(strategy)
-                    last_executed = strategy
-                except Exception as ex:
-                    if self._ignore_errors:
-                        logger.warning(f'Error processing {line} (ignored)', exc_info=ex)
-                    else:
-                        raise ex
+        files = self._manifest.get_files()
+        checkpoint, prefix_hash = None, None
+        if self._checkpoint_writer is not None:
+            checkpoint, prefix_hash = load_checkpoint(filename, self._cryptograph, files)
+        if self._is_index_enabled():
+            self._open_index(files, checkpoint)
+
+        # UC-3: File event source skips the sealed segments of the data file, which are covered by a checkpoint
+        for i in range(checkpoint.segment if checkpoint is not None else 0, len(files)):
+            with open(files[i], 'rb') as f:
+                self._segment_index = i
+                self._inode = os.fstat(f.fileno()).st_ino
+                self._prefix_hash = hashlib.sha256() if self._checkpoint_writer is not None else None
+                self._detect_format(f)
+                if checkpoint is not None and checkpoint.segment == i:
+                    # UC-3: File event source restores the data from a checkpoint, if it matches the data file, and only replays the strategies after it
+                    self._restore_checkpoint(checkpoint, prefix_hash)
+                    # We won't see the strategies before the checkpoint in this segment
+                    self._segment_count = None
+                    is_first = False
+                    last_executed = self._last_strategy
+
+                logger.info(f'FileEventSource: Reading file {files[i]} from position {self._offset}')
+                f.seek(self._offset)
+                # TODO: If we wrap this for into a generator, we'll be able to reuse a this entire loop
+                #  with _process_from_existing() and _on_file_change()
+                for offset, line, parsed, error in self._parse_records(f):
+                    try:
+                        if error is not None:
+                            raise error
+                        self._record_offset = offset
+                        strategy = self._serializer.build(parsed)
+                        if strategy is None:
+                            continue
+                        self._last_strategy = strategy
+                        self._track_segment(strategy.get_sequence())
+
+                        if is_first:
+                            is_first = False
+                        else:
+                            seq = strategy.get_sequence()
+                            if not self._ignore_invalid_sequences and seq != self._last_seq + 1:
+                                self._sequence_error(self._last_seq, seq)
+                            self._check_bound_sequence(line, seq)
+                        # UC-3: Strategies may start with any sequence number
+                        self._last_seq = seq
+                        self.execute_prepared_strategy(strategy)
+                        self._index_strategy(strategy)
+                        last_executed = strategy
+                    except Exception as ex:
+                        if self._ignore_errors:
+                            logger.warning(f'Error processing {line} (ignored)', exc_info=ex)
+                        else:
+                            raise ex
+        last_executed = self._replay_open_block() or last_executed
+        if self._index is not None:
+            self._index.flush()
         logger.debug('FileEventSource: Processed file content, will unmute events now')
 
+        # The snapshot has to be taken before auto-sealing, as the latter depends on the current time
+        if self._checkpoint_writer is not None and self._is_checkpoint_due():
+            self._save_checkpoint()
+
         # UC-1: The last strategy is auto-sealed after execution to ensure that the timer rings offline, if needed
         self._auto_seal_at_the_end(last_executed)
 
         # UC-1: Any event source mutes its events for the duration of the first parsing and for the export/import
         if mute_events:
-            self.unmute()
+            self._finish_bulk_load()
         self._emit(events.SourceMessagesProcessed, {'source': self})
 
     def repair(self) -> tuple[list[str], str | None]:
+        with self.maintenance():
+            return self._repair()
+
+    def _repair(self) -> tuple[list[str], str | None]:
         # This method attempts some basic repairs, trying to save as much
         # data as possible:
         # 0. Reorder strategies by date
@@ -232,6 +709,9 @@ class FileEventSource(AbstractEventSource[TRoot]):
         original_watcher = self._watcher
         self._watcher = None
 
+        # UC-2: Before repairing or compressing the file, the open block of strategies is appended to it
+        self._seal_open_block()
+
         # Read strategies and repair in one pass
         strategies: deque[AbstractStrategy] = deque()
         all_users: dict[str, set[str]] = dict()
@@ -239,28 +719,37 @@ class FileEventSource(AbstractEventSource[TRoot]):
         all_workitems: set[str] = set()
         repaired_backlog: str | None = None
 
-        parsed = list[AbstractStrategy]()
-        with open(self._get_filename(), encoding='UTF-8') as f:
-            for line in f:
-                try:
-                    s = self._serializer.deserialize(line)
-                    if s:
-                        parsed.append(s)
-                except Exception as ex:
-                    log.append(f'Skipped invalid strategy ({ex}): {line}')
-                    changes += 1
-                    continue
+        manifest = Manifest.load(self._get_filename(), self._settings, self._cryptograph)
+        for segment in manifest.segments:
+            if not segment.verify(path.dirname(self._get_filename())):
+                log.append(f'Checksum mismatch in {segment}, it was modified after it was sealed')
 
-        # Reorder strategies by timestamp
-        sorted_strategies = sorted(parsed, key=lambda x: x.get_when())
-        for i, s in enumerate(parsed):
-            if sorted_strategies[i] != s:
+        # UC-3: File event source repair checks the sequence continuity using the index, if it's available
+        if self._index is not None:
+            gaps = self._index.check_continuity()
+            if len(gaps) > 0:
+                log.append(f'Found {len(gaps)} gap(s) in sequence numbers, the first one is {gaps[0][0]} -> {gaps[0][1]}')
+
+        parsed = list[AbstractStrategy]()
+        for serializer, line, p, error in self._parse_all_records(manifest):
+            try:
+                if error is not None:
+                    raise error
+                s = serializer.build(p)
+                if s:
+                    parsed.append(s)
+            except Exception as ex:
+                log.append(f'Skipped invalid strategy ({ex}): {line}')
                 changes += 1
-                log.append(f'Reordered strategies')
-                parsed = deque[AbstractStrategy](sorted_strategies)
-                break
+                continue
+
+        # Reorder strategies by timestamp. We sort in place, as there might be lots of them
+        if any(a.get_when() > b.get_when() for a, b in zip(parsed, islice(parsed, 1, None))):
+            changes += 1
+            log.append(f'Reordered strategies')
+            parsed.sort(key=lambda x: x.get_when())
 
-        for s in parsed:
+        for s in drain_strategies(parsed):
             t = type(s)
 
             # Create users on the first reference
@@ -411,29 +900,9 @@ class FileEventSource(AbstractEventSource[TRoot]):
         # Now we need to ensure data consistency somehow. Even though all workitems and backlogs might be there,
         # we may still have an issue with removing too many pomodoros or starting sealed workitems. To fix those,
         # it would be easier to just skip the strategies which throw exceptions on parse.
-        while True:
-            # Renumber strategies
-            seq = strategies[0].get_sequence()
-            for s in strategies:
-                if s is None:
-                    continue
-                if s.get_sequence() != seq:
-                    s._seq = seq
-                    changes += 1
-                seq += 1
-            log.append(f'Renumbered strategies up to {seq}')
-
-            # Restart and remove failing strategies
-            new_source = self.clone(Tenant(self._settings), strategies)
-            try:
-                new_source.start(fail_early=True)
-                log.append(f'Tested successfully')
-                break   # No exceptions mean we repaired successfully
-            except Exception as ex:
-                failed = new_source.get_last_strategy()
-                log.append(f'Tested with an error: {ex}. Removed failed strategy: {failed.__class__.__name__}')
-                strategies.remove(failed)
-                changes += 1
+        strategies, renumbered = self._replay_for_repair(strategies, log)
+        changes += renumbered
+        log.append(f'Tested successfully')
 
         if changes > 0:
             log.append(f'Made {changes} changes in total')
@@ -447,33 +916,287 @@ class FileEventSource(AbstractEventSource[TRoot]):
         # UC-3: File event source repair returns the log of all changes it made
         return log, backup_filename
 
+    def _replay_for_repair(self,
+                           strategies: deque[AbstractStrategy],
+                           log: list[str]) -> tuple[list[AbstractStrategy], int]:
+        # UC-3: File event source repair replays the strategies only once. After a failing strategy it restores the last in-memory snapshot and replays only the strategies after it.
+        # Renumbers the strategies on the fly and removes the failing ones. Returns the remaining strategies
+        # and the number of changes.
+        interval = int(self.get_config_parameter(S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL))
+        first_seq = strategies[0].get_sequence() if len(strategies) > 0 else 1
+        kept = list[AbstractStrategy]()
+        changes = 0
+        snapshot: dict | None = None    # The state after the first snapshot_size kept strategies
+        snapshot_size = 0
+        source = self._resume_for_repair(None, kept)
+        for s in strategies:
+            seq = first_seq + len(kept)
+            renumbered = s.get_sequence() != seq
+            s._seq = seq
+            s._settings = self._settings
+            try:
+                source.execute_prepared_strategy(s)
+            except Exception as ex:
+                log.append(f'Tested with an error: {ex}. Removed failed strategy: {s.__class__.__name__}')
+                changes += 1
+                # The failed strategy might have left the data half-modified, so we can't continue with it
+                source = self._resume_for_repair(snapshot, kept[snapshot_size:])
+                continue
+            kept.append(s)
+            if renumbered:
+                changes += 1
+            if len(kept) - snapshot_size >= interval:
+                snapshot = snapshot_tenant(source.get_data())
+                snapshot_size = len(kept)
+        log.append(f'Renumbered strategies up to {first_seq + len(kept)}')
+
+        # The timer might still fail to ring at the end
+        while len(kept) > 0:
+            try:
+                source._auto_seal_at_the_end(kept[-1])
+                break
+            except Exception as ex:
+                failed = kept.pop()
+                log.append(f'Tested with an error: {ex}. Removed failed strategy: {failed.__class__.__name__}')
+                changes += 1
+                if snapshot_size > len(kept):
+                    snapshot, snapshot_size = None, 0
+                source = self._resume_for_repair(snapshot, kept[snapshot_size:])
+        return kept, changes
+
+    def _resume_for_repair(self, snapshot: dict | None, strategies: list[AbstractStrategy]) -> FileEventSource[TRoot]:
+        # Those strategies executed successfully before, so they will do it again. We never start this source,
+        # the existing strategies are only there to tell it not to write checkpoints.
+        source = self.clone(Tenant(self._settings), list())
+        source._start_bulk_load()
+        if snapshot is not None:
+            restore_tenant(snapshot, source.get_data())
+        for s in strategies:
+            source.execute_prepared_strategy(s)
+        return source
+
     def _overwrite_file(self, strategies: Iterable[AbstractStrategy], log: list[str]) -> str:
         filename = self._get_filename()
+        if self._writer is not None:
+            self._writer.close()
+        if self._checkpoint_writer is not None:
+            self._checkpoint_writer.wait()
+        delete_checkpoint(filename)
+        self._invalidate_index()
+        self._reset_state_cursor()
+        self._prefix_hash = None    # We don't know where we are in the new file until it is reloaded
         date = round(time.time() * 1000)
         backup_filename = f"{filename}-backup-{date}"
         os.rename(filename, backup_filename)
         log.append(f'Created backup file {backup_filename}')
+        # UC-3: File event source repair and compression merge all segments of the data file into one
+        for f in Manifest.load(filename, self._settings, self._cryptograph).move_to_backup(f'-backup-{date}'):
+            log.append(f'Created backup file {f}')
+        self._manifest = None
+        self._segment_index = 0
+        self._segment_count = None
 
-        # Write it back
-        with open(filename, 'w', encoding='UTF-8') as f:
+        # Write it back, keeping the format of the original file
+        serializer = self._serializer if self._serializer.get_header() == b'' \
+            else BinarySerializer(self._settings, self._cryptograph)
+        with open(filename, 'wb') as f:
+            f.write(serializer.get_header())
             for s in strategies:
-                f.write(self._serializer.serialize(s) + '\n')
+                f.write(serializer.to_record(serializer.serialize(s)))
         log.append(f'Overwritten original file {filename}')
         return backup_filename
 
+    def _get_writer(self) -> AppendWriter:
+        if self._writer is None:
+            self._writer = AppendWriter(self._get_filename(),
+                                        self.get_config_parameter(S.FILEEVENTSOURCE_FSYNC),
+                                        int(self.get_config_parameter(S.FILEEVENTSOURCE_GROUP_COMMIT_MS)),
+                                        self._on_written,
+                                        self._on_write_failed,
+                                        self._settings.invoke_callback,
+                                        self._lock)
+        return self._writer
+
+    def _on_written(self, start: int, end: int, records: list[bytes]) -> None:
+        # Called by the writer once the records are in the file, holding our lock.
+        # If somebody else appended to the file since we last read it, then we leave the position
+        # as-is, so that we read their strategies next time. Ours will be skipped by their sequence.
+        self._memory_index = None
+        self._in_sync = start == self._offset
+        indexed = [self._pending_index.popleft() for r in records]
+        if self._in_sync:
+            self._offset = end
+            if self._prefix_hash is not None:
+                for r in records:
+                    self._prefix_hash.update(r)
+            if self._index is not None:
+                # UC-3: File event source updates the sequence index with every strategy it appends
+                for strategies, r in zip(indexed, records):
+                    # A block contains many strategies, all of them are at the block's offset
+                    for seq, when in strategies:
+                        if seq > self._index.get_last_seq():
+                            self._index.add(seq, self._segment_index, start, when)
+                    start += len(r)
+                self._index.flush()
+            for strategies in indexed:
+                for seq, when in strategies:
+                    self._track_segment(seq)
+        else:
+            # We haven't indexed the strategies, which somebody else wrote before ours
+            self._invalidate_index()
+            self._segment_count = None
+
+    def _on_write_failed(self, ex: Exception) -> None:
+        # Called via the settings callback invoker, when the writer fails to flush the strategies it grouped
+        logger.error(f'Failed to append strategies to {self._get_filename()}, will retry', exc_info=ex)
+        self._write_error = ex
+
     def _append(self, strategies: list[AbstractStrategy]) -> None:
         # TODO: If compression is enabled and <base>-complete.<ext> file exists,
         #  then append to both files at the same time.
         # UC-2: For file source, new strategies get appended to the file immediately after execution
-        if self._watcher is not None:
-            self._watcher.unwatch(self._get_filename())
+        # UC-3: File source may group strategies appended within a short time window into a single write
+        with self._lock:
+            writer = self._get_writer()
+            if len(strategies) > 0 and self._is_rollover_due(strategies[0]):
+                self._roll_over()
+            if self._is_block_mode() or len(self._open_block) > 0:
+                self._append_to_block(strategies)
+            else:
+                self._pending_index.extend([(s.get_sequence(), s.get_when())] for s in strategies)
+                writer.append([self._serializer.to_record(self._serializer.serialize(s)) for s in strategies])
+            if len(strategies) > 0:
+                self._last_strategy = strategies[-1]
+            if self._checkpoint_writer is not None and self._is_checkpoint_due():
+                writer.flush()  # A checkpoint must not get ahead of the file
+                if self._in_sync:
+                    self._save_checkpoint()
+            if self._write_error is not None:
+                # The last deferred write failed, and its records are still pending. Retry them now,
+                # so that the caller gets the exception if it fails again.
+                self._write_error = None
+                writer.flush()
+
+    def _get_open_block_filename(self) -> str:
+        return f'{self._get_filename()}-block'
+
+    def _is_block_mode(self) -> bool:
+        return self._cryptograph.enabled and int(self.get_config_parameter(S.SOURCE_ENCRYPTION_BLOCK)) > 0
+
+    def _append_to_block(self, strategies: list[AbstractStrategy]) -> None:
+        # UC-2: File event source can encrypt strategies in blocks. The last block stays open until it's full, and is stored in a separate file until then.
+        self._open_block.extend(strategies)
+        block = self._serializer.to_record(self._serializer.serialize_block(self._open_block))
+        max_records = int(self.get_config_parameter(S.SOURCE_ENCRYPTION_BLOCK))
+        max_size = int(self.get_config_parameter(S.SOURCE_ENCRYPTION_BLOCK_SIZE)) * 1024
+        if not self._is_block_mode() or len(self._open_block) >= max_records or len(block) >= max_size:
+            self._seal_open_block(block)
+        else:
+            # The block is authenticated as a whole, and we replace the file atomically, so that
+            # it's never half-written
+            filename = self._get_open_block_filename()
+            temp_filename = f'{filename}-tmp'
+            with open(temp_filename, 'wb') as f:
+                f.write(block)
+            os.replace(temp_filename, filename)
+
+    def _seal_open_block(self, block: bytes | None = None) -> None:
+        # Appends the open block to the data file
+        if len(self._open_block) == 0:
+            return
+        if block is None:
+            block = self._serializer.to_record(self._serializer.serialize_block(self._open_block))
+        self._pending_index.append([(s.get_sequence(), s.get_when()) for s in self._open_block])
+        writer = self._get_writer()
+        writer.append([block])
+        # The open block file can only be deleted once the block is in the data file. If we crash
+        # in between, we'll skip the strategies from the open block, which are in the file already.
+        writer.flush()
+        self._open_block = list()
+        filename = self._get_open_block_filename()
+        if path.isfile(filename):
+            os.unlink(filename)
+
+    def _replay_open_block(self) -> AbstractStrategy | None:
+        # UC-2: File event source replays the strategies from the open encrypted block after the data file
+        filename = self._get_open_block_filename()
+        if not path.isfile(filename):
+            return None
+        last_executed = None
         try:
-            with open(self._get_filename(), 'a', encoding='UTF-8') as f:
-                for s in strategies:
-                    f.write(self._serializer.serialize(s) + '\n')
-        finally:
-            if self._watcher is not None:
-                self._watcher.watch(self._get_filename(), self._on_file_change)
+            with open(filename, 'rb') as f:
+                content = f.read()
+            end = self._serializer.find_record_end(content, 0, True)
+            records = self._serializer.split_block(self._serializer.from_record(content, 0, end))
+            if records is None:
+                raise Exception(f'{filename} does not contain a block of strategies')
+        except Exception as ex:
+            if self._ignore_errors:
+                logger.warning(f'Cannot read the open block from {filename} (ignored)', exc_info=ex)
+                return None
+            raise ex
+        for record in records:
+            try:
+                strategy = self._serializer.deserialize(record)
+                if strategy is None or strategy.get_sequence() <= self._last_seq:
+                    continue    # It got into the data file before we crashed
+                seq = strategy.get_sequence()
+                if not self._ignore_invalid_sequences and seq != self._last_seq + 1:
+                    self._sequence_error(self._last_seq, seq)
+                self._last_seq = seq
+                self._last_strategy = strategy
+                self.execute_prepared_strategy(strategy)
+                self._open_block.append(strategy)
+                last_executed = strategy
+            except Exception as ex:
+                if self._ignore_errors:
+                    logger.warning(f'Error processing {record} from the open block (ignored)', exc_info=ex)
+                else:
+                    raise ex
+        return last_executed
+
+    def _is_rollover_due(self, next_strategy: AbstractStrategy) -> bool:
+        mode = self.get_config_parameter(S.FILEEVENTSOURCE_SEGMENTS)
+        if mode == 'size':
+            limit = int(self.get_config_parameter(S.FILEEVENTSOURCE_SEGMENT_SIZE)) * 1024
+            return path.getsize(self._get_filename()) >= limit
+        elif mode == 'month':
+            previous = self._last_strategy
+            return previous is not None and \
+                (previous.get_when().year, previous.get_when().month) != \
+                (next_strategy.get_when().year, next_strategy.get_when().month)
+        return False
+
+    def _roll_over(self) -> None:
+        # UC-3: File event source seals the active segment of the data file once it grows too large, or a new month starts
+        if self._manifest is None:
+            self._manifest = Manifest.load(self._get_filename(), self._settings, self._cryptograph)
+        filename = self._get_filename()
+        self._get_writer().flush()
+        if path.getsize(filename) <= len(self._serializer.get_header()):
+            return  # Nothing to seal yet
+        # UC-3: File event source seals the segment using the sequences it tracked, and only reads it again if it doesn't know them
+        sequences = (self._segment_first_seq, self._segment_last_seq, self._segment_count) \
+            if self._in_sync and self._segment_count is not None else None
+        self._manifest.seal(self._settings, self._cryptograph, sequences)
+
+        # The new active segment must be readable on its own, so the binary serializer starts from scratch
+        header = self._serializer.get_header()
+        with open(filename, 'wb') as f:
+            f.write(header)
+            self._inode = os.fstat(f.fileno()).st_ino
+        self._serializer.set_state(None)
+        self._segment_index = len(self._manifest.segments)
+        self._reset_segment_tracking()
+        self._offset = len(header)
+        self._in_sync = True
+        if self._prefix_hash is not None:
+            self._prefix_hash = hashlib.sha256(header)
+
+        # Some watchers lose track of the files which got renamed
+        if self._watcher is not None:
+            self._watcher.unwatch(filename)
+            self._watcher.watch(filename, self._on_file_change)
 
     def get_name(self) -> str:
         return "File"
@@ -483,15 +1206,61 @@ class FileEventSource(AbstractEventSource[TRoot]):
 
     def _count_valid_strategies(self) -> int:
         valid_count = 0
-        with open(self._get_filename(), encoding='UTF-8') as f:
-            for line in f:
-                try:
-                    self._serializer.deserialize(line)
-                    valid_count += 1
-                except Exception as ex:
-                    pass    # We just want to count valid strategies in the original file
+        manifest = Manifest.load(self._get_filename(), self._settings, self._cryptograph)
+        for serializer, line, parsed, error in self._parse_all_records(manifest):
+            try:
+                if error is not None:
+                    continue
+                serializer.build(parsed)
+                valid_count += 1
+            except Exception as ex:
+                pass    # We just want to count valid strategies in the original file
         return valid_count
 
+    def _parse_all_records(self, manifest: Manifest) -> Iterable[tuple[AbstractSerializer, any, any, Exception | None]]:
+        # Reads and parses all segments of the data file, without affecting the current position. Yields
+        # the serializer, which has to build the strategy, the raw record, parsed record and the parsing error.
+        chunk_size = int(self.get_config_parameter(S.FILEEVENTSOURCE_PARSE_CHUNK))
+        for filename in manifest.get_files():
+            with open(filename, 'rb') as f:
+                serializer = self._get_reader(f)
+                chunk = list()
+                for raw, record in serializer.read_records(f):
+                    chunk.append(record)
+                    if len(chunk) >= chunk_size:
+                        yield from self._parse_all_chunk(serializer, chunk)
+                        chunk = list()
+                yield from self._parse_all_chunk(serializer, chunk)
+
+    @staticmethod
+    def _parse_all_chunk(serializer: AbstractSerializer,
+                         chunk: list) -> Iterable[tuple[AbstractSerializer, any, any, Exception | None]]:
+        for record, (parsed, error) in zip(chunk, serializer.parse_many(chunk)):
+            yield serializer, record, parsed, error
+
+    @contextmanager
+    def maintenance(self) -> Iterator[None]:
+        # UC-3: File event source maintenance operations (repair, compression, export) decrypt and parse each record only once, and release those records when they finish
+        # The file watcher and the writer change our state in other threads, holding this lock
+        with self._lock:
+            if self._maintenance_depth == 0:
+                max_records = int(self.get_config_parameter(S.FILEEVENTSOURCE_MAINTENANCE_CACHE))
+                self._record_cache = RecordCache(max_records) if max_records > 0 else None
+            self._maintenance_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._maintenance_depth -= 1
+                if self._maintenance_depth == 0:
+                    if self._record_cache is not None:
+                        logger.debug(f'Maintenance is over, releasing {self._record_cache}')
+                        self._record_cache.release()
+                        self._record_cache = None
+                        self._serializer.set_cache(None)
+                    # UC-3: The old backlogs, inflated by going through all workitems, are archived again after maintenance
+                    self._archive_old_backlogs(datetime.datetime.now(datetime.timezone.utc))
+
     def compress(self) -> list[str]:
         # 1. Creates a full log copy in <base>-complete.<ext>, if it doesn't exist yet.
         # 2. Rewrites the data file by recreating the CURRENT list of backlogs / workitems.
@@ -504,31 +1273,40 @@ class FileEventSource(AbstractEventSource[TRoot]):
         # UC-3: File source compression generates backup files with "-backup-<date>" suffix
 
         log = list()
+        self._seal_open_block()
 
-        valid_count = self._count_valid_strategies()
-        strategies = list(compressed_strategies(self))
-        savings = valid_count - len(strategies)
-        if valid_count > 0 and savings > 0:
-            savings_percentage = round(100.0 * savings / valid_count)
-            log.append(f'The compressed file contains {savings_percentage}% fewer strategies')
-            # UC-3: File event source compression won't do any changes if there's no savings
-            self._overwrite_file(strategies, log)
-        else:
-            log.append(f'No changes were made - the data is already compressed')
+        with self.maintenance():
+            valid_count = self._count_valid_strategies()
+            strategies = list(compressed_strategies(self))
+            savings = valid_count - len(strategies)
+            if valid_count > 0 and savings > 0:
+                savings_percentage = round(100.0 * savings / valid_count)
+                log.append(f'The compressed file contains {savings_percentage}% fewer strategies')
+                # UC-3: File event source compression won't do any changes if there's no savings
+                self._overwrite_file(strategies, log)
+            else:
+                log.append(f'No changes were made - the data is already compressed')
 
         # UC-3: File event source compression returns the log with the % of strategy savings
         return log
 
     def clone(self, new_root: TRoot, existing_strategies: Iterable[AbstractStrategy] | None = None) -> FileEventSource[TRoot]:
-        return FileEventSource[TRoot](self._settings,
-                                      self._cryptograph,
-                                      new_root,
-                                      self._watcher,
-                                      existing_strategies)
+        another = FileEventSource[TRoot](self._settings,
+                                         self._cryptograph,
+                                         new_root,
+                                         self._watcher,
+                                         existing_strategies)
+        # UC-3: The sources, cloned during maintenance operations (e.g. for export), share the decoded records with the original one
+        another._record_cache = self._record_cache
+        return another
 
     def disconnect(self):
         if self._watcher is not None:
             self._watcher.unwatch(self._get_filename())
+        if self._writer is not None:
+            self._writer.close()
+        if self._checkpoint_writer is not None:
+            self._checkpoint_writer.wait()
 
     def send_ping(self) -> str | None:
         raise Exception("FileEventSource does not support send_ping()")
@@ -22,7 +22,8 @@ from fk.core import events
 from fk.core.abstract_data_item import generate_uid
 from fk.core.abstract_event_source import AbstractEventSource
 from fk.core.abstract_serializer import AbstractSerializer
-from fk.core.abstract_strategy import AbstractStrategy
+from fk.core.abstract_settings import S
+from fk.core.abstract_strategy import AbstractStrategy, drain_strategies
 from fk.core.backlog import Backlog
 from fk.core.backlog_strategies import CreateBacklogStrategy, RenameBacklogStrategy, ReorderBacklogStrategy
 from fk.core.category import Category
@@ -46,15 +47,44 @@ logger = logging.getLogger(__name__)
 TRoot = TypeVar('TRoot')
 
 
+class _ExportFile:
+    # Writes strategies one per line, or in encrypted blocks of up to block_size strategies
+    _file: any
+    _serializer: AbstractSerializer
+    _block_size: int
+    _block: list[AbstractStrategy]
+
+    def __init__(self, filename: str, serializer: AbstractSerializer, block_size: int):
+        self._file = open(filename, 'w', encoding='UTF-8')
+        self._serializer = serializer
+        self._block_size = block_size
+        self._block = list()
+
+    def write(self, strategy: AbstractStrategy) -> None:
+        if self._block_size <= 0:
+            self._file.write(f'{self._serializer.serialize(strategy)}\n')
+            return
+        self._block.append(strategy)
+        if len(self._block) >= self._block_size:
+            self._write_block()
+
+    def _write_block(self) -> None:
+        if len(self._block) > 0:
+            self._file.write(f'{self._serializer.serialize_block(self._block)}\n')
+            self._block = list()
+
+    def close(self) -> None:
+        self._write_block()
+        self._file.close()
+
+
 def _export_message_processed(source: AbstractEventSource[TRoot],
                               another: AbstractEventSource[TRoot],
-                              export_file,
+                              export_file: _ExportFile,
                               progress_callback: Callable[[int, int], None],
                               every: int,
-                              strategy: AbstractStrategy[TRoot],
-                              export_serializer: AbstractSerializer) -> None:
-    serialized = export_serializer.serialize(strategy)
-    export_file.write(f'{serialized}\n')
+                              strategy: AbstractStrategy[TRoot]) -> None:
+    export_file.write(strategy)
     if another._estimated_count % every == 0:
         # UC-2: Export progress is displayed through the progress bar
         progress_callback(another._estimated_count, source._estimated_count)
@@ -64,7 +94,7 @@ def _export_message_processed(source: AbstractEventSource[TRoot],
 
 def _export_completed(source: AbstractEventSource[TRoot],
                       another: AbstractEventSource[TRoot],
-                      export_file,
+                      export_file: _ExportFile,
                       completion_callback: Callable[[int], None]) -> None:
     export_file.close()
     completion_callback(another._estimated_count)
@@ -195,7 +225,7 @@ def compressed_strategies(source: AbstractEventSource[TRoot]) -> Iterable[Abstra
 
     strategies.sort(key=lambda x: x.get_when())
     seq = 1
-    for s in strategies:
+    for s in drain_strategies(strategies):
         s.update_sequence(seq)
         seq += 1
         yield s
@@ -425,7 +455,7 @@ def merge_strategies(source: AbstractEventSource[TRoot],
                                        source.get_settings()))
 
         strategies.sort(key=lambda x: x.get_when())
-        for s in strategies:
+        for s in drain_strategies(strategies):
             s.update_sequence(seq)
             seq += 1
             yield s
@@ -433,12 +463,10 @@ def merge_strategies(source: AbstractEventSource[TRoot],
 
 def _export_compressed(source: AbstractEventSource[TRoot],
                        another: AbstractEventSource[TRoot],
-                       export_file,
-                       completion_callback: Callable[[int], None],
-                       export_serializer: AbstractSerializer) -> None:
+                       export_file: _ExportFile,
+                       completion_callback: Callable[[int], None]) -> None:
     for strategy in compressed_strategies(source):
-        serialized = export_serializer.serialize(strategy)
-        export_file.write(f'{serialized}\n')
+        export_file.write(strategy)
     _export_completed(source, another, export_file, completion_callback)
 
 
@@ -451,34 +479,36 @@ def export(source: AbstractEventSource[TRoot],
            progress_callback: Callable[[int, int], None],
            completion_callback: Callable[[int], None]) -> None:
     export_serializer = create_export_serializer(source, encrypt)
-    another = source.clone(new_root)
-    every = max(int(source._estimated_count / 100), 1)
-    export_file = open(filename, 'w', encoding='UTF-8')
-
-    if compress:
-        another.on(events.SourceMessagesProcessed,
-                   lambda **kwargs: _export_compressed(source,
-                                                       another,
-                                                       export_file,
-                                                       completion_callback,
-                                                       export_serializer))
-    else:
-        another.on(events.AfterMessageProcessed,
-                   lambda strategy, auto, **kwargs: None if auto else _export_message_processed(source,
-                                                                                                another,
-                                                                                                export_file,
-                                                                                                progress_callback,
-                                                                                                every,
-                                                                                                strategy,
-                                                                                                export_serializer))
-        another.on(events.SourceMessagesProcessed,
-                   lambda **kwargs: _export_completed(source,
-                                                      another,
-                                                      export_file,
-                                                      completion_callback))
-
-    start_callback(source._estimated_count)
-    another.start(mute_events=False)
+    # UC-3: Export shares the decoded records with the maintenance operations of the source, if it supports it
+    with source.maintenance():
+        another = source.clone(new_root)
+        every = max(int(source._estimated_count / 100), 1)
+        # UC-2: Encrypted exports group strategies in encrypted blocks, if it's configured for the data file
+        block_size = int(source.get_settings().get(S.SOURCE_ENCRYPTION_BLOCK)) if encrypt else 0
+        export_file = _ExportFile(filename, export_serializer, block_size)
+
+        if compress:
+            another.on(events.SourceMessagesProcessed,
+                       lambda **kwargs: _export_compressed(source,
+                                                           another,
+                                                           export_file,
+                                                           completion_callback))
+        else:
+            another.on(events.AfterMessageProcessed,
+                       lambda strategy, auto, **kwargs: None if auto else _export_message_processed(source,
+                                                                                                    another,
+                                                                                                    export_file,
+                                                                                                    progress_callback,
+                                                                                                    every,
+                                                                                                    strategy))
+            another.on(events.SourceMessagesProcessed,
+                       lambda **kwargs: _export_completed(source,
+                                                          another,
+                                                          export_file,
+                                                          completion_callback))
+
+        start_callback(source._estimated_count)
+        another.start(mute_events=False)
 
 
 def create_export_serializer(source: AbstractEventSource[TRoot], encrypt=False) -> AbstractSerializer:
@@ -687,6 +717,23 @@ def _merge_sources(existing_source,
     completion_callback(count)
 
 
+def _read_import_records(f, export_serializer: AbstractSerializer, ignore_errors: bool) -> Iterable[str]:
+    # UC-2: Classic import reads the strategies from encrypted blocks, as well as individual ones
+    for line in f:
+        try:
+            records = export_serializer.split_block(line)
+        except Exception as e:
+            if ignore_errors:
+                logger.warning('Ignored an error while importing', exc_info=e)
+                continue
+            else:
+                raise e
+        if records is None:
+            yield line
+        else:
+            yield from records
+
+
 def import_classic(source: AbstractEventSource[TRoot],
                    filename: str,
                    ignore_errors: bool,
@@ -731,9 +778,9 @@ def import_classic(source: AbstractEventSource[TRoot],
     # UC-2: Classic import will try to import as many strategies as possible, even if the file is encrypted with another key
 
     with open(filename, encoding='UTF-8') as f:
-        for line in f:
+        for record in _read_import_records(f, export_serializer, ignore_errors):
             try:
-                strategy = export_serializer.deserialize(line)
+                strategy = export_serializer.deserialize(record)
                 strategy.replace_user_identity(user_identity)
                 # UC-3: Classic import replaces user identity on the imported strategies with the current user
                 if strategy is None or type(strategy) is CreateUserStrategy:
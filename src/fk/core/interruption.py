@@ -24,6 +24,8 @@ logger = logging.getLogger(__name__)
 
 
 class Interruption(AbstractDataItem['Pomodoro']):
+    __slots__ = ('_reason', '_duration', '_void')
+
     _reason: str | None
     _duration: datetime.timedelta | None
     _void: bool
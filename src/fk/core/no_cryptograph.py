@@ -26,8 +26,20 @@ class NoCryptograph(AbstractCryptograph):
     def _on_key_changed(self) -> None:
         self.enabled = False
 
-    def encrypt(self, s: str) -> str:
+    def encrypt(self, s: str, seq: int | None = None) -> str:
         return s
 
     def decrypt(self, s: str) -> str:
         return s
+
+    def encrypt_bytes(self, b: bytes, seq: int | None = None) -> bytes:
+        return b
+
+    def decrypt_bytes(self, b: bytes) -> bytes:
+        return b
+
+    def decrypt_many(self, tokens: list[str]) -> list[str | None]:
+        return list(tokens)
+
+    def decrypt_bytes_many(self, tokens: list[bytes]) -> list[bytes | None]:
+        return list(tokens)
@@ -0,0 +1,216 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Iterable, Generic, TypeVar
+
+T = TypeVar('T')
+
+# Blocks hold between LOAD / 2 and 2 * LOAD values, except when there's only one block
+LOAD = 64
+
+
+class OrderedChildren(Generic[T]):
+    """Values, ordered by their unique float keys. They are stored in small sorted blocks, and a Fenwick
+    tree of the block sizes tells the position of each block. Inserting or removing a value by its key,
+    finding the position of a key and the key at a position take O(log n), plus shifting at most
+    2 * LOAD items within one block. Splitting and merging the blocks rebuilds the tree in O(n / LOAD),
+    but it only happens once per LOAD / 2 changes in that block. Unlike a linked structure, it only
+    adds a couple of pointers per value, which matters for thousands of pomodoros."""
+
+    __slots__ = ('_blocks', '_keys', '_maxes', '_tree', '_size', '_values')
+
+    _blocks: list[list[T]]
+    _keys: list[list[float]]
+    _maxes: list[float]     # The last key in each block
+    _tree: list[int]        # Fenwick tree of len(block)
+    _size: int
+    _values: list[T] | None     # All blocks together, until the order changes
+
+    def __init__(self):
+        self._blocks = list()
+        self._keys = list()
+        self._maxes = list()
+        self._tree = list()
+        self._size = 0
+        self._values = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterable[T]:
+        for block in self._blocks:
+            yield from block
+
+    def first(self) -> T | None:
+        return self._blocks[0][0] if self._size > 0 else None
+
+    def last_key(self) -> float | None:
+        return self._maxes[-1] if self._size > 0 else None
+
+    def values(self) -> list[T]:
+        # Most containers fit into a single block, so we return it as-is
+        if len(self._blocks) == 1:
+            return self._blocks[0]
+        if self._values is None:
+            self._values = [value for block in self._blocks for value in block]
+        return self._values
+
+    def _rebuild_tree(self) -> None:
+        tree = [len(block) for block in self._blocks]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _add_to_tree(self, b: int, delta: int) -> None:
+        tree = self._tree
+        while b < len(tree):
+            tree[b] += delta
+            b |= b + 1
+
+    def _count_before(self, b: int) -> int:
+        # How many values are in the blocks before b
+        count = 0
+        tree = self._tree
+        b -= 1
+        while b >= 0:
+            count += tree[b]
+            b = (b & (b + 1)) - 1
+        return count
+
+    def _locate(self, key: float) -> tuple[int, int]:
+        b = bisect_left(self._maxes, key)
+        if b < len(self._maxes):
+            keys = self._keys[b]
+            i = bisect_left(keys, key)
+            if keys[i] == key:
+                return b, i
+        raise KeyError(key)
+
+    def insert(self, key: float, value: T) -> None:
+        if self._size == 0:
+            self._blocks.append([value])
+            self._keys.append([key])
+            self._maxes.append(key)
+            self._tree.append(1)
+            self._size = 1
+            return
+        b = bisect_left(self._maxes, key)
+        if b == len(self._maxes):
+            b -= 1  # After all existing keys, so it goes to the end of the last block
+        self._values = None
+        keys = self._keys[b]
+        i = bisect_left(keys, key)
+        keys.insert(i, key)
+        self._blocks[b].insert(i, value)
+        self._maxes[b] = keys[-1]
+        self._size += 1
+        if len(keys) > 2 * LOAD:
+            self._split(b)
+        else:
+            self._add_to_tree(b, 1)
+
+    def append(self, value: T) -> float:
+        # A shortcut for adding the value after all the others, which is what happens most of
+        # the time. Returns the new key, which is larger than all the existing ones by one.
+        b = len(self._keys) - 1
+        if b < 0:
+            self._blocks.append([value])
+            self._keys.append([0.0])
+            self._maxes.append(0.0)
+            self._tree.append(1)
+            self._size = 1
+            return 0.0
+        key = self._maxes[b] + 1
+        keys = self._keys[b]
+        keys.append(key)
+        self._blocks[b].append(value)
+        self._maxes[b] = key
+        self._size += 1
+        if self._values is not None:
+            self._values.append(value)
+        if len(keys) > 2 * LOAD:
+            self._split(b)
+        elif b == 0:
+            self._tree[0] += 1
+        else:
+            self._add_to_tree(b, 1)
+        return key
+
+    def _split(self, b: int) -> None:
+        keys = self._keys[b]
+        block = self._blocks[b]
+        self._keys.insert(b + 1, keys[LOAD:])
+        self._blocks.insert(b + 1, block[LOAD:])
+        del keys[LOAD:]
+        del block[LOAD:]
+        self._maxes[b] = keys[-1]
+        self._maxes.insert(b + 1, self._keys[b + 1][-1])
+        self._rebuild_tree()
+
+    def remove(self, key: float) -> T:
+        b, i = self._locate(key)
+        self._values = None
+        keys = self._keys[b]
+        del keys[i]
+        value = self._blocks[b].pop(i)
+        self._size -= 1
+        if len(keys) == 0:
+            del self._keys[b]
+            del self._blocks[b]
+            del self._maxes[b]
+            self._rebuild_tree()
+        elif len(keys) < LOAD // 2 and len(self._keys) > 1:
+            self._maxes[b] = keys[-1]
+            self._merge(b if b > 0 else 1)
+        else:
+            self._maxes[b] = keys[-1]
+            self._add_to_tree(b, -1)
+        return value
+
+    def _merge(self, b: int) -> None:
+        # Appends block b to the one before it, and splits them again if the result is too large
+        self._keys[b - 1].extend(self._keys[b])
+        self._blocks[b - 1].extend(self._blocks[b])
+        del self._keys[b]
+        del self._blocks[b]
+        del self._maxes[b]
+        self._maxes[b - 1] = self._keys[b - 1][-1]
+        if len(self._keys[b - 1]) > 2 * LOAD:
+            self._split(b - 1)
+        else:
+            self._rebuild_tree()
+
+    def index_of(self, key: float) -> int:
+        b, i = self._locate(key)
+        return self._count_before(b) + i
+
+    def key_at(self, index: int) -> float:
+        if index < 0 or index >= self._size:
+            raise IndexError(index)
+        # Descends the Fenwick tree to the block, which contains this position
+        tree = self._tree
+        b = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step > 0:
+            if b + step <= len(tree) and tree[b + step - 1] <= index:
+                b += step
+                index -= tree[b - 1]
+            step >>= 1
+        return self._keys[b][index]
@@ -17,6 +17,7 @@ from __future__ import annotations
 
 import datetime
 import logging
+import sys
 
 from fk.core.abstract_data_container import AbstractDataContainer
 from fk.core.abstract_data_item import generate_uid
@@ -31,6 +32,9 @@ POMODORO_TYPE_COUNTER = 'counter'
 
 
 class Pomodoro(AbstractDataContainer[Interruption, 'Workitem']):
+    __slots__ = ('_is_planned', '_state', '_type', '_work_duration', '_rest_duration',
+                 '_date_work_started', '_date_rest_started', '_date_completed')
+
     _is_planned: bool
     _state: str
     _type: str
@@ -51,7 +55,8 @@ class Pomodoro(AbstractDataContainer[Interruption, 'Workitem']):
                  uid: str,
                  workitem: 'Workitem',
                  create_date: datetime.datetime):
-        super().__init__(name=f'Pomodoro {number}', uid=uid, parent=workitem, create_date=create_date)
+        # The names are the same for many pomodoros
+        super().__init__(name=sys.intern(f'Pomodoro {number}'), uid=uid, parent=workitem, create_date=create_date)
         self._is_planned = is_planned
         self._state = state
         self._type = type_
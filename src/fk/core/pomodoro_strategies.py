@@ -29,6 +29,7 @@ from fk.core.workitem import Workitem
 # AddPomodoro("123-456-789", "1", ["normal"])
 @strategy
 class AddPomodoroStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_num_pomodoros', '_type')
     _workitem_uid: str
     _num_pomodoros: int
     _type: str
@@ -59,12 +60,8 @@ class AddPomodoroStrategy(AbstractStrategy[Tenant]):
         if self._type not in [POMODORO_TYPE_NORMAL, POMODORO_TYPE_TRACKER, POMODORO_TYPE_COUNTER]:
             raise Exception(f'Unsupported pomodoro type: {self._type}')
 
-        workitem: Workitem | None = None
         user: User = data[self._user_identity]
-        for backlog in user.values():
-            if self._workitem_uid in backlog:
-                workitem = backlog[self._workitem_uid]
-                break
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
 
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
@@ -91,6 +88,7 @@ class AddPomodoroStrategy(AbstractStrategy[Tenant]):
 # RemovePomodoro("123-456-789", "1")
 @strategy
 class RemovePomodoroStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_num_pomodoros')
     _workitem_uid: str
     _num_pomodoros: int
 
@@ -117,12 +115,8 @@ class RemovePomodoroStrategy(AbstractStrategy[Tenant]):
         if self._num_pomodoros < 1:
             raise Exception(f'Cannot remove {self._num_pomodoros} pomodoro')
 
-        workitem: Workitem | None = None
         user: User = data[self._user_identity]
-        for backlog in user.values():
-            if self._workitem_uid in backlog:
-                workitem = backlog[self._workitem_uid]
-                break
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
 
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
@@ -155,6 +149,7 @@ class RemovePomodoroStrategy(AbstractStrategy[Tenant]):
 # AddInterruption("123-456-789", "reason", ["123.45"])
 @strategy
 class AddInterruptionStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_reason', '_duration')
     _workitem_uid: str
     _reason: str | None
     _duration: datetime.timedelta | None
@@ -187,11 +182,7 @@ class AddInterruptionStrategy(AbstractStrategy[Tenant]):
 
         # TODO: Make it timer strategy. Pass timer object into those strategies.
         #  Use timer instead of looking for pomodoros.
-        workitem: Workitem | None = None
-        for backlog in user.values():
-            if self._workitem_uid in backlog:
-                workitem = backlog[self._workitem_uid]
-                break
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
 
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
@@ -0,0 +1,89 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Stands for "not in the cache", as None is a valid cached value
+MISSING = object()
+
+
+class RecordCache:
+    """A bounded LRU cache of the decoded records, i.e. decrypted and parsed strategies or the
+    content of the encrypted blocks. The maintenance operations like repair, compression and export
+    read the entire data file, often more than once, and this way they decrypt each record only once.
+
+    The entries are keyed by the hash of the record content, so they stay valid even if the file is
+    rewritten or its records move around. The cached values don't depend on the serializer state,
+    so the cache can be shared by several serializers. It is thread-safe, as the records are parsed
+    on the worker threads."""
+
+    _max_records: int
+    _entries: OrderedDict[bytes, any]
+    _lock: threading.Lock
+    _hits: int
+    _misses: int
+
+    def __init__(self, max_records: int):
+        self._max_records = max_records
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(kind: str, record: str | bytes | memoryview) -> bytes:
+        # The kind tells apart the values of different types, e.g. parsed records and blocks
+        h = hashlib.blake2b(kind.encode('utf-8'), digest_size=16)
+        h.update(record.encode('utf-8') if isinstance(record, str) else record)
+        return h.digest()
+
+    def get(self, key: bytes) -> any:
+        with self._lock:
+            value = self._entries.get(key, MISSING)
+            if value is MISSING:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: bytes, value: any) -> None:
+        with self._lock:
+            if self._max_records <= 0:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_records:
+                self._entries.popitem(last=False)
+
+    def release(self) -> None:
+        # Somebody might still hold a reference to it, e.g. a cloned source, so we make sure it stays empty
+        with self._lock:
+            logger.debug(f'Releasing {self}')
+            self._max_records = 0
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return f'RecordCache with {len(self._entries)} records ({self._hits} hits, {self._misses} misses)'
@@ -0,0 +1,139 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+from array import array
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# We keep a random sample of the timings for the percentiles, so that the memory doesn't grow with the history
+MAX_SAMPLES = 10000
+
+# The phases are disjoint, except for "execute", which includes the events emitted by the strategy
+PHASE_DECRYPT = 'decrypt'       # Keyed by "records" or "blocks"
+PHASE_PARSE = 'parse'           # Keyed by the serializer class
+PHASE_AUTO_SEAL = 'auto_seal'   # Keyed by the strategy class, which triggered it
+PHASE_EXECUTE = 'execute'       # Keyed by the strategy class
+PHASE_PERSIST = 'persist'       # Keyed by the strategy class
+PHASE_EMIT = 'emit'             # Keyed by the event name
+
+
+class _Timings:
+    count: int
+    total: float
+    max: float
+    seen: int
+    samples: array
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.seen = 0
+        self.samples = array('d')
+
+    def add(self, elapsed: float, count: int) -> None:
+        # Batches, like decrypting many records at once, count as one sample of the average time per record
+        self.count += count
+        self.total += elapsed
+        sample = elapsed / count
+        self.max = max(self.max, sample)
+        self.seen += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(sample)
+        else:
+            i = random.randrange(self.seen)
+            if i < MAX_SAMPLES:
+                self.samples[i] = sample
+
+    def to_dict(self) -> dict:
+        samples = sorted(self.samples)
+
+        def percentile(p: int) -> float:
+            return _ms(samples[min(len(samples) - 1, len(samples) * p // 100)]) if len(samples) > 0 else 0
+
+        return {
+            'count': self.count,
+            'total_ms': _ms(self.total),
+            'mean_ms': _ms(self.total / self.count) if self.count > 0 else 0,
+            'p50_ms': percentile(50),
+            'p90_ms': percentile(90),
+            'p99_ms': percentile(99),
+            'max_ms': _ms(self.max),
+        }
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 4)
+
+
+class ReplayProfiler:
+    """Collects the counts and timings of replaying the strategies per phase, e.g. decryption or execution,
+    and per strategy class. Event sources and serializers only call it if it's set, so it costs nothing
+    when disabled. It is thread-safe, as the records are parsed on the worker threads."""
+
+    _timings: dict[tuple[str, str], _Timings]
+    _lock: threading.Lock
+    _started: float
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._timings = dict()
+            self._started = perf_counter()
+
+    def record(self, phase: str, key: str, started: float, count: int = 1) -> float:
+        # Returns the current time, so that the callers can time the consecutive phases with a single clock call
+        now = perf_counter()
+        with self._lock:
+            timings = self._timings.get((phase, key))
+            if timings is None:
+                timings = _Timings()
+                self._timings[(phase, key)] = timings
+            timings.add(now - started, count)
+        return now
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            phases = dict()
+            totals = dict[str, float]()
+            for (phase, key), timings in self._timings.items():
+                if phase not in phases:
+                    phases[phase] = {'count': 0, 'keys': dict()}
+                    totals[phase] = 0
+                phases[phase]['keys'][key] = timings.to_dict()
+                phases[phase]['count'] += timings.count
+                totals[phase] += timings.total
+            for phase, total in totals.items():
+                phases[phase]['total_ms'] = _ms(total)
+            return {
+                'elapsed_ms': _ms(perf_counter() - self._started),
+                'phases': phases,
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def __str__(self):
+        return f'ReplayProfiler with {len(self._timings)} timings'
@@ -0,0 +1,218 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+import json
+import logging
+import os
+from os import path
+
+from fk.core.abstract_cryptograph import AbstractCryptograph
+from fk.core.abstract_settings import AbstractSettings
+from fk.core.binary_serializer import create_serializer
+from fk.core.checkpoint import hash_file_prefix
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# A segmented data file consists of the sealed segments, listed in the manifest, followed by the
+# active segment, which is the data file itself. For example, flowkeeper-data.txt might come with
+# flowkeeper-data-00001.txt, flowkeeper-data-00002.txt and flowkeeper-data.txt-manifest. New
+# strategies are only appended to the active segment. Once it grows too large, or a new month
+# starts, it is renamed into a new sealed segment, which never changes after that. Data files
+# without a manifest are just a single active segment, so the old layout is read as-is.
+
+
+def get_manifest_filename(filename: str) -> str:
+    return f'{filename}-manifest'
+
+
+def get_segment_filename(filename: str, index: int) -> str:
+    base, ext = path.splitext(filename)
+    return f'{base}-{index:05d}{ext}'
+
+
+class Segment:
+    file: str           # Relative to the manifest, so that the whole set can be moved around
+    first_seq: int
+    last_seq: int
+    count: int
+    size: int
+    sha256: str
+
+    def __init__(self, file: str, first_seq: int, last_seq: int, count: int, size: int, sha256: str):
+        self.file = file
+        self.first_seq = first_seq
+        self.last_seq = last_seq
+        self.count = count
+        self.size = size
+        self.sha256 = sha256
+
+    def __str__(self):
+        return f'Segment {self.file} with {self.count} strategies, seq {self.first_seq} - {self.last_seq}'
+
+    def to_dict(self) -> dict:
+        return {
+            'file': self.file,
+            'first_seq': self.first_seq,
+            'last_seq': self.last_seq,
+            'count': self.count,
+            'size': self.size,
+            'sha256': self.sha256,
+        }
+
+    @staticmethod
+    def from_dict(d: dict) -> Segment:
+        return Segment(d['file'], d['first_seq'], d['last_seq'], d['count'], d['size'], d['sha256'])
+
+    @staticmethod
+    def describe(filename: str,
+                 settings: AbstractSettings,
+                 cryptograph: AbstractCryptograph,
+                 file: str | None = None) -> Segment:
+        # Reads the sequences of all records in the file. It is only needed when we recover a segment,
+        # which is missing from the manifest, or if the source didn't read the segment from its start.
+        # The invalid records are skipped, as the source would skip them with "ignore errors".
+        first_seq = None
+        last_seq = 0
+        count = 0
+        with open(filename, 'rb') as f:
+            serializer = create_serializer(f, settings, cryptograph)
+            for raw, record in serializer.read_records(f):
+                try:
+                    # The encrypted records might tell their sequence without decrypting them
+                    seq = serializer.get_bound_sequence(record)
+                    if seq is None:
+                        seq = serializer.peek_sequence(record)
+                except Exception as ex:
+                    logger.warning(f'Skipped invalid record while describing {filename}', exc_info=ex)
+                    continue
+                if seq is not None:
+                    if first_seq is None:
+                        first_seq = seq
+                    last_seq = seq
+                    count += 1
+        size = path.getsize(filename)
+        return Segment(file if file is not None else path.basename(filename),
+                       first_seq if first_seq is not None else 0,
+                       last_seq,
+                       count,
+                       size,
+                       hash_file_prefix(filename, size).hexdigest())
+
+    def verify(self, directory: str) -> bool:
+        # UC-3: Sealed segments are immutable, and we verify their checksum during the repair
+        filename = path.join(directory, self.file)
+        if not path.isfile(filename) or path.getsize(filename) != self.size:
+            return False
+        return hash_file_prefix(filename, self.size).hexdigest() == self.sha256
+
+
+class Manifest:
+    _filename: str
+    segments: list[Segment]
+
+    def __init__(self, filename: str, segments: list[Segment] | None = None):
+        self._filename = filename
+        self.segments = segments if segments is not None else list()
+
+    def __str__(self):
+        return f'Manifest for {self._filename} with {len(self.segments)} sealed segment(s)'
+
+    def get_files(self) -> list[str]:
+        # All segments in order, with the active one at the end
+        directory = path.dirname(self._filename)
+        return [path.join(directory, s.file) for s in self.segments] + [self._filename]
+
+    def save(self) -> None:
+        manifest_filename = get_manifest_filename(self._filename)
+        temp_filename = f'{manifest_filename}-tmp'
+        with open(temp_filename, 'w', encoding='UTF-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'segments': [s.to_dict() for s in self.segments],
+            }, f, indent=2)
+        os.replace(temp_filename, manifest_filename)
+
+    @staticmethod
+    def load(filename: str, settings: AbstractSettings, cryptograph: AbstractCryptograph) -> Manifest:
+        manifest = Manifest(filename)
+        manifest_filename = get_manifest_filename(filename)
+        if path.isfile(manifest_filename):
+            with open(manifest_filename, encoding='UTF-8') as f:
+                d = json.load(f)
+            if d['version'] != MANIFEST_VERSION:
+                raise Exception(f'Unsupported manifest version {d["version"]}')
+            manifest.segments = [Segment.from_dict(s) for s in d['segments']]
+
+        # If we crashed while sealing a segment, it might be missing from the manifest
+        recovered = False
+        while path.isfile(get_segment_filename(filename, len(manifest.segments) + 1)):
+            segment_filename = get_segment_filename(filename, len(manifest.segments) + 1)
+            logger.warning(f'Recovering segment {segment_filename}, which is missing from the manifest')
+            manifest.segments.append(Segment.describe(segment_filename, settings, cryptograph))
+            recovered = True
+        if recovered:
+            manifest.save()
+
+        for s in manifest.segments:
+            segment_filename = path.join(path.dirname(filename), s.file)
+            if not path.isfile(segment_filename):
+                raise Exception(f'Data file segment {segment_filename} is missing')
+            if path.getsize(segment_filename) != s.size:
+                logger.warning(f'Data file segment {segment_filename} was modified after it was sealed')
+        return manifest
+
+    def seal(self,
+             settings: AbstractSettings,
+             cryptograph: AbstractCryptograph,
+             sequences: tuple[int, int, int] | None = None) -> Segment:
+        # Renames the active segment into a new sealed one. The caller is responsible for
+        # creating a new active segment afterward. The sequences are (first, last, count), as
+        # tracked by the source while reading and appending. Without them, we have to read
+        # the file. Either way, the segment is described before it is renamed, so that the
+        # active segment stays in place if that fails.
+        segment_filename = get_segment_filename(self._filename, len(self.segments) + 1)
+        if sequences is None:
+            segment = Segment.describe(self._filename, settings, cryptograph, path.basename(segment_filename))
+        else:
+            size = path.getsize(self._filename)
+            segment = Segment(path.basename(segment_filename),
+                              *sequences,
+                              size,
+                              hash_file_prefix(self._filename, size).hexdigest())
+        os.rename(self._filename, segment_filename)
+        self.segments.append(segment)
+        try:
+            self.save()
+        except Exception as ex:
+            # Otherwise the next start would recover this segment, but we have no active one
+            self.segments.pop()
+            os.rename(segment_filename, self._filename)
+            raise ex
+        logger.info(f'Sealed {segment}')
+        return segment
+
+    def move_to_backup(self, suffix: str) -> list[str]:
+        # Used when the data file is overwritten with a single segment, e.g. after a repair
+        moved = list()
+        for f in self.get_files()[:-1] + [get_manifest_filename(self._filename)]:
+            if path.isfile(f):
+                os.rename(f, f'{f}{suffix}')
+                moved.append(f'{f}{suffix}')
+        self.segments.clear()
+        return moved
@@ -0,0 +1,175 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+import bisect
+import datetime
+import logging
+import os
+import struct
+import threading
+from os import path
+
+logger = logging.getLogger(__name__)
+
+# Sequence, segment, offset within that segment and the timestamp in microseconds since epoch
+ENTRY = struct.Struct('<QIQq')
+# Every TIME_STEP-th entry goes into the in-memory timestamp map, which we bisect
+TIME_STEP = 64
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def get_index_filename(filename: str) -> str:
+    return f'{filename}-index'
+
+
+def to_micros(when: datetime.datetime) -> int:
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    delta = when - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+class SequenceIndex:
+    """A sidecar file next to the data file, which maps each strategy sequence number to its
+    position in the data file. It has a fixed-size entry per strategy, in the order they appear
+    in the file. Timestamps are only mapped sparsely, as they are not guaranteed to grow
+    monotonically -- see find_first_after(). Just like checkpoints, it can be deleted at any time,
+    and the file source will rebuild it when needed."""
+
+    _filename: str
+    _seqs: list[int]
+    _positions: list[tuple[int, int]]
+    _whens: list[int]
+    _time_map: list[int]        # Running maximum of timestamps at every TIME_STEP-th entry
+    _pending: bytearray
+    _lock: threading.RLock
+    _in_memory: bool            # Never written to the sidecar file
+
+    def __init__(self, filename: str, in_memory: bool = False):
+        self._filename = filename
+        self._in_memory = in_memory
+        self._seqs = list()
+        self._positions = list()
+        self._whens = list()
+        self._time_map = list()
+        self._pending = bytearray()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._seqs)
+
+    def __str__(self):
+        return f'Sequence index {get_index_filename(self._filename)} with {len(self)} entries'
+
+    def _add(self, seq: int, segment: int, offset: int, when: int) -> None:
+        if len(self._whens) % TIME_STEP == 0:
+            self._time_map.append(max(when, self._time_map[-1]) if len(self._time_map) > 0 else when)
+        elif when > self._time_map[-1]:
+            self._time_map[-1] = when
+        self._seqs.append(seq)
+        self._positions.append((segment, offset))
+        self._whens.append(when)
+
+    @staticmethod
+    def load(filename: str) -> SequenceIndex | None:
+        index_filename = get_index_filename(filename)
+        if not path.isfile(index_filename):
+            return None
+        index = SequenceIndex(filename)
+        with open(index_filename, 'rb') as f:
+            content = f.read()
+        # Ignore the half-written entry at the end, if any
+        for seq, segment, offset, when in ENTRY.iter_unpack(content[:len(content) - len(content) % ENTRY.size]):
+            index._add(seq, segment, offset, when)
+        return index
+
+    @staticmethod
+    def delete(filename: str) -> None:
+        index_filename = get_index_filename(filename)
+        if path.isfile(index_filename):
+            try:
+                os.unlink(index_filename)
+            except Exception as ex:
+                logger.warning(f'Cannot delete index {index_filename}', exc_info=ex)
+
+    def create(self) -> None:
+        # Starts a new index file from scratch
+        with self._lock:
+            with open(get_index_filename(self._filename), 'wb'):
+                pass
+
+    def get_last_seq(self) -> int:
+        return self._seqs[-1] if len(self._seqs) > 0 else 0
+
+    def get_last_position(self) -> tuple[int, int, int] | None:
+        # Returns sequence, segment and offset of the last indexed strategy
+        with self._lock:
+            if len(self._seqs) == 0:
+                return None
+            return self._seqs[-1], self._positions[-1][0], self._positions[-1][1]
+
+    def add(self, seq: int, segment: int, offset: int, when: datetime.datetime) -> None:
+        # Entries are buffered until flush()
+        with self._lock:
+            micros = to_micros(when)
+            self._add(seq, segment, offset, micros)
+            if not self._in_memory:
+                self._pending.extend(ENTRY.pack(seq, segment, offset, micros))
+
+    def flush(self) -> None:
+        with self._lock:
+            if len(self._pending) > 0:
+                with open(get_index_filename(self._filename), 'ab') as f:
+                    f.write(self._pending)
+                self._pending = bytearray()
+
+    def find(self, seq: int) -> tuple[int, int] | None:
+        # Returns segment and offset of the strategy with this sequence number, if it's there.
+        # Sequences in the data file grow monotonically, unless it needs a repair.
+        with self._lock:
+            i = bisect.bisect_left(self._seqs, seq)
+            if i < len(self._seqs) and self._seqs[i] == seq:
+                return self._positions[i]
+            return None
+
+    def find_first_after(self, when: datetime.datetime) -> int | None:
+        # Returns the sequence of the first strategy with timestamp >= when. Timestamps might go
+        # back a little, e.g. if the clock was adjusted, so we first bisect the running maximum
+        # of the sparse samples to find the first block, which might contain it, and then scan
+        # the dense entries from there.
+        with self._lock:
+            micros = to_micros(when)
+            i = bisect.bisect_left(self._time_map, micros)
+            for j in range(i * TIME_STEP, len(self._whens)):
+                if self._whens[j] >= micros:
+                    return self._seqs[j]
+            return None
+
+    def get_tail_seq(self, count: int) -> int | None:
+        # Returns the sequence of the count-th strategy from the end
+        with self._lock:
+            if len(self._seqs) == 0:
+                return None
+            return self._seqs[max(0, len(self._seqs) - count)]
+
+    def check_continuity(self) -> list[tuple[int, int]]:
+        # Returns all pairs of the neighbour sequence numbers, which don't go one after another
+        with self._lock:
+            return [(self._seqs[i - 1], self._seqs[i])
+                    for i in range(1, len(self._seqs))
+                    if self._seqs[i] != self._seqs[i - 1] + 1]
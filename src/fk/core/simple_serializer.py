@@ -13,6 +13,7 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import functools
 import logging
 import re
 from datetime import datetime
@@ -26,6 +27,16 @@ from fk.core.strategy_factory import STRATEGIES
 
 logger = logging.getLogger(__name__)
 TRoot = TypeVar('TRoot')
+BLOCK_PREFIX = '*'
+
+USER_REGEX = re.compile(r'[\w\-.]+@(?:[\w-]+\.)+[\w-]{2,4}')
+WHEN_CHARS = frozenset('0123456789: .-+')
+
+
+@functools.lru_cache(maxsize=256)
+def _is_valid_user(user: str) -> bool:
+    # There are very few distinct users in a data file, so we don't need to match the regex each time
+    return USER_REGEX.fullmatch(user) is not None
 
 
 class SimpleSerializer(AbstractSerializer[str, TRoot]):
@@ -45,7 +56,7 @@ class SimpleSerializer(AbstractSerializer[str, TRoot]):
     def escape_parameter(value):
         return value.replace('\\', '\\\\').replace('"', '\\"')
 
-    def serialize(self, s: AbstractStrategy) -> str:
+    def _serialize_plaintext(self, s: AbstractStrategy) -> str:
         # Escape params
         escaped = [SimpleSerializer.escape_parameter(p) for p in s.get_params()]
         if len(escaped) < 2:
@@ -53,18 +64,55 @@ class SimpleSerializer(AbstractSerializer[str, TRoot]):
         if len(escaped) < 2:
             escaped.append("")
         params = '"' + '", "'.join(escaped) + '"'
-        plaintext = f'{s.get_sequence()}, {s.get_when()}, {s.get_user_identity()}: {s.get_name()}({params})'
+        return f'{s.get_sequence()}, {s.get_when()}, {s.get_user_identity()}: {s.get_name()}({params})'
+
+    def serialize(self, s: AbstractStrategy) -> str:
+        plaintext = self._serialize_plaintext(s)
         if self._cryptograph.enabled and s.encryptable():
-            return '+' + self._cryptograph.encrypt(plaintext)
+            return '+' + self._cryptograph.encrypt(plaintext, s.get_sequence())
         else:
             return plaintext
 
     def deserialize(self, t: str) -> AbstractStrategy[TRoot] | None:
+        return self.build(self.parse(t))
+
+    def parse(self, t: str) -> tuple | None:
         if t.startswith('+'):
-            plaintext = self._cryptograph.decrypt(t[1:])
+            return self._parse_authenticated(t, self._cryptograph.decrypt(t[1:]))
+        elif t.startswith(BLOCK_PREFIX):
+            # Blocks are split while reading, so we can only get here if we couldn't decrypt it
+            self.split_block(t)
+            raise Exception(f'Unexpected block of strategies: {t[:50]}')
         else:
-            plaintext = t
+            return self.parse_decrypted(t)
 
+    def serialize_block(self, strategies: list[AbstractStrategy]) -> str:
+        # UC-2: Strategies can be encrypted in blocks, with one line per block
+        plaintext = '\n'.join(self._serialize_plaintext(s) for s in strategies)
+        return BLOCK_PREFIX + self._cryptograph.encrypt(plaintext, strategies[0].get_sequence())
+
+    def split_block(self, t: str) -> list[str] | None:
+        if not t.startswith(BLOCK_PREFIX):
+            return None
+        records = self._cryptograph.decrypt(t[1:].rstrip('\n')).split('\n')
+        bound = self._cryptograph.get_bound_sequence(t[1:])
+        if bound is not None and self.parse_decrypted(records[0])[0] != bound:
+            raise Exception(f'Encrypted block is bound to sequence {bound}, but starts with another one')
+        return records
+
+    def get_bound_sequence(self, t: str) -> int | None:
+        return self._cryptograph.get_bound_sequence(t[1:]) if t.startswith('+') else None
+
+    def _parse_batch(self, records: list[str]) -> list[tuple[tuple | None, Exception | None]]:
+        # UC-2: Encrypted strategies are decrypted in batches
+        encrypted = [i for i, t in enumerate(records) if t.startswith('+')]
+        decrypted = [None] * len(records)
+        if len(encrypted) > 0:
+            for i, plaintext in zip(encrypted, self._decrypt_batch(self._cryptograph.decrypt_many, [records[i][1:] for i in encrypted])):
+                decrypted[i] = plaintext
+        return self._parse_each(records, decrypted)
+
+    def parse_decrypted(self, plaintext: str) -> tuple | None:
         # Empty strings and comments are special cases
         if plaintext.strip() == '' or plaintext.startswith('#'):
             # UC-3: For all event sources, empty lines and #comments are ignored
@@ -73,26 +121,109 @@ class SimpleSerializer(AbstractSerializer[str, TRoot]):
 
         # TODO: Remove this once the server is updated
         if plaintext == 'ReplayCompleted()':
-            return STRATEGIES['ReplayCompleted'](0, None, None, [], self._settings, self._cryptograph)
+            return 0, None, None, 'ReplayCompleted', []
 
-        m = self.REGEX.search(plaintext)
-        if m is not None:
-            name = m.group(4)
-            if name not in STRATEGIES:
-                raise Exception(f"Unknown strategy: {name}")
+        # UC-3: Strategies in the canonical format are parsed without regular expressions, the rest fall back to the regex
+        tokens = self.tokenize(plaintext)
+        if tokens is None:
+            tokens = self.tokenize_with_regex(plaintext)
+        seq, when, user, name, params = tokens
+        if name not in STRATEGIES:
+            raise Exception(f"Unknown strategy: {name}")
 
-            seq = int(m.group(1))
-            when = datetime.fromisoformat(m.group(2))
-            user = m.group(3)
-            params = list(filter(lambda p: p is not None, m.groups()[4:]))
-            params = [p.replace('\\"', '"').replace('\\\\', '\\') for p in params]
+        seq = int(seq)
+        when = datetime.fromisoformat(when)
 
-            if logger.isEnabledFor(logging.DEBUG):
-                logger.debug(f"Deserialized string to strategy: '{seq}' / '{when}' / '{user}' / '{name}' / {params}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Deserialized string to strategy: '{seq}' / '{when}' / '{user}' / '{name}' / {params}")
 
-            return STRATEGIES[name](seq, when, user, params, self._settings, self._cryptograph)
-        else:
+        return seq, when, user, name, params
+
+    @staticmethod
+    def tokenize_with_regex(plaintext: str) -> tuple[str, str, str, str, list[str]]:
+        m = SimpleSerializer.REGEX.search(plaintext)
+        if m is None:
             raise Exception(f"Bad syntax: {plaintext}")
+        params = list(filter(lambda p: p is not None, m.groups()[4:]))
+        params = [p.replace('\\"', '"').replace('\\\\', '\\') for p in params]
+        return m.group(1), m.group(2), m.group(3), m.group(4), params
+
+    @staticmethod
+    def tokenize(plaintext: str) -> tuple[str, str, str, str, list[str]] | None:
+        # A single pass over the strategy in the canonical format, i.e. exactly as serialize() writes it:
+        #   seq, when, user: Name("p1", "p2", ...)
+        # It returns the same tokens as tokenize_with_regex(), or None if the string deviates from the
+        # canonical format in any way, e.g. has extra whitespace. In this case we leave it to the regex.
+        if plaintext.endswith('\n'):
+            # That's how the records come from files. The regex ignores everything after the closing parenthesis.
+            plaintext = plaintext[:-1]
+        fields = plaintext.split(', ', 2)
+        if len(fields) < 3:
+            return None
+        seq, when, rest = fields
+        user, colon, rest = rest.partition(': ')
+        name, paren, args = rest.partition('(')
+        if colon == '' or paren == '':
+            return None
+
+        if not seq.isascii() or not seq.isdigit() or seq[0] == '0':
+            return None
+        if when == '' or when[0] == ' ' or not WHEN_CHARS.issuperset(when):
+            return None
+        if not _is_valid_user(user):
+            return None
+        if not name.isascii() or not name.isalpha():
+            return None
+
+        if '\\' in args:
+            params = SimpleSerializer._tokenize_escaped_params(args)
+        else:
+            # Without escape characters, there can be no quotes inside the parameters
+            if len(args) < 3 or args[0] != '"' or not args.endswith('")'):
+                return None
+            inner = args[1:-2]
+            params = inner.split('", "')
+            if inner.count('"') != 2 * (len(params) - 1):
+                return None
+
+        # The regex only captures the first three and the last parameter
+        if params is None or len(params) > 4:
+            return None
+        return seq, when, user, name, params
+
+    @staticmethod
+    def _tokenize_escaped_params(args: str) -> list[str] | None:
+        params = list()
+        if not args.startswith('"'):
+            return None
+        pos = 1
+        value = ''
+        while True:
+            quote = args.find('"', pos)
+            if quote < 0:
+                return None
+            backslash = args.find('\\', pos, quote)
+            if backslash >= 0:
+                escaped = args[backslash + 1:backslash + 2]
+                if escaped != '"' and escaped != '\\':
+                    return None
+                value += args[pos:backslash] + escaped
+                pos = backslash + 2
+                continue
+            params.append(value + args[pos:quote])
+            value = ''
+            if args.startswith(', "', quote + 1):
+                pos = quote + 4
+            elif args.startswith(')', quote + 1):
+                return params
+            else:
+                return None
+
+    def build(self, parsed: tuple | None) -> AbstractStrategy[TRoot] | None:
+        if parsed is None:
+            return None
+        seq, when, user, name, params = parsed
+        return STRATEGIES[name](seq, when, user, params, self._settings, self._cryptograph)
 
     def __str__(self):
         return f'SimpleSerializer with settings {self._settings} and cryptograph {self._cryptograph}'
@@ -25,7 +25,10 @@ logger = logging.getLogger(__name__)
 
 
 class Tag(AbstractDataItem['Tags']):
+    __slots__ = ('_workitems', '_archived')
+
     _workitems: set[Workitem]
+    _archived: set['Backlog']     # Archived backlogs with the workitems tagged with it
 
     def __init__(self,
                  name: str,
@@ -35,18 +38,36 @@ class Tag(AbstractDataItem['Tags']):
                          parent=user.get_tags(),
                          create_date=create_date)
         self._workitems = set[Workitem]()
+        self._archived = set['Backlog']()
 
     def __str__(self):
         return f'#{self.get_uid()}'
 
     def get_workitems(self) -> set[Workitem]:
+        for backlog in list(self._archived):
+            backlog.inflate()   # This will move its workitems to self._workitems
         return self._workitems
 
+    def has_workitem(self, workitem: Workitem) -> bool:
+        # Archived workitems can't be passed here, as we'd have to inflate them first
+        return workitem in self._workitems
+
+    def is_empty(self) -> bool:
+        return len(self._workitems) == 0 and len(self._archived) == 0
+
     def add_workitem(self, workitem: Workitem) -> None:
         self._workitems.add(workitem)
+        self._parent._link(self, workitem)
 
     def remove_workitem(self, workitem: Workitem) -> None:
         self._workitems.remove(workitem)
+        self._parent._unlink(self, workitem)
+
+    def add_archived(self, backlog: 'Backlog') -> None:
+        self._archived.add(backlog)
+
+    def remove_archived(self, backlog: 'Backlog') -> None:
+        self._archived.discard(backlog)
 
     def dump(self, indent: str = '', mask_uid: bool = False, mask_last_modified: bool = False) -> str:
         return f'{super().dump(indent, mask_uid, mask_last_modified)}\n' \
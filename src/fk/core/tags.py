@@ -24,11 +24,36 @@ def sanitize_tag(tag: str) -> str:
 
 
 class Tags(AbstractDataContainer[Tag, 'User']):
+    # The reverse side of Tag.get_workitems(), so that we know the tags of a workitem without scanning all
+    # tags or parsing its name. Tag.add_workitem() and remove_workitem() keep both sides in sync.
+    __slots__ = ('_workitem_tags',)
+
+    _workitem_tags: dict['Workitem', set[Tag]]
+
     def __init__(self, user: 'User'):
         super().__init__(f'Tags',
                          user,
                          f'tags-{user.get_identity()}',
                          user.get_create_date())
+        self._workitem_tags = dict()
+
+    def get_workitem_tags(self, workitem: 'Workitem') -> set[Tag]:
+        # Like Tag.has_workitem(), it doesn't know about the workitems of the archived backlogs
+        return set(self._workitem_tags.get(workitem, ()))
+
+    def _link(self, tag: Tag, workitem: 'Workitem') -> None:
+        tags = self._workitem_tags.get(workitem)
+        if tags is None:
+            tags = set[Tag]()
+            self._workitem_tags[workitem] = tags
+        tags.add(tag)
+
+    def _unlink(self, tag: Tag, workitem: 'Workitem') -> None:
+        tags = self._workitem_tags.get(workitem)
+        if tags is not None:
+            tags.discard(tag)
+            if len(tags) == 0:
+                del self._workitem_tags[workitem]
 
     def __str__(self):
         return f'Tags {self.get_name()}'
@@ -17,16 +17,22 @@ import datetime
 
 from fk.core.abstract_data_container import AbstractDataContainer
 from fk.core.abstract_settings import AbstractSettings
+from fk.core.backlog import Backlog
+from fk.core.tag import Tag
+from fk.core.uid_index import UidIndex
 from fk.core.user import User
+from fk.core.workitem import Workitem
 
 ADMIN_USER = 'admin@local.host'
 
 
 class Tenant(AbstractDataContainer[User, None]):
     """Tenant is the root of the data hierarchy in Flowkeeper Client.
-    It contains users and has no parent."""
+    It contains users and has no parent. It also keeps the index of all backlogs, workitems and tags
+    by their UIDs, so that we can find them without going through all users."""
 
     _settings: AbstractSettings
+    _uid_index: UidIndex
 
     def __init__(self, settings: AbstractSettings):
         super().__init__('Flowkeeper Desktop Client',
@@ -34,6 +40,7 @@ class Tenant(AbstractDataContainer[User, None]):
                          '0',
                          datetime.datetime.now(datetime.timezone.utc))
         self._settings = settings
+        self._uid_index = UidIndex()
         self[ADMIN_USER] = User(
             self,
             ADMIN_USER,
@@ -50,3 +57,15 @@ class Tenant(AbstractDataContainer[User, None]):
 
     def get_current_user(self) -> User:
         return self[self._settings.get_username()]
+
+    def get_uid_index(self) -> UidIndex:
+        return self._uid_index
+
+    def find_workitem(self, uid: str) -> Workitem | None:
+        return self._uid_index.find_workitem(uid)
+
+    def find_backlog(self, uid: str) -> Backlog | None:
+        return self._uid_index.find_backlog(uid)
+
+    def find_tag(self, uid: str) -> Tag | None:
+        return self._uid_index.find_tag(uid)
@@ -30,6 +30,7 @@ from fk.core.workitem import Workitem
 # StartTimer("123-456-789", ["1500", ["300"]])
 @strategy
 class StartTimerStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_work_duration', '_rest_duration')
     _workitem_uid: str
     _work_duration: float
     _rest_duration: float
@@ -64,12 +65,11 @@ class StartTimerStrategy(AbstractStrategy[Tenant]):
                      uid: str,
                      fail_if_not_found: bool = True,
                      fail_if_sealed: bool = False) -> Workitem | None:
-        for backlog in self.get_user(data).values():
-            if uid in backlog:
-                workitem: Workitem = backlog[uid]
-                if fail_if_sealed and workitem.is_sealed():
-                    raise Exception(f'Cannot start timer at {self.get_sequence()} because workitem "{uid}" is sealed')
-                return workitem
+        workitem = self.get_user(data).find_workitem(uid)
+        if workitem is not None:
+            if fail_if_sealed and workitem.is_sealed():
+                raise Exception(f'Cannot start timer at {self.get_sequence()} because workitem "{uid}" is sealed')
+            return workitem
 
         if fail_if_not_found:
             raise Exception(f'Cannot start timer at at {self.get_sequence()} because workitem "{uid}" not found')
@@ -122,6 +122,8 @@ class StartTimerStrategy(AbstractStrategy[Tenant]):
 # This strategy assumes an explicit stop by the end user. Timer rings do not produce this strategy.
 @strategy
 class StopTimerStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ()
+
     def __init__(self,
                  seq: int,
                  when: datetime.datetime,
@@ -185,6 +187,8 @@ class StopTimerStrategy(AbstractStrategy[Tenant]):
 
 
 class TimerRingInternalStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ()
+
     def __init__(self,
                  seq: int,
                  when: datetime.datetime,
@@ -254,6 +258,7 @@ class TimerRingInternalStrategy(AbstractStrategy[Tenant]):
 # DEPRECATED, use StartTimerStrategy instead
 @strategy
 class StartWorkStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_work_duration', '_rest_duration')
     _workitem_uid: str
     _work_duration: float
     _rest_duration: float
@@ -292,6 +297,7 @@ class StartWorkStrategy(AbstractStrategy[Tenant]):
 # DEPRECATED, use StopTimerStrategy instead
 @strategy
 class VoidPomodoroStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid',)
     _workitem_uid: str
 
     def __init__(self,
@@ -324,6 +330,8 @@ class VoidPomodoroStrategy(AbstractStrategy[Tenant]):
 # DEPRECATED, use StopTimerStrategy instead
 @strategy
 class FinishTrackingStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ()
+
     def __init__(self,
                  seq: int,
                  when: datetime.datetime,
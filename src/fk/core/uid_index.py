@@ -0,0 +1,139 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+from fk.core.abstract_data_container import AbstractDataContainer
+from fk.core.abstract_data_item import AbstractDataItem
+from fk.core.backlog import Backlog
+from fk.core.tag import Tag
+from fk.core.user import User
+from fk.core.workitem import Workitem
+
+
+class UidIndex:
+    """Tenant-wide dictionaries of backlogs, workitems and tags by their UIDs. The data containers keep
+    it up to date as their children get added or removed, including the whole subtrees, e.g. when a User
+    with all its backlogs is added to the Tenant. The workitems of the archived backlogs are indexed
+    by their UIDs, too, but they point to the backlog, which has to be inflated to get them. UIDs are
+    only unique per user, so each UID maps to a list of objects, and the lookups return the latest one."""
+
+    _backlogs: dict[str, list[Backlog]]
+    _workitems: dict[str, list[Workitem]]
+    _archived: dict[str, list[Backlog]]
+    _tags: dict[str, list[Tag]]
+
+    def __init__(self):
+        self._backlogs = dict()
+        self._workitems = dict()
+        self._archived = dict()
+        self._tags = dict()
+
+    @staticmethod
+    def _put(items: dict[str, list], uid: str, item: AbstractDataItem) -> None:
+        # Data items are equal when their UIDs are, so we compare them by identity here
+        found = items.setdefault(uid, list())
+        if not any(i is item for i in found):
+            found.append(item)
+
+    @staticmethod
+    def _drop(items: dict[str, list], uid: str, item: AbstractDataItem) -> None:
+        # Another user might have an object with the same UID, e.g. a tag, so we only remove this one
+        found = items.get(uid, ())
+        for i, existing in enumerate(found):
+            if existing is item:
+                del found[i]
+                if len(found) == 0:
+                    del items[uid]
+                return
+
+    @staticmethod
+    def _last(items: dict[str, list], uid: str) -> AbstractDataItem | None:
+        found = items.get(uid)
+        return found[-1] if found else None
+
+    def add(self, item: AbstractDataItem) -> None:
+        if isinstance(item, Workitem):
+            self._put(self._workitems, item.get_uid(), item)
+            self._drop(self._archived, item.get_uid(), item.get_parent())
+        elif isinstance(item, Backlog):
+            self._put(self._backlogs, item.get_uid(), item)
+            if item.is_archived():
+                self.add_archived(item)
+            else:
+                # Bypassing Backlog.values(), as it is not archived anyway
+                for workitem in AbstractDataContainer.values(item):
+                    self.add(workitem)
+        elif isinstance(item, Tag):
+            self._put(self._tags, item.get_uid(), item)
+        elif isinstance(item, User):
+            for backlog in AbstractDataContainer.values(item):
+                self.add(backlog)
+            for tag in item.get_tags().values():
+                self.add(tag)
+
+    def remove(self, item: AbstractDataItem) -> None:
+        if isinstance(item, Workitem):
+            self._drop(self._workitems, item.get_uid(), item)
+        elif isinstance(item, Backlog):
+            self._drop(self._backlogs, item.get_uid(), item)
+            for uid in item.get_archived_uids():
+                self._drop(self._archived, uid, item)
+            for workitem in AbstractDataContainer.values(item):
+                self.remove(workitem)
+        elif isinstance(item, Tag):
+            self._drop(self._tags, item.get_uid(), item)
+        elif isinstance(item, User):
+            for backlog in AbstractDataContainer.values(item):
+                self.remove(backlog)
+            for tag in item.get_tags().values():
+                self.remove(tag)
+
+    def add_archived(self, backlog: Backlog) -> None:
+        # Called when the backlog gets archived, after it has forgotten its workitems
+        for uid in backlog.get_archived_uids():
+            for workitem in list(self._workitems.get(uid, ())):
+                if workitem.get_parent() is backlog:
+                    self._drop(self._workitems, uid, workitem)
+            self._put(self._archived, uid, backlog)
+
+    @staticmethod
+    def _owned_by(items: dict[str, list], uid: str, owner: User) -> AbstractDataItem | None:
+        for item in reversed(items.get(uid, ())):
+            if item.get_owner() is owner:
+                return item
+        return None
+
+    def find_workitem(self, uid: str, owner: User | None = None) -> Workitem | None:
+        # If the owner is specified, then we only look at the workitems of that user
+        find = self._last if owner is None else lambda items, u: self._owned_by(items, u, owner)
+        workitem = find(self._workitems, uid)
+        if workitem is None:
+            backlog = find(self._archived, uid)
+            if backlog is not None:
+                # Only inflates the archived backlog, which contains this workitem
+                backlog.inflate()
+                workitem = find(self._workitems, uid)
+        return workitem
+
+    def find_backlog(self, uid: str) -> Backlog | None:
+        return self._last(self._backlogs, uid)
+
+    def find_tag(self, uid: str) -> Tag | None:
+        return self._last(self._tags, uid)
+
+    def __str__(self):
+        return f'UidIndex with {len(self._backlogs)} backlogs, {len(self._workitems)} workitems ' \
+               f'({len(self._archived)} archived) and {len(self._tags)} tags'
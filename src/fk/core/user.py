@@ -24,6 +24,7 @@ from fk.core.pomodoro import POMODORO_TYPE_NORMAL, POMODORO_TYPE_TRACKER
 from fk.core.standard_categories import create_system_categories
 from fk.core.tags import Tags
 from fk.core.timer_data import TimerData
+from fk.core.workitem import Workitem
 
 
 class User(AbstractDataContainer[Backlog, 'Tenant']):
@@ -31,6 +32,7 @@ class User(AbstractDataContainer[Backlog, 'Tenant']):
     _tags: Tags
     _root_category: Category
     _timer: TimerData
+    _own_index: 'UidIndex | None'
 
     def __init__(self,
                  data: 'Tenant',
@@ -38,6 +40,7 @@ class User(AbstractDataContainer[Backlog, 'Tenant']):
                  name: str,
                  create_date: datetime.datetime,
                  is_system_user: bool):
+        self._own_index = None
         super().__init__(name, data, identity, create_date)
         self._is_system_user = is_system_user
         self._tags = Tags(self)
@@ -48,6 +51,15 @@ class User(AbstractDataContainer[Backlog, 'Tenant']):
     def __str__(self):
         return f'User "{self.get_name()} <{self.get_uid()}>"'
 
+    def get_uid_index(self) -> 'UidIndex':
+        # The users, which are not attached to a Tenant, e.g. in tests, index their own data
+        if self._parent is not None:
+            return self._parent.get_uid_index()
+        if self._own_index is None:
+            from fk.core.uid_index import UidIndex     # It imports this module
+            self._own_index = UidIndex()
+        return self._own_index
+
     def get_identity(self) -> str:
         return self.get_uid()
 
@@ -72,6 +84,10 @@ class User(AbstractDataContainer[Backlog, 'Tenant']):
     def get_root_category(self) -> Category:
         return self._root_category
 
+    def find_workitem(self, uid: str) -> Workitem | None:
+        # UC-3: Strategies find their workitems using the UID index, not by looking through all backlogs
+        return self.get_uid_index().find_workitem(uid, self)
+
     def find_category_by_id(self, category_id, parent_category: Category = None, raise_if_not_found: bool = False) -> Category|None:
         if parent_category is None:
             parent_category = self._root_category
@@ -32,6 +32,7 @@ def is_system_user(user_identity: str):
 # CreateUser("alice@example.com", "Alice Cooper")
 @strategy
 class CreateUserStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_target_user_identity', '_user_name')
     _target_user_identity: str
     _user_name: str
 
@@ -71,6 +72,7 @@ class CreateUserStrategy(AbstractStrategy[Tenant]):
 # DeleteUser("alice@example.com", "")
 @strategy
 class DeleteUserStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_target_user_identity',)
     _target_user_identity: str
 
     def get_target_user_identity(self) -> str:
@@ -123,6 +125,7 @@ class DeleteUserStrategy(AbstractStrategy[Tenant]):
 # RenameUser("alice@example.com", "Alice Cooper")
 @strategy
 class RenameUserStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_target_user_identity', '_new_user_name')
     _target_user_identity: str
     _new_user_name: str
 
@@ -170,6 +173,8 @@ class RenameUserStrategy(AbstractStrategy[Tenant]):
 
 
 class AutoSealInternalStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ()
+
     def __init__(self,
                  seq: int,
                  when: datetime.datetime,
@@ -29,6 +29,8 @@ TAG_REGEX = re.compile('#(\\w+)')
 
 
 class Interval:
+    __slots__ = ('_started', '_ended', '_work_duration', '_rest_duration')
+
     _started: datetime.datetime
     _ended: datetime.datetime | None
     _work_duration: float
@@ -31,9 +31,44 @@ from fk.core.user import User
 from fk.core.workitem import Workitem
 
 
+def _update_tags(user: User,
+                 workitem: Workitem,
+                 names: set[str],
+                 when: datetime.datetime,
+                 emit: Callable[[str, dict[str, any], any], None],
+                 carry: any) -> None:
+    # Only touches the difference between the tags the workitem has now and the new names, so it doesn't
+    # depend on the total number of tags. Pass an empty set to untag a workitem, which is being deleted.
+    tags = user.get_tags()
+    old_tags = tags.get_workitem_tags(workitem)
+    old_names = set(tag.get_uid() for tag in old_tags)
+    for name in names:
+        if name not in old_names:
+            # A new tag was added
+            if name not in tags:
+                new_tag = Tag(name, user, when)
+                tags[name] = new_tag
+                emit(events.TagCreated, {"tag": new_tag}, carry)
+            tag = tags[name]
+            tag.add_workitem(workitem)
+            emit(events.TagContentChanged, {"tag": tag}, carry)
+    tags_to_delete = list[Tag]()
+    for tag in old_tags:
+        if tag.get_uid() not in names:
+            # An old tag was removed
+            tag.remove_workitem(workitem)
+            emit(events.TagContentChanged, {"tag": tag}, carry)
+            if tag.is_empty():
+                tags_to_delete.append(tag)
+    for tag in tags_to_delete:
+        del tags[tag.get_uid()]
+        emit(events.TagDeleted, {"tag": tag}, carry)
+
+
 # CreateWorkitem("123-456-789", "234-567-890", "Wake up")
 @strategy
 class CreateWorkitemStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_backlog_uid', '_workitem_name', '_categories')
     _workitem_uid: str
     _backlog_uid: str
     _workitem_name: str
@@ -89,16 +124,7 @@ class CreateWorkitemStrategy(AbstractStrategy[Tenant]):
         backlog[self._workitem_uid] = workitem
         workitem.item_updated(self._when)   # This will also update the Backlog
 
-        # Update tags
-        for tag in workitem.get_tags():
-            if tag not in user.get_tags():
-                new_tag = Tag(tag, user, self._when)
-                user.get_tags()[tag] = new_tag
-                emit(events.TagCreated, {"tag": new_tag}, self._carry)
-            tag_object = user.get_tags()[tag]
-            if workitem not in tag_object.get_workitems():
-                tag_object.add_workitem(workitem)
-                emit(events.TagContentChanged, {"tag": tag_object}, self._carry)
+        _update_tags(user, workitem, workitem.get_tags(), self._when, emit, self._carry)
 
         emit(events.AfterWorkitemCreate, {
             'workitem': workitem,
@@ -108,6 +134,7 @@ class CreateWorkitemStrategy(AbstractStrategy[Tenant]):
 # DeleteWorkitem("123-456-789")
 @strategy
 class DeleteWorkitemStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid',)
     _workitem_uid: str
 
     def get_workitem_uid(self) -> str:
@@ -129,12 +156,8 @@ class DeleteWorkitemStrategy(AbstractStrategy[Tenant]):
     def execute(self,
                 emit: Callable[[str, dict[str, any], any], None],
                 data: Tenant) -> None:
-        workitem: Workitem | None = None
         user: User = data[self._user_identity]
-        for backlog in user.values():
-            if self._workitem_uid in backlog:
-                workitem = backlog[self._workitem_uid]
-                break
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
 
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
@@ -150,17 +173,7 @@ class DeleteWorkitemStrategy(AbstractStrategy[Tenant]):
 
         workitem.item_updated(self._when)   # Update Backlog
 
-        # Update tags
-        tags_to_delete = set[Tag]()
-        for tag in user.get_tags().values():
-            if workitem in tag.get_workitems():
-                tag.remove_workitem(workitem)
-                emit(events.TagContentChanged, {"tag": tag}, self._carry)
-                if len(tag.get_workitems()) == 0:
-                    tags_to_delete.add(tag)
-        for tag_to_delete in tags_to_delete:
-            del user.get_tags()[tag_to_delete.get_uid()]
-            emit(events.TagDeleted, {"tag": tag_to_delete}, self._carry)
+        _update_tags(user, workitem, set(), self._when, emit, self._carry)
 
         # Update categories
         for category in workitem.get_categories():
@@ -174,6 +187,7 @@ class DeleteWorkitemStrategy(AbstractStrategy[Tenant]):
 # RenameWorkitem("123-456-789", "Wake up")
 @strategy
 class RenameWorkitemStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_new_workitem_name')
     _workitem_uid: str
     _new_workitem_name: str
 
@@ -194,12 +208,8 @@ class RenameWorkitemStrategy(AbstractStrategy[Tenant]):
     def execute(self,
                 emit: Callable[[str, dict[str, any], any], None],
                 data: Tenant) -> None:
-        workitem: Workitem | None = None
         user: User = data[self._user_identity]
-        for backlog in user.values():
-            if self._workitem_uid in backlog:
-                workitem = backlog[self._workitem_uid]
-                break
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
 
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
@@ -218,38 +228,9 @@ class RenameWorkitemStrategy(AbstractStrategy[Tenant]):
         }
         emit(events.BeforeWorkitemRename, params, self._carry)
 
-        old_tags = workitem.get_tags()
         workitem.set_name(self._new_workitem_name)
         workitem.item_updated(self._when)
-        new_tags = workitem.get_tags()
-
-        # Update tags
-        for new_tag in new_tags:
-            if new_tag not in old_tags:
-                # A new tag was added
-                if new_tag not in user.get_tags():
-                    new_tag_object = Tag(new_tag, user, self._when)
-                    user.get_tags()[new_tag] = new_tag_object
-                    emit(events.TagCreated, {"tag": new_tag_object}, self._carry)
-                tag_object = user.get_tags()[new_tag]
-                if workitem not in tag_object.get_workitems():
-                    tag_object.add_workitem(workitem)
-                    emit(events.TagContentChanged, {"tag": tag_object}, self._carry)
-        tags_to_delete = set[Tag]()
-        fired_for = set[Tag]()
-        for old_tag in old_tags:
-            if old_tag not in new_tags:
-                # An old tag was removed
-                if old_tag in user.get_tags():
-                    old_tag_object = user.get_tags()[old_tag]
-                    if workitem in old_tag_object.get_workitems():
-                        old_tag_object.remove_workitem(workitem)
-                        emit(events.TagContentChanged, {"tag": old_tag_object}, self._carry)
-                        if len(old_tag_object.get_workitems()) == 0:
-                            tags_to_delete.add(old_tag_object)
-        for tag_to_delete in tags_to_delete:
-            del user.get_tags()[tag_to_delete.get_uid()]
-            emit(events.TagDeleted, {"tag": tag_to_delete}, self._carry)
+        _update_tags(user, workitem, workitem.get_tags(), self._when, emit, self._carry)
 
         emit(events.AfterWorkitemRename, params, self._carry)
 
@@ -257,6 +238,7 @@ class RenameWorkitemStrategy(AbstractStrategy[Tenant]):
 # CompleteWorkitem("123-456-789", "canceled")
 @strategy
 class CompleteWorkitemStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_target_state')
     _workitem_uid: str
     _target_state: str
 
@@ -280,12 +262,8 @@ class CompleteWorkitemStrategy(AbstractStrategy[Tenant]):
     def execute(self,
                 emit: Callable[[str, dict[str, any], any], None],
                 data: Tenant) -> None:
-        workitem: Workitem | None = None
         user: User = data[self._user_identity]
-        for backlog in user.values():
-            if self._workitem_uid in backlog:
-                workitem = backlog[self._workitem_uid]
-                break
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
 
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
@@ -319,6 +297,7 @@ class CompleteWorkitemStrategy(AbstractStrategy[Tenant]):
 # RestoreWorkitem("123-456-789")
 @strategy
 class RestoreWorkitemStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid',)
     _workitem_uid: str
 
     def get_workitem_uid(self) -> str:
@@ -340,12 +319,8 @@ class RestoreWorkitemStrategy(AbstractStrategy[Tenant]):
     def execute(self,
                 emit: Callable[[str, dict[str, any], any], None],
                 data: Tenant) -> None:
-        workitem: Workitem | None = None
         user: User = data[self._user_identity]
-        for backlog in user.values():
-            if self._workitem_uid in backlog:
-                workitem = backlog[self._workitem_uid]
-                break
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
 
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
@@ -362,6 +337,7 @@ class RestoreWorkitemStrategy(AbstractStrategy[Tenant]):
 # ReorderWorkitem("123-456-789", "0")
 @strategy
 class ReorderWorkitemStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_new_index')
     _workitem_uid: str
     _new_index: int
 
@@ -382,17 +358,11 @@ class ReorderWorkitemStrategy(AbstractStrategy[Tenant]):
     def execute(self,
                 emit: Callable[[str, dict[str, any], any], None],
                 data: Tenant) -> None:
-        workitem: Workitem | None = None
-        backlog: Backlog | None = None
         user: User = data[self._user_identity]
-        for b in user.values():
-            if self._workitem_uid in b:
-                workitem = b[self._workitem_uid]
-                backlog = b
-                break
-
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
+        backlog: Backlog = workitem.get_parent()
 
         params = {
             'workitem': workitem,
@@ -407,6 +377,7 @@ class ReorderWorkitemStrategy(AbstractStrategy[Tenant]):
 # MoveWorkitem("123-456-789", "234-567-890")
 @strategy
 class MoveWorkitemStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_backlog_uid')
     _workitem_uid: str
     _backlog_uid: str
 
@@ -430,7 +401,6 @@ class MoveWorkitemStrategy(AbstractStrategy[Tenant]):
     def execute(self,
                 emit: Callable[[str, dict[str, any], any], None],
                 data: Tenant) -> None:
-        workitem: Workitem | None = None
         old_backlog: Backlog | None = None
         user: User = data[self._user_identity]
 
@@ -442,14 +412,10 @@ class MoveWorkitemStrategy(AbstractStrategy[Tenant]):
             # Nothing to do
             return
 
-        for b in user.values():
-            if self._workitem_uid in b:
-                workitem = b[self._workitem_uid]
-                old_backlog = b
-                break
-
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
+        old_backlog = workitem.get_parent()
 
         params = {
             'workitem': workitem,
@@ -466,6 +432,7 @@ class MoveWorkitemStrategy(AbstractStrategy[Tenant]):
 # UpdateWorkitemCategories("123-456-789", "remove1;remove2;remove3", "add1;add2;add3")
 @strategy
 class UpdateWorkitemCategoriesStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_workitem_uid', '_to_remove', '_to_add')
     _workitem_uid: str
     _to_remove: str
     _to_add: str
@@ -488,12 +455,8 @@ class UpdateWorkitemCategoriesStrategy(AbstractStrategy[Tenant]):
     def execute(self,
                 emit: Callable[[str, dict[str, any], any], None],
                 data: Tenant) -> None:
-        workitem: Workitem | None = None
         user: User = data[self._user_identity]
-        for backlog in user.values():
-            if self._workitem_uid in backlog:
-                workitem = backlog[self._workitem_uid]
-                break
+        workitem: Workitem | None = user.find_workitem(self._workitem_uid)
 
         if workitem is None:
             raise Exception(f'Workitem "{self._workitem_uid}" not found')
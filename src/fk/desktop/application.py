@@ -44,10 +44,12 @@ from fk.core.ephemeral_event_source import EphemeralEventSource
 from fk.core.event_source_factory import EventSourceFactory
 from fk.core.event_source_holder import EventSourceHolder, AfterSourceChanged
 from fk.core.events import AfterSettingsChanged, BeforeSettingsChanged
+from fk.core.aes_gcm_cryptograph import AesGcmCryptograph
 from fk.core.fernet_cryptograph import FernetCryptograph
 from fk.core.file_event_source import FileEventSource
 from fk.core.integration_executor import IntegrationExecutor
 from fk.core.no_cryptograph import NoCryptograph
+from fk.core.replay_profiler import ReplayProfiler
 from fk.core.sandbox import get_sandbox_type
 from fk.core.tenant import Tenant
 from fk.desktop.categories_window import CategoriesWindow
@@ -131,7 +133,7 @@ class Application(QApplication, AbstractEventEmitter):
             self._settings.reset_to_defaults()
             self._initialize_logger()
             if self._settings.is_keyring_enabled():
-                self._cryptograph = FernetCryptograph(self._settings)
+                self._cryptograph = AesGcmCryptograph(self._settings)
             else:
                 self._cryptograph = NoCryptograph(self._settings)
             if self.is_screenshot_mode():
@@ -172,7 +174,7 @@ class Application(QApplication, AbstractEventEmitter):
                     sys.exit(3)
             self._initialize_logger()
             if self._settings.is_keyring_enabled():
-                self._cryptograph = FernetCryptograph(self._settings)
+                self._cryptograph = AesGcmCryptograph(self._settings)
             else:
                 self._cryptograph = NoCryptograph(self._settings)
         self._settings.on(BeforeSettingsChanged, self._before_settings_changed)
@@ -288,9 +290,24 @@ class Application(QApplication, AbstractEventEmitter):
         # EventSourceFactory.get_event_source_factory().register_producer('flowkeeper.pro', websocket_source_producer)
 
     def _on_source_changed(self, event: str, source: AbstractEventSource):
+        logger.debug(f'Application: Received AfterSourceChanged for {source}')
+        if isinstance(self._cryptograph, FernetCryptograph) and \
+                self._cryptograph.enabled and \
+                not self._cryptograph.is_key_ready():
+            # UC-2: With e2e encryption, the event source starts once the key is derived, so that encrypting new strategies never blocks the UI
+            logger.debug(f'Application: Will start the event source once the encryption key is ready')
+            self._cryptograph.when_key_ready(lambda: self._start_source(source))
+        else:
+            self._start_source(source)
+
+    def _start_source(self, source: AbstractEventSource):
+        if self._source_holder.get_source() is not source:
+            logger.debug(f'Application: Event source {source} was replaced before it started')
+            return
         try:
-            logger.debug(f'Application: Received AfterSourceChanged for {source}')
             logger.debug(f'Application: Starting the event source')
+            if self.is_profiling_mode():
+                source.set_profiler(ReplayProfiler())
             source.start()
             logger.debug(f'Application: Event source started successfully')
         except Exception as e:
@@ -314,6 +331,9 @@ class Application(QApplication, AbstractEventEmitter):
     def is_testing_mode(self):
         return '--testing' in self.arguments()
 
+    def is_profiling_mode(self):
+        return '--profile' in self.arguments()
+
     def _on_went_offline(self, event, after: int, last_received: datetime.datetime) -> None:
         # TODO -- lock the UI
         logger.warning(f'WARNING - We detected that the client went offline after {after}ms. Last '
@@ -675,6 +695,7 @@ class Application(QApplication, AbstractEventEmitter):
         actions.add('application.toolbar', "Show toolbar", '', None, Application.toggle_toolbar, True, True)
         actions.add('application.stats', "Pomodoro health", 'F9', None, Application.show_stats)
         actions.add('application.workSummary', "Work summary", 'F3', None, Application.show_work_summary)
+        actions.add('application.replayProfile', "Data loading profile", '', None, Application.show_replay_profile)
         actions.add('application.manageCategories',
                     "Manage Groups...",
                     'F5',
@@ -735,6 +756,21 @@ class Application(QApplication, AbstractEventEmitter):
     def show_work_summary(self, event: str = None) -> None:
         WorkSummaryWindow(self.activeWindow(), self._source_holder.get_source()).show()
 
+    def show_replay_profile(self, event: str = None) -> None:
+        profiler = self._source_holder.get_source().get_profiler()
+        if profiler is None:
+            QMessageBox().information(self.activeWindow(),
+                                      "Data loading profile",
+                                      "Profiling is disabled. To see how long it takes to load your data, "
+                                      "restart Flowkeeper with --profile command-line argument.",
+                                      QMessageBox.StandardButton.Ok)
+        else:
+            QInputDialog.getMultiLineText(None,
+                                          "Data loading profile",
+                                          "Timings of loading the data, per phase and per strategy type. "
+                                          "Please attach it to the performance-related bug reports.",
+                                          profiler.to_json())
+
     def show_categories(self, event: str = None) -> None:
         CategoriesWindow(self.activeWindow(),
                          self._source_holder,
@@ -368,6 +368,7 @@ if __name__ == "__main__":
         menu_file.addAction(actions['application.export'])
         menu_file.addAction(actions['application.stats'])
         menu_file.addAction(actions['application.workSummary'])
+        menu_file.addAction(actions['application.replayProfile'])
         menu_file.addSeparator()
 
         menu_contact = QtWidgets.QMenu("Contact us", window)
@@ -33,6 +33,7 @@ EMAIL_REGEX = re.compile(r'[\w\-.]+@(?:[\w-]+\.)+[\w-]{2,4}')
 # Authenticate("alice@example.com", "google|token123", "false")
 @strategy
 class AuthenticateStrategy(AbstractStrategy[Tenant]):
+    __slots__ = ('_username', '_token')
     _username: str
     _token: str
 
@@ -60,6 +61,7 @@ class AuthenticateStrategy(AbstractStrategy[Tenant]):
 # Replay("105")
 @strategy
 class ReplayStrategy(AbstractStrategy):
+    __slots__ = ('_since_seq',)
     _since_seq: int
 
     def __init__(self,
@@ -85,6 +87,8 @@ class ReplayStrategy(AbstractStrategy):
 # ReplayCompleted()
 @strategy
 class ReplayCompletedStrategy(AbstractStrategy):
+    __slots__ = ()
+
     def __init__(self,
                  seq: int,
                  when: datetime.datetime,
@@ -110,6 +114,7 @@ class ReplayCompletedStrategy(AbstractStrategy):
 # Error("401", "User not found")
 @strategy
 class ErrorStrategy(AbstractStrategy):
+    __slots__ = ('_error_code', '_error_message')
     _error_code: int
     _error_message: str
 
@@ -181,6 +186,7 @@ class ErrorStrategy(AbstractStrategy):
 # Pong("123-456-789-012", "")
 @strategy
 class PongStrategy(AbstractStrategy):
+    __slots__ = ('_uid',)
     _uid: str
 
     def __init__(self,
@@ -209,6 +215,7 @@ class PongStrategy(AbstractStrategy):
 # Ping("123-456-789-012", "")
 @strategy
 class PingStrategy(AbstractStrategy):
+    __slots__ = ('_uid',)
     _uid: str
 
     def __init__(self,
@@ -234,6 +241,7 @@ class PingStrategy(AbstractStrategy):
 # DeleteAccount("reason")
 @strategy
 class DeleteAccountStrategy(AbstractStrategy):
+    __slots__ = ('_reason',)
     _reason: str
 
     def __init__(self,
@@ -57,8 +57,8 @@ class SearchBar(QtWidgets.QLineEdit):
             self.hide()
 
     def _select(self, index: QModelIndex):
-        workitem: Workitem = index.data(500)
-        backlog: Backlog = workitem.get_parent()
+        backlog: Backlog = index.data(500)
+        workitem: Workitem = backlog[index.data(501)]  # Inflates archived backlogs
         self._backlogs_table.select(backlog)
         # Queue the second selection step, as AfterSelectionChanged
         # will go through Qt postEvent
@@ -75,13 +75,15 @@ class SearchBar(QtWidgets.QLineEdit):
         completer.setCaseSensitivity(QtGui.Qt.CaseSensitivity.CaseInsensitive)
 
         model = QStandardItemModel()
-        for wi in self._source_holder.get_source().workitems():
-            if self._hide_completed and wi.is_sealed():
-                continue
-            item = QStandardItem()
-            item.setText(wi.get_name())
-            item.setData(wi, 500)
-            model.appendRow(item)
+        for backlog in self._source_holder.get_source().backlogs():
+            for uid, name, is_sealed in backlog.summarize_workitems():
+                if self._hide_completed and is_sealed:
+                    continue
+                item = QStandardItem()
+                item.setText(name)
+                item.setData(backlog, 500)
+                item.setData(uid, 501)
+                model.appendRow(item)
         completer.setModel(model)
 
         self.setCompleter(completer)
@@ -16,7 +16,7 @@
 from __future__ import annotations
 
 import datetime
-from typing import TypeVar, Callable, Iterable
+from typing import TypeVar, Callable, Iterable, ContextManager
 
 from PySide6.QtCore import QThreadPool, Slot
 
@@ -25,7 +25,9 @@ from fk.core.abstract_strategy import AbstractStrategy
 from fk.core.backlog import Backlog
 from fk.core.file_event_source import FileEventSource
 from fk.core.pomodoro import Pomodoro
+from fk.core.replay_profiler import ReplayProfiler
 from fk.core.tag import Tag
+from fk.core.tenant import Tenant
 from fk.core.user import User
 from fk.core.workitem import Workitem
 from fk.qt.qt_invoker import invoke_in_main_thread
@@ -153,8 +155,20 @@ class ThreadedEventSource(AbstractEventSource[TRoot]):
     def compress(self):
         return self._wrapped.compress()
 
+    def maintenance(self) -> ContextManager:
+        return self._wrapped.maintenance()
+
+    def set_profiler(self, profiler: ReplayProfiler | None) -> None:
+        self._wrapped.set_profiler(profiler)
+
+    def get_profiler(self) -> ReplayProfiler | None:
+        return self._wrapped.get_profiler()
+
     def get_last_sequence(self):
         return self._wrapped.get_last_sequence()
 
+    def get_state_at(self, seq: int | None = None, when: datetime.datetime | None = None) -> Tenant:
+        return self._wrapped.get_state_at(seq, when)
+
     def get_init_strategy(self, emit: Callable[[str, dict[str, any], any], None]) -> AbstractStrategy[AbstractEventSource[TRoot]]:
         return self._wrapped.get_init_strategy(emit)
@@ -119,11 +119,15 @@ class WebsocketEventSource(AbstractEventSource[TRoot]):
         to_unmute = False
         to_emit = False
         last_executed = None
-        for line in lines:
+        # UC-2: WebSocket event source decrypts all strategies in the message as a batch, but executes them in order
+        parsed = self._serializer.parse_many(lines)
+        for line, (p, error) in zip(lines, parsed):
             if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(f" - {line}")
             try:
-                s = self._serializer.deserialize(line)
+                if error is not None:
+                    raise error
+                s = self._serializer.build(p)
                 if s is None:
                     continue
                 elif type(s) is ReplayCompletedStrategy:
@@ -152,7 +156,7 @@ class WebsocketEventSource(AbstractEventSource[TRoot]):
 
         self._auto_seal_at_the_end(last_executed)
         if to_unmute:
-            self.unmute()
+            self._finish_bulk_load()
         if to_emit:
             self._emit(events.SourceMessagesProcessed, {'source': self})
 
@@ -185,7 +189,7 @@ class WebsocketEventSource(AbstractEventSource[TRoot]):
 
         self._emit(events.SourceMessagesRequested, dict())
         if self._mute_requested:
-            self.mute()
+            self._start_bulk_load()
 
     def replay(self) -> None:
         self._connection_attempt = 0    # This will allow us to reconnect quickly
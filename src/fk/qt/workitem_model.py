@@ -356,7 +356,7 @@ class WorkitemModel(AbstractDropModel):
 
     def _workitem_renamed(self, workitem: Workitem, old_name: str, new_name: str, **kwargs) -> None:
         if type(self._backlog_or_tag) is Tag:
-            if self._backlog_or_tag.get_uid() in workitem.get_tags():
+            if self._backlog_or_tag.has_workitem(workitem):     # The strategy has already re-tagged it
                 # This workitem should be in this list
                 if self._find_workitem(workitem) < 0:
                     self._add_workitem(workitem)
@@ -455,7 +455,8 @@ class WorkitemModel(AbstractDropModel):
             self.load(self._backlog_or_tag)
 
     def _workitem_moved(self, workitem: Workitem, old_backlog: Backlog, new_backlog: Backlog, **kwargs) -> None:
-        if old_backlog == self._backlog_or_tag or self._backlog_or_tag.get_uid() in workitem.get_tags():
+        if old_backlog == self._backlog_or_tag or (type(self._backlog_or_tag) is Tag and
+                                                   self._backlog_or_tag.has_workitem(workitem)):
             # Moved from here
             self._remove_if_found(workitem)
         elif self._workitem_belongs_here(workitem):   # We can only drop workitems on backlogs, not tags
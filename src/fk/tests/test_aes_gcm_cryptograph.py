@@ -0,0 +1,178 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import datetime
+import glob
+import os
+import threading
+from unittest import TestCase
+
+from fk.core import events
+from fk.core.abstract_settings import S
+from fk.core.aes_gcm_cryptograph import AesGcmCryptograph
+from fk.core.backlog_strategies import CreateBacklogStrategy
+from fk.core.binary_serializer import BinarySerializer
+from fk.core.fernet_cryptograph import FernetCryptograph, get_cached_fernet_key
+from fk.core.file_event_source import FileEventSource
+from fk.core.mock_settings import MockSettings
+from fk.core.simple_serializer import SimpleSerializer
+from fk.core.tenant import Tenant
+
+TEMP_FILENAME = 'src/fk/tests/fixtures/flowkeeper-gcm-TEMP.txt'
+
+
+class TestAesGcmCryptograph(TestCase):
+    def setUp(self) -> None:
+        self.settings = MockSettings(filename=TEMP_FILENAME)
+        self.settings.set({
+            S.SOURCE_ENCRYPTION_KEY: 'test key',
+            S.SOURCE_ENCRYPTION_ENABLED: 'True',
+            S.SOURCE_ENCRYPTION_CIPHER: 'aes-gcm',
+        })
+        self.cryptograph = AesGcmCryptograph(self.settings)
+
+    def tearDown(self) -> None:
+        for f in glob.glob(f'{TEMP_FILENAME}*'):
+            os.unlink(f)
+
+    def _strategy(self, seq: int, name: str) -> CreateBacklogStrategy:
+        when = datetime.datetime.now(datetime.timezone.utc)
+        return CreateBacklogStrategy(seq, when, 'user@local.host', [f'b{seq}', name], self.settings)
+
+    def test_round_trip(self):
+        token = self.cryptograph.encrypt('Привет', 42)
+        self.assertTrue(token.startswith('~42~'))
+        self.assertEqual('Привет', self.cryptograph.decrypt(token))
+        token = self.cryptograph.encrypt_bytes(b'\x00binary', 42)
+        self.assertEqual(b'\x00binary', self.cryptograph.decrypt_bytes(token))
+        self.assertEqual('No sequence', self.cryptograph.decrypt(self.cryptograph.encrypt('No sequence')))
+
+    def test_smaller_than_fernet(self):
+        text = 'user@local.host: CreateBacklog("b1", "A typical backlog name")'
+        fernet = FernetCryptograph(self.settings)
+        self.assertLess(len(self.cryptograph.encrypt(text, 123)), len(fernet.encrypt(text)) * 0.8)
+
+    def test_sequence_is_authenticated(self):
+        token = self.cryptograph.encrypt('Secret', 42)
+        self.assertRaises(Exception, lambda: self.cryptograph.decrypt(token.replace('~42~', '~43~')))
+        binary = self.cryptograph.encrypt_bytes(b'Secret', 42)
+        self.assertRaises(Exception, lambda: self.cryptograph.decrypt_bytes(binary.replace(b'42~', b'43~', 1)))
+
+    def test_mixed_formats(self):
+        # The first half of the file was written with Fernet, the second one with AES-GCM
+        for serializer_class in (SimpleSerializer, BinarySerializer):
+            self.settings.set({S.SOURCE_ENCRYPTION_CIPHER: 'fernet'})
+            serializer = serializer_class(self.settings, self.cryptograph)
+            records = [serializer.serialize(self._strategy(i, f'Fernet {i}')) for i in range(1, 4)]
+            self.settings.set({S.SOURCE_ENCRYPTION_CIPHER: 'aes-gcm'})
+            records += [serializer.serialize(self._strategy(i, f'GCM {i}')) for i in range(4, 7)]
+            self.assertEqual(6, len(set(records)))
+
+            reader = serializer_class(self.settings, AesGcmCryptograph(self.settings))
+            names = [reader.deserialize(r).get_params()[1] for r in records]
+            self.assertEqual(['Fernet 1', 'Fernet 2', 'Fernet 3', 'GCM 4', 'GCM 5', 'GCM 6'], names)
+            names = [p[4][1] for p, error in reader.parse_many(records)]
+            self.assertEqual(['Fernet 1', 'Fernet 2', 'Fernet 3', 'GCM 4', 'GCM 5', 'GCM 6'], names)
+
+    def test_file_source(self):
+        source = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+        source.start()
+        source.execute(CreateBacklogStrategy, ['b1', 'Encrypted with AES-GCM'])
+        source.disconnect()
+        with open(TEMP_FILENAME, encoding='UTF-8') as f:
+            content = f.read()
+        self.assertNotIn('Encrypted with AES-GCM', content)
+        self.assertIn('+~', content)
+
+        reloaded = FileEventSource[Tenant](self.settings, AesGcmCryptograph(self.settings), Tenant(self.settings))
+        reloaded.start()
+        self.assertEqual('Encrypted with AES-GCM', reloaded.find_backlog('b1').get_name())
+
+    def test_bound_sequence_matches_strategy(self):
+        for serializer_class in (SimpleSerializer, BinarySerializer):
+            serializer = serializer_class(self.settings, self.cryptograph)
+            record = serializer.serialize(self._strategy(5, 'Five'))
+            self.assertEqual(5, serializer.get_bound_sequence(record))
+            self.assertEqual(5, serializer.deserialize(record).get_sequence())
+            # Same key, but bound to another sequence
+            plaintext = SimpleSerializer(self.settings, self.cryptograph)._serialize_plaintext(self._strategy(5, 'Five'))
+            forged = '+' + self.cryptograph.encrypt(plaintext, 6)
+            self.assertRaises(Exception, lambda: SimpleSerializer(self.settings, self.cryptograph).deserialize(forged))
+            parsed, error = SimpleSerializer(self.settings, self.cryptograph).parse_many([forged])[0]
+            self.assertIsNone(parsed)
+            self.assertIsNotNone(error)
+
+    def test_swapped_records(self):
+        source = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+        source.start()
+        for i in range(1, 4):
+            source.execute(CreateBacklogStrategy, [f'b{i}', f'Backlog {i}'])
+        source.disconnect()
+        with open(TEMP_FILENAME, encoding='UTF-8') as f:
+            lines = f.readlines()
+        encrypted = [i for i, line in enumerate(lines) if line.startswith('+~')]
+        self.assertEqual(4, len(encrypted))     # Including CreateUser
+        lines[encrypted[2]], lines[encrypted[3]] = lines[encrypted[3]], lines[encrypted[2]]
+        with open(TEMP_FILENAME, 'w', encoding='UTF-8') as f:
+            f.writelines(lines)
+
+        # Each record decrypts fine, and the sequence gaps are ignored by default, but the records are out of place
+        self.settings.set({S.SOURCE_IGNORE_ERRORS: 'False'})
+        reloaded = FileEventSource[Tenant](self.settings, AesGcmCryptograph(self.settings), Tenant(self.settings))
+        self.assertRaises(Exception, reloaded.start)
+
+    def test_background_key_derivation(self):
+        derived = threading.Event()
+        progress = list()
+        fernet = FernetCryptograph(self.settings)
+        fernet.on(events.KeyDerivationProgress, lambda value, total, **kwargs: progress.append(value))
+        fernet.on(events.KeyDerivationComplete, lambda **kwargs: derived.set())
+        old_token = fernet.encrypt('Old key')
+
+        # The settings change returns immediately, and encryption waits for the new key
+        self.settings.set({S.SOURCE_ENCRYPTION_KEY: 'background key'})
+        token = fernet.encrypt('New key')
+        self.assertTrue(derived.wait(10))
+        self.assertEqual([0, 480000], progress)
+        self.assertEqual('New key', fernet.decrypt(token))
+        self.assertRaises(Exception, lambda: fernet.decrypt(old_token))
+        self.assertEqual(get_cached_fernet_key('background key').decode('utf-8'),
+                         self.settings.get(S.SOURCE_ENCRYPTION_KEY_CACHE))
+
+        # The derived key is reused for the same passphrase
+        progress.clear()
+        self.settings.set({S.SOURCE_ENCRYPTION_KEY: 'another key'})
+        self.settings.set({S.SOURCE_ENCRYPTION_KEY: 'background key', S.SOURCE_ENCRYPTION_KEY_CACHE: ''})
+        self.assertTrue(fernet.is_key_ready())
+        self.assertEqual('New key', FernetCryptograph(self.settings).decrypt(token))
+
+    def test_when_key_ready(self):
+        fernet = FernetCryptograph(self.settings)
+        ready = threading.Event()
+        seen = list()
+
+        def on_key_ready():
+            seen.append(fernet.is_key_ready())
+            ready.set()
+
+        # The key derivation runs in background, and the callback doesn't wait for it
+        self.settings.set({S.SOURCE_ENCRYPTION_KEY: 'deferred key'})
+        fernet.when_key_ready(on_key_ready)
+        self.assertTrue(ready.wait(10))
+        self.assertEqual([True], seen)
+
+        # Once the key is there, the callbacks are invoked right away
+        fernet.when_key_ready(on_key_ready)
+        self.assertEqual([True, True], seen)
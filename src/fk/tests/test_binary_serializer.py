@@ -0,0 +1,185 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import datetime
+import glob
+import mmap
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from fk.core.abstract_settings import S
+from fk.core.backlog_strategies import CreateBacklogStrategy, RenameBacklogStrategy
+from fk.core.binary_serializer import BinarySerializer, BINARY_HEADER, convert_file
+from fk.core.fernet_cryptograph import FernetCryptograph
+from fk.core.file_event_source import FileEventSource
+from fk.core.mock_settings import MockSettings
+from fk.core.no_cryptograph import NoCryptograph
+from fk.core.simple_serializer import SimpleSerializer
+from fk.core.tenant import Tenant
+
+TEMP_FILENAME = 'src/fk/tests/fixtures/flowkeeper-data-TEMP.bin'
+RAND_FILENAME = 'src/fk/tests/fixtures/random.txt'
+
+
+class TestBinarySerializer(TestCase):
+    def setUp(self) -> None:
+        self.settings = MockSettings()
+        self.serializer = BinarySerializer(self.settings, NoCryptograph(self.settings))
+
+    def tearDown(self) -> None:
+        for f in glob.glob(f'{TEMP_FILENAME}*'):
+            os.unlink(f)
+
+    def _load(self, filename: str, values: dict[str, str] = None) -> FileEventSource:
+        settings = MockSettings(filename=filename)
+        if values is not None:
+            settings.set(values)
+        source = FileEventSource[Tenant](settings, FernetCryptograph(settings), Tenant(settings))
+        source.start()
+        source.disconnect()
+        return source
+
+    def test_round_trip(self):
+        when = datetime.datetime(2024, 3, 1, 10, 20, 30, 123456,
+                                 tzinfo=datetime.timezone(datetime.timedelta(hours=-5, minutes=-30)))
+        s = RenameBacklogStrategy(12345, when, 'user@local.host', ['uid-1', 'Привет, "world"\n'], self.settings)
+        record = self.serializer.serialize(s)
+        restored = self.serializer.deserialize(record)
+        self.assertEqual(type(s), type(restored))
+        self.assertEqual(12345, restored.get_sequence())
+        self.assertEqual(when, restored.get_when())
+        self.assertEqual(str(when), str(restored.get_when()))
+        self.assertEqual('user@local.host', restored.get_user_identity())
+        self.assertEqual(s.get_params(), restored.get_params())
+
+    def test_users_are_interned(self):
+        when = datetime.datetime.now(datetime.timezone.utc)
+        first = self.serializer.serialize(CreateBacklogStrategy(1, when, 'user@local.host', ['b1', 'One'], self.settings))
+        second = self.serializer.serialize(CreateBacklogStrategy(2, when, 'user@local.host', ['b2', 'Two'], self.settings))
+        self.assertIn(b'user@local.host', first)
+        self.assertNotIn(b'user@local.host', second)
+
+        # A fresh reader learns the identity from the first record
+        reader = BinarySerializer(self.settings, NoCryptograph(self.settings))
+        reader.deserialize(first)
+        self.assertEqual('user@local.host', reader.deserialize(second).get_user_identity())
+
+    def test_records_are_framed(self):
+        when = datetime.datetime.now(datetime.timezone.utc)
+        record = self.serializer.to_record(self.serializer.serialize(
+            CreateBacklogStrategy(1, when, 'user@local.host', ['b1', 'x' * 300], self.settings)))
+        self.assertEqual(-1, self.serializer.find_record_end(record[:-1], 0, True))
+        self.assertEqual(len(record), self.serializer.find_record_end(record + record, 0, False))
+
+    def test_convert_both_ways(self):
+        convert_file(RAND_FILENAME, TEMP_FILENAME, True, self.settings, NoCryptograph(self.settings))
+        with open(TEMP_FILENAME, 'rb') as f:
+            self.assertEqual(BINARY_HEADER, f.read(len(BINARY_HEADER)))
+        self.assertLess(os.path.getsize(TEMP_FILENAME), os.path.getsize(RAND_FILENAME))
+
+        convert_file(TEMP_FILENAME, f'{TEMP_FILENAME}.txt', False, self.settings, NoCryptograph(self.settings))
+        text = SimpleSerializer(self.settings, NoCryptograph(self.settings))
+        with open(RAND_FILENAME, encoding='UTF-8') as f:
+            expected = [text.serialize(text.deserialize(line)) for line in f if line.strip() != '']
+        with open(f'{TEMP_FILENAME}.txt', encoding='UTF-8') as f:
+            self.assertEqual(expected, [line.rstrip('\n') for line in f])
+
+    def test_source_reads_binary_file(self):
+        convert_file(RAND_FILENAME, TEMP_FILENAME, True, self.settings, NoCryptograph(self.settings))
+        original = self._load(RAND_FILENAME)
+        binary = self._load(TEMP_FILENAME)
+        self.assertEqual(original.get_last_sequence(), binary.get_last_sequence())
+        self.assertEqual(original.get_data().get_current_user().dump(),
+                         binary.get_data().get_current_user().dump())
+
+    def test_source_appends_to_binary_file(self):
+        convert_file(RAND_FILENAME, TEMP_FILENAME, True, self.settings, NoCryptograph(self.settings))
+        source = self._load(TEMP_FILENAME)
+        backlog = list(source.backlogs())[0]
+        source.execute(RenameBacklogStrategy, [backlog.get_uid(), 'Renamed in binary'])
+        source.disconnect()
+        self.assertEqual('Renamed in binary', self._load(TEMP_FILENAME).find_backlog(backlog.get_uid()).get_name())
+
+    def test_source_creates_binary_file(self):
+        settings = MockSettings(filename=TEMP_FILENAME)
+        settings.set({S.FILEEVENTSOURCE_FORMAT: 'binary'})
+        source = FileEventSource[Tenant](settings, NoCryptograph(settings), Tenant(settings))
+        source.start()
+        source.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+        source.disconnect()
+        with open(TEMP_FILENAME, 'rb') as f:
+            self.assertEqual(BINARY_HEADER, f.read(len(BINARY_HEADER)))
+        self.assertEqual('First backlog', self._load(TEMP_FILENAME).find_backlog('b1').get_name())
+
+    def test_encrypted_records(self):
+        settings = MockSettings()
+        settings.set({S.SOURCE_ENCRYPTION_KEY: 'test key', S.SOURCE_ENCRYPTION_ENABLED: 'True'})
+        cryptograph = FernetCryptograph(settings)
+        serializer = BinarySerializer(settings, cryptograph)
+        when = datetime.datetime.now(datetime.timezone.utc)
+        record = serializer.serialize(CreateBacklogStrategy(1, when, 'user@local.host', ['b1', 'Secret'], settings))
+        self.assertNotIn(b'Secret', record)
+        restored = BinarySerializer(settings, cryptograph).deserialize(record)
+        self.assertEqual(('b1', 'Secret'), restored.get_params())
+        self.assertEqual('user@local.host', restored.get_user_identity())
+
+    def test_checkpoint_keeps_interned_users(self):
+        convert_file(RAND_FILENAME, TEMP_FILENAME, True, self.settings, NoCryptograph(self.settings))
+        settings = MockSettings(filename=TEMP_FILENAME)
+        settings.set({
+            S.FILEEVENTSOURCE_CHECKPOINTS: 'True',
+            S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL: '100',
+        })
+        source = FileEventSource[Tenant](settings, NoCryptograph(settings), Tenant(settings))
+        source.start()
+        source.disconnect()
+
+        # The strategies after the checkpoint refer to the users, defined before it
+        restored = FileEventSource[Tenant](settings, NoCryptograph(settings), Tenant(settings))
+        restored.start()
+        backlog = list(restored.backlogs())[0]
+        restored.execute(RenameBacklogStrategy, [backlog.get_uid(), 'Renamed after checkpoint'])
+        restored.disconnect()
+        self.assertEqual('Renamed after checkpoint', self._load(TEMP_FILENAME).find_backlog(backlog.get_uid()).get_name())
+
+    def test_memory_mapped_reader(self):
+        convert_file(RAND_FILENAME, TEMP_FILENAME, True, self.settings, NoCryptograph(self.settings))
+        expected_text = self._load(RAND_FILENAME).get_data().get_current_user().dump()
+        expected_binary = self._load(TEMP_FILENAME).get_data().get_current_user().dump()
+        with patch('fk.core.abstract_serializer.MMAP_THRESHOLD', 1):
+            with patch('fk.core.abstract_serializer.mmap.mmap', wraps=mmap.mmap) as mapped:
+                self.assertEqual(expected_text, self._load(RAND_FILENAME).get_data().get_current_user().dump())
+                self.assertEqual(expected_binary, self._load(TEMP_FILENAME).get_data().get_current_user().dump())
+                mapped.assert_called()
+
+    def test_parallel_parsing(self):
+        convert_file(RAND_FILENAME, TEMP_FILENAME, True, self.settings, NoCryptograph(self.settings))
+        encryption = {S.SOURCE_ENCRYPTION_KEY: 'test key', S.SOURCE_ENCRYPTION_ENABLED: 'True'}
+        encrypted = MockSettings()
+        encrypted.set(encryption)
+        convert_file(RAND_FILENAME, f'{TEMP_FILENAME}.enc', True, encrypted, FernetCryptograph(encrypted))
+
+        for filename, values in ((RAND_FILENAME, dict()),
+                                 (TEMP_FILENAME, dict()),
+                                 (f'{TEMP_FILENAME}.enc', encryption)):
+            single = self._load(filename, values | {S.FILEEVENTSOURCE_PARSE_WORKERS: '1'})
+            parallel = self._load(filename, values | {
+                S.FILEEVENTSOURCE_PARSE_WORKERS: '4',
+                S.FILEEVENTSOURCE_PARSE_CHUNK: '7',
+            })
+            self.assertEqual(single.get_last_sequence(), parallel.get_last_sequence())
+            self.assertEqual(single.get_data().get_current_user().dump(),
+                             parallel.get_data().get_current_user().dump())
@@ -0,0 +1,149 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import datetime
+import glob
+import os
+from unittest import TestCase
+
+from fk.core.abstract_settings import S
+from fk.core.aes_gcm_cryptograph import AesGcmCryptograph
+from fk.core.backlog_strategies import CreateBacklogStrategy
+from fk.core.binary_serializer import BinarySerializer, create_serializer
+from fk.core.file_event_source import FileEventSource
+from fk.core.import_export import export, import_
+from fk.core.mock_settings import MockSettings
+from fk.core.simple_serializer import SimpleSerializer
+from fk.core.tenant import Tenant
+
+TEMP_FILENAME = 'src/fk/tests/fixtures/flowkeeper-blocks-TEMP.txt'
+EXPORTED_FILENAME = f'{TEMP_FILENAME}-exported'
+IMPORTED_FILENAME = f'{TEMP_FILENAME}-imported'
+
+
+class TestEncryptedBlocks(TestCase):
+    def setUp(self) -> None:
+        self.settings = self._settings(TEMP_FILENAME)
+
+    def tearDown(self) -> None:
+        for f in glob.glob(f'{TEMP_FILENAME}*'):
+            os.unlink(f)
+
+    def _settings(self, filename: str, file_format: str = 'text') -> MockSettings:
+        settings = MockSettings(filename=filename)
+        settings.set({
+            S.SOURCE_ENCRYPTION_KEY: 'test key',
+            S.SOURCE_ENCRYPTION_ENABLED: 'True',
+            S.SOURCE_ENCRYPTION_CIPHER: 'aes-gcm',
+            S.SOURCE_ENCRYPTION_BLOCK: '5',
+            S.FILEEVENTSOURCE_FORMAT: file_format,
+        })
+        return settings
+
+    def _load(self, settings: MockSettings) -> FileEventSource:
+        source = FileEventSource[Tenant](settings, AesGcmCryptograph(settings), Tenant(settings))
+        source.start()
+        return source
+
+    def _create_backlogs(self, source: FileEventSource, count: int) -> None:
+        for i in range(count):
+            source.execute(CreateBacklogStrategy, [f'b{i}', f'Backlog {i}'])
+
+    def _names(self, source: FileEventSource) -> list[str]:
+        return sorted(b.get_name() for b in source.backlogs())
+
+    def test_serializer_round_trip(self):
+        cryptograph = AesGcmCryptograph(self.settings)
+        when = datetime.datetime.now(datetime.timezone.utc)
+        strategies = [CreateBacklogStrategy(i, when, 'user@local.host', [f'b{i}', f'Name {i}'], self.settings)
+                      for i in range(1, 8)]
+        for serializer in (SimpleSerializer(self.settings, cryptograph), BinarySerializer(self.settings, cryptograph)):
+            content = serializer.get_header() + \
+                serializer.to_record(serializer.serialize(strategies[0])) + \
+                serializer.to_record(serializer.serialize_block(strategies[1:6])) + \
+                serializer.to_record(serializer.serialize(strategies[6]))
+            self.assertNotIn(b'Name 3', content)
+
+            with open(f'{TEMP_FILENAME}-records', 'wb') as f:
+                f.write(content)
+            with open(f'{TEMP_FILENAME}-records', 'rb') as f:
+                reader = create_serializer(f, self.settings, AesGcmCryptograph(self.settings))
+                self.assertEqual(type(serializer), type(reader))
+                records = list(reader.read_records(f))
+            self.assertEqual(7, len(records))
+            # All strategies from the block share its raw bytes, which go with the last one
+            self.assertEqual([True, False, False, False, False, True, True], [len(raw) > 0 for raw, r in records])
+            names = [reader.deserialize(r).get_params()[1] for raw, r in records]
+            self.assertEqual([f'Name {i}' for i in range(1, 8)], names)
+
+    def test_open_block_survives_reload(self):
+        source = self._load(self.settings)
+        self._create_backlogs(source, 7)
+        source.disconnect()
+        self.assertTrue(os.path.isfile(f'{TEMP_FILENAME}-block'))
+        with open(TEMP_FILENAME, encoding='UTF-8') as f:
+            content = f.read()
+        self.assertNotIn('Backlog', content)
+        self.assertEqual(1, sum(1 for line in content.split('\n') if line.startswith('*')))
+
+        reloaded = self._load(self.settings)
+        self.assertEqual([f'Backlog {i}' for i in range(7)], self._names(reloaded))
+        self.assertEqual(['Backlog 5', 'Backlog 6'], [s.get_params()[1] for s in reloaded.get_last_strategies(2)])
+
+        # The open block gets sealed when it's full, and the records continue after it
+        for i in range(7, 10):
+            reloaded.execute(CreateBacklogStrategy, [f'b{i}', f'Backlog {i}'])
+        reloaded.disconnect()
+        self.assertFalse(os.path.isfile(f'{TEMP_FILENAME}-block'))
+        self.assertEqual([f'Backlog {i}' for i in range(10)], self._names(self._load(self.settings)))
+
+    def test_binary_file(self):
+        settings = self._settings(TEMP_FILENAME, 'binary')
+        source = self._load(settings)
+        self._create_backlogs(source, 12)
+        source.disconnect()
+        reloaded = self._load(settings)
+        self.assertEqual(sorted(f'Backlog {i}' for i in range(12)), self._names(reloaded))
+        seq = reloaded.get_last_strategies(9)[0].get_sequence()
+        self.assertEqual(9, len(list(reloaded.get_strategies_from(seq))))
+
+    def test_tampered_open_block(self):
+        source = self._load(self.settings)
+        self._create_backlogs(source, 3)
+        source.disconnect()
+        with open(f'{TEMP_FILENAME}-block', 'r+b') as f:
+            f.seek(20)
+            f.write(b'X')
+        # The block is authenticated as a whole, so none of its strategies get through
+        self.assertEqual([], self._names(self._load(self.settings)))
+
+    def test_export_import(self):
+        source = self._load(self.settings)
+        self._create_backlogs(source, 12)
+
+        def nothing(*args):
+            pass
+
+        export(source, EXPORTED_FILENAME, Tenant(self.settings), True, False, nothing, nothing, nothing)
+        with open(EXPORTED_FILENAME, encoding='UTF-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(3, len(lines))     # 13 strategies, including CreateUser, in blocks of 5
+        self.assertTrue(all(line.startswith('*') for line in lines))
+
+        settings = self._settings(IMPORTED_FILENAME)
+        imported = self._load(settings)
+        import_(imported, EXPORTED_FILENAME, False, False, nothing, nothing, nothing)
+        self.assertEqual(self._names(source), self._names(imported))
+
@@ -13,22 +13,33 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import datetime
+import glob
+import json
 import logging
 import os
+import shutil
+import threading
+import time
 from collections.abc import Callable
 from unittest import TestCase
+from unittest.mock import patch
 
 from fk.core.abstract_cryptograph import AbstractCryptograph
 from fk.core.abstract_serializer import AbstractSerializer, T
 from fk.core.abstract_settings import AbstractSettings, S
 from fk.core.abstract_strategy import AbstractStrategy
-from fk.core.backlog_strategies import CreateBacklogStrategy
+from fk.core.backlog_strategies import CreateBacklogStrategy, RenameBacklogStrategy
+from fk.core.checkpoint import get_checkpoint_filename, restore_tenant
 from fk.core.fernet_cryptograph import FernetCryptograph
 from fk.core.file_event_source import FileEventSource
 from fk.core.mock_settings import MockSettings
+from fk.core.replay_profiler import ReplayProfiler
+from fk.core.sequence_index import get_index_filename
+from fk.core.simple_serializer import SimpleSerializer
 from fk.core.tenant import Tenant
 from fk.core.user import User
-from fk.core.workitem_strategies import CreateWorkitemStrategy, MoveWorkitemStrategy
+from fk.core.workitem_strategies import CreateWorkitemStrategy, MoveWorkitemStrategy, RenameWorkitemStrategy
 
 TEMP_FILENAME = 'src/fk/tests/fixtures/flowkeeper-data-TEMP.txt'
 RAND_FILENAME = 'src/fk/tests/fixtures/random.txt'
@@ -99,13 +110,49 @@ class TestFileEventSource(TestCase):
         self.data = self.source.get_data()
 
     def tearDown(self) -> None:
-        os.unlink(TEMP_FILENAME)
+        for f in glob.glob(f'{TEMP_FILENAME}*'):
+            os.unlink(f)
+
+    def _create_checkpointed_source(self) -> FileEventSource:
+        settings = MockSettings(filename=TEMP_FILENAME)
+        settings.set({
+            S.FILEEVENTSOURCE_CHECKPOINTS: 'True',
+            S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL: '100',
+        })
+        source = FileEventSource[Tenant](settings, FernetCryptograph(settings), Tenant(settings))
+        source.start()
+        source.disconnect()     # Waits for the checkpoint to be written
+        return source
 
     def test_initialize(self):
         self.assertIn('user@local.host', self.data)
         user = self.data['user@local.host']
         self.assertEqual(len(user), 0)
 
+    def test_bulk_load_same_as_replay_with_events(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        loaded = dict()
+        for mute_events in (True, False):
+            received = list()
+            source = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+            source.on('*', lambda event, **kwargs: received.append(event))
+            source.start(mute_events)
+            loaded[mute_events] = source
+            if mute_events:
+                self.assertEqual(['SourceMessagesRequested', 'SourceMessagesProcessed'], received)
+            else:
+                self.assertIn('AfterMessageProcessed', received)
+        self.assertEqual(loaded[False]._estimated_count, loaded[True]._estimated_count)
+        self.assertEqual(loaded[False].get_data().get_current_user().dump(),
+                         loaded[True].get_data().get_current_user().dump())
+
+        # Once loaded, the strategies emit events as usual
+        received.clear()
+        source = loaded[True]
+        source.execute(RenameBacklogStrategy, [list(source.backlogs())[0].get_uid(), 'Renamed after bulk load'])
+        self.assertEqual(['BeforeMessageProcessed', 'BeforeBacklogRename', 'AfterBacklogRename', 'AfterMessageProcessed'],
+                         received)
+
     def test_repair_strip_create_backlog(self):
         original = _create_filtered_source()
 
@@ -148,6 +195,410 @@ class TestFileEventSource(TestCase):
                      lambda src: self.assertEqual(original.get_data().get_current_user().dump(), src.get_data().get_current_user().dump()),
                      lambda src: self.assertEqual(original.get_data().get_current_user().dump(), src.get_data().get_current_user().dump()))
 
+    def test_repair_resumes_from_snapshot(self):
+        lines = ['1, 2000-01-02 23:00:00+00:00, admin@local.host: CreateUser("user@local.host", "Local User")',
+                 '2, 2024-01-01 10:00:00+00:00, user@local.host: CreateBacklog("b1", "Backlog")',
+                 '3, 2024-01-01 10:00:01+00:00, user@local.host: CreateWorkitem("w0", "b1", "Sealed")',
+                 '4, 2024-01-01 10:00:02+00:00, user@local.host: CompleteWorkitem("w0", "finished")']
+        for i in range(1, 21):
+            lines.append(f'{len(lines) + 1}, 2024-01-01 10:01:{i:02d}+00:00, user@local.host: '
+                         f'CreateWorkitem("w{i}", "b1", "Workitem {i}")')
+            if i % 4 == 0:
+                # Renaming a sealed workitem fails
+                lines.append(f'{len(lines) + 1}, 2024-01-01 10:01:{i:02d}+00:00, user@local.host: '
+                             f'RenameWorkitem("w0", "Broken {i}")')
+        with open(TEMP_FILENAME, 'w', encoding='UTF-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        self.settings.set({
+            S.SOURCE_IGNORE_ERRORS: 'True',
+            S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL: '3',
+        })
+        source = self._create_another_source()
+
+        executed = list()
+        original = FileEventSource.execute_prepared_strategy
+        with patch.object(FileEventSource, 'execute_prepared_strategy', autospec=True,
+                          side_effect=lambda src, s, *args: executed.append(s) or original(src, s, *args)):
+            log, backup_filename = source.repair()
+        self.assertEqual(5, sum(1 for line in log if 'Removed failed strategy: RenameWorkitemStrategy' in line))
+        # Each failure costs less than one snapshot interval, not a full replay
+        self.assertLess(len(executed), len(lines) + 5 * 3 + 1)
+
+        repaired = self._create_another_source()
+        self.assertEqual(21, len(list(repaired.workitems())))
+        self.assertEqual('Sealed', repaired.find_workitem('w0').get_name())
+        self.assertEqual(len(lines) - 5, repaired.get_last_sequence())
+        self.assertEqual(['No changes were made'], self._create_another_source().repair()[0][-1:])
+
+    def test_checkpoint_restores_same_data(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        original = self._create_checkpointed_source()
+        self.assertTrue(os.path.isfile(get_checkpoint_filename(TEMP_FILENAME)))
+
+        with patch('fk.core.file_event_source.restore_tenant', wraps=restore_tenant) as restore:
+            restored = self._create_checkpointed_source()
+            restore.assert_called_once()
+        self.assertEqual(os.path.getsize(TEMP_FILENAME), restored._offset)
+        self.assertEqual(original.get_last_sequence(), restored.get_last_sequence())
+        self.assertEqual(original.get_data().get_current_user().dump(),
+                         restored.get_data().get_current_user().dump())
+        self.assertEqual(set(t.get_uid() for t in original.tags()), set(t.get_uid() for t in restored.tags()))
+        for tag in original.tags():
+            self.assertEqual(set(w.get_uid() for w in tag.get_workitems()),
+                             set(w.get_uid() for w in restored.find_tag(tag.get_uid()).get_workitems()))
+
+    def test_checkpoint_replays_tail(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        original = self._create_checkpointed_source()
+        backlog = list(original.backlogs())[0]
+        original.execute(RenameBacklogStrategy, [backlog.get_uid(), 'Renamed after checkpoint'])
+
+        with patch('fk.core.file_event_source.restore_tenant', wraps=restore_tenant) as restore:
+            restored = self._create_checkpointed_source()
+            restore.assert_called_once()
+        self.assertEqual('Renamed after checkpoint', restored.find_backlog(backlog.get_uid()).get_name())
+        self.assertEqual(original.get_data().get_current_user().dump(),
+                         restored.get_data().get_current_user().dump())
+
+    def test_checkpoint_discarded_if_file_changed(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        self._create_checkpointed_source()
+        with open(TEMP_FILENAME, encoding='UTF-8') as f:
+            lines = f.readlines()
+        with open(TEMP_FILENAME, 'w', encoding='UTF-8') as f:
+            f.writelines(lines[0:1] + ['# A comment, which changes the log prefix\n'] + lines[1:])
+
+        with patch('fk.core.file_event_source.restore_tenant', wraps=restore_tenant) as restore:
+            restored = self._create_checkpointed_source()
+            restore.assert_not_called()
+        self.assertEqual(len(list(restored.workitems())), len(list(_create_filtered_source().workitems())))
+
+    def _create_another_source(self) -> FileEventSource:
+        another = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+        another.start()
+        return another
+
+    def test_file_change_reads_only_new_data(self):
+        another = self._create_another_source()
+        another.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+        another.execute(CreateBacklogStrategy, ['b2', 'Second backlog'])
+
+        with patch.object(self.source._serializer, 'deserialize', wraps=self.source._serializer.deserialize) as d:
+            self.source._on_file_change(TEMP_FILENAME)
+            self.assertEqual(2, d.call_count)
+        self.assertIsNotNone(self.source.find_backlog('b1'))
+        self.assertIsNotNone(self.source.find_backlog('b2'))
+        self.assertEqual(os.path.getsize(TEMP_FILENAME), self.source._offset)
+
+        # Nothing new -- nothing to read
+        with patch.object(self.source._serializer, 'deserialize', wraps=self.source._serializer.deserialize) as d:
+            self.source._on_file_change(TEMP_FILENAME)
+            d.assert_not_called()
+
+    def test_file_change_skips_incomplete_line(self):
+        another = self._create_another_source()
+        another.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+        with open(TEMP_FILENAME, encoding='UTF-8') as f:
+            last_line = f.readlines()[-1]
+        with open(TEMP_FILENAME, 'w', encoding='UTF-8') as f:
+            f.write(self.source._serializer.serialize(self.source.get_init_strategy(None)) + '\n')
+            f.write(last_line[:20])
+
+        self.source._on_file_change(TEMP_FILENAME)
+        self.assertIsNone(self.source.find_backlog('b1'))
+
+        with open(TEMP_FILENAME, 'a', encoding='UTF-8') as f:
+            f.write(last_line[20:])
+        self.source._on_file_change(TEMP_FILENAME)
+        self.assertIsNotNone(self.source.find_backlog('b1'))
+
+    def test_file_change_rescans_replaced_file(self):
+        another = self._create_another_source()
+        another.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+        self.source._on_file_change(TEMP_FILENAME)
+        another.execute(CreateBacklogStrategy, ['b2', 'Second backlog'])
+        # Sync tools usually write a new file and then rename it
+        shutil.copyfile(TEMP_FILENAME, f'{TEMP_FILENAME}-new')
+        os.replace(f'{TEMP_FILENAME}-new', TEMP_FILENAME)
+
+        with patch.object(self.source._serializer, 'deserialize', wraps=self.source._serializer.deserialize) as d:
+            self.source._on_file_change(TEMP_FILENAME)
+            self.assertEqual(3, d.call_count)
+        self.assertEqual(['b1', 'b2'], list(self.data['user@local.host'].keys()))
+
+    def test_append_keeps_file_open(self):
+        self.source.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+        f = self.source._writer._file
+        self.source.execute(CreateBacklogStrategy, ['b2', 'Second backlog'])
+        self.assertIs(f, self.source._writer._file)
+        self.assertEqual(os.path.getsize(TEMP_FILENAME), self.source._offset)
+
+        # Our own writes don't trigger reading the file
+        with patch.object(self.source._serializer, 'deserialize', wraps=self.source._serializer.deserialize) as d:
+            self.source._on_file_change(TEMP_FILENAME)
+            d.assert_not_called()
+
+        another = self._create_another_source()
+        self.assertEqual(['b1', 'b2'], list(another.get_data()['user@local.host'].keys()))
+
+    def _create_writing_source(self, fsync: str, group_commit_ms: str) -> FileEventSource:
+        self.settings.set({
+            S.FILEEVENTSOURCE_FSYNC: fsync,
+            S.FILEEVENTSOURCE_GROUP_COMMIT_MS: group_commit_ms,
+        })
+        source = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+        source.start()
+        return source
+
+    def test_append_group_commit(self):
+        source = self._create_writing_source('batch', '60000')
+        size = os.path.getsize(TEMP_FILENAME)
+        with patch('fk.core.append_writer.os.fsync') as fsync:
+            for i in range(5):
+                source.execute(CreateBacklogStrategy, [f'b{i}', f'Backlog {i}'])
+            self.assertEqual(size, os.path.getsize(TEMP_FILENAME))
+            source.disconnect()     # Flushes the pending strategies
+            fsync.assert_called_once()
+        self.assertEqual(5, len(self._create_another_source().get_data()['user@local.host']))
+        self.assertEqual(os.path.getsize(TEMP_FILENAME), source._offset)
+
+    def test_append_group_commit_failure(self):
+        source = self._create_writing_source('batch', '10')
+        size = os.path.getsize(TEMP_FILENAME)
+        with patch('fk.core.append_writer.AppendWriter._open', side_effect=OSError('Disk full')):
+            source.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+            for i in range(100):
+                if source._write_error is not None:
+                    break
+                time.sleep(0.01)
+            # The timer couldn't write it, but the error and the record are still there
+            self.assertIsInstance(source._write_error, OSError)
+            self.assertEqual(size, os.path.getsize(TEMP_FILENAME))
+            # The next strategy retries the failed write, so that the caller sees the error
+            self.assertRaises(OSError, lambda: source.execute(CreateBacklogStrategy, ['b2', 'Second backlog']))
+        source.disconnect()
+        self.assertEqual(2, len(self._create_another_source().get_data()['user@local.host']))
+        self.assertEqual(os.path.getsize(TEMP_FILENAME), source._offset)
+
+    def test_append_torn_write(self):
+        source = self._create_writing_source('batch', '10000')
+        size = os.path.getsize(TEMP_FILENAME)
+        source.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+        source.execute(CreateBacklogStrategy, ['b2', 'Second backlog'])
+        first = len(source._writer._pending[0])
+        real_open = source._writer._open
+
+        class TornFile:
+            # Writes all but the last few bytes, and then fails, like a full disk
+            def __init__(self, f):
+                self._f = f
+                self._failed = False
+
+            def write(self, data):
+                if self._failed:
+                    raise OSError('Disk full')
+                self._failed = True
+                return self._f.write(data[:-5])
+
+            def fileno(self):
+                return self._f.fileno()
+
+        with patch('fk.core.append_writer.AppendWriter._open', side_effect=lambda: TornFile(real_open())):
+            self.assertRaises(OSError, source._writer.flush)
+        # The first record is complete, and the torn second one is gone
+        self.assertEqual(size + first, os.path.getsize(TEMP_FILENAME))
+        self.assertEqual(size + first, source._offset)
+        source.disconnect()
+        self.assertEqual(os.path.getsize(TEMP_FILENAME), source._offset)
+        with open(TEMP_FILENAME, encoding='UTF-8') as f:
+            self.assertEqual(1, sum(1 for line in f if 'Second backlog' in line))
+        self.assertEqual(2, len(self._create_another_source().get_data()['user@local.host']))
+
+    def test_append_fsync_per_strategy(self):
+        source = self._create_writing_source('strategy', '0')
+        with patch('fk.core.append_writer.os.fsync') as fsync:
+            source.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+            source.execute(CreateBacklogStrategy, ['b2', 'Second backlog'])
+            self.assertEqual(2, fsync.call_count)
+        source.disconnect()
+
+    def test_append_after_foreign_write(self):
+        another = self._create_another_source()
+        another.execute(CreateBacklogStrategy, ['b1', 'Foreign backlog'])
+        another.execute(CreateBacklogStrategy, ['b2', 'Another foreign backlog'])
+        self.source.execute(CreateBacklogStrategy, ['b3', 'Own backlog'])
+        # We haven't seen the foreign strategies yet, so we must not skip them
+        self.assertLess(self.source._offset, os.path.getsize(TEMP_FILENAME))
+        self.source._on_file_change(TEMP_FILENAME)
+        # The first one has the same sequence as ours, so only the second one gets executed
+        self.assertIsNone(self.source.find_backlog('b1'))
+        self.assertIsNotNone(self.source.find_backlog('b2'))
+        self.assertEqual(os.path.getsize(TEMP_FILENAME), self.source._offset)
+
+    def _create_archiving_source(self, checkpoints: bool = False) -> FileEventSource:
+        settings = MockSettings(filename=TEMP_FILENAME)
+        settings.set({
+            S.SOURCE_ARCHIVE_DAYS: '7',
+            S.FILEEVENTSOURCE_CHECKPOINTS: str(checkpoints),
+            S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL: '100',
+        })
+        source = FileEventSource[Tenant](settings, FernetCryptograph(settings), Tenant(settings))
+        source.start()
+        return source
+
+    def test_archived_backlogs_inflate_on_access(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        original = self._create_another_source()
+        archiving = self._create_archiving_source()
+        archived = [b for b in archiving.backlogs() if b.is_archived()]
+        self.assertEqual(len(list(original.backlogs())), len(archived))
+        self.assertEqual([len(b) for b in original.backlogs()], [len(b) for b in archiving.backlogs()])
+
+        # Finding a workitem only inflates its own backlog
+        workitem = list(original.workitems())[-1]
+        self.assertEqual(workitem.get_name(), archiving.find_workitem(workitem.get_uid()).get_name())
+        self.assertEqual(len(archived) - 1, len([b for b in archiving.backlogs() if b.is_archived()]))
+
+        # Strategies work on archived workitems, too
+        another = next(w for w in original.workitems() if not w.is_sealed())
+        archiving.execute(RenameWorkitemStrategy, [another.get_uid(), 'Renamed #archived'])
+        original.execute(RenameWorkitemStrategy, [another.get_uid(), 'Renamed #archived'])
+        self.assertEqual(1, len(archiving.find_tag('archived').get_workitems()))
+
+        for tag in original.tags():
+            self.assertEqual(set(w.get_uid() for w in tag.get_workitems()),
+                             set(w.get_uid() for w in archiving.find_tag(tag.get_uid()).get_workitems()))
+        for backlog in archiving.backlogs():
+            backlog.inflate()   # Category usages get restored only after inflating
+        self.assertEqual(original.get_data().get_current_user().dump(mask_last_modified=True),
+                         archiving.get_data().get_current_user().dump(mask_last_modified=True))
+
+    def test_archived_backlogs_after_reading(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        original = self._create_another_source()
+        archiving = self._create_archiving_source()
+        self.assertTrue(all(b.is_archived() for b in archiving.backlogs()))
+
+        # Stats and work summary go through all pomodoros and may keep them, so they stay attached
+        pomodoros = list(archiving.pomodoros())
+        self.assertEqual(len(list(original.pomodoros())), len(pomodoros))
+        self.assertFalse(any(b.is_archived() for b in archiving.backlogs()))
+        for pomodoro in pomodoros:
+            workitem = pomodoro.get_parent()
+            self.assertIs(workitem, workitem.get_parent()[workitem.get_uid()])
+            self.assertIs(workitem, archiving.find_workitem(workitem.get_uid()))
+
+        # The next maintenance archives them again, except for the modified ones
+        modified = next(w for w in archiving.workitems() if not w.is_sealed())
+        archiving.execute(RenameWorkitemStrategy, [modified.get_uid(), 'Renamed while reading'])
+        with archiving.maintenance():
+            self.assertFalse(any(b.is_archived() for b in archiving.backlogs()))
+        self.assertFalse(modified.get_parent().is_archived())
+        self.assertEqual(1, len([b for b in archiving.backlogs() if not b.is_archived()]))
+
+    def test_archived_backlogs_in_checkpoint(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        original = self._create_another_source()
+        self._create_archiving_source(True).disconnect()
+        with patch('fk.core.file_event_source.restore_tenant', wraps=restore_tenant) as restore:
+            restored = self._create_archiving_source(True)
+            restore.assert_called_once()
+        self.assertTrue(all(b.is_archived() for b in restored.backlogs()))
+        for tag in original.tags():
+            self.assertEqual(set(w.get_uid() for w in tag.get_workitems()),
+                             set(w.get_uid() for w in restored.find_tag(tag.get_uid()).get_workitems()))
+        for backlog in restored.backlogs():
+            backlog.inflate()
+        self.assertEqual(original.get_data().get_current_user().dump(),
+                         restored.get_data().get_current_user().dump())
+
+    def test_replay_profiler(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        source = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+        profiler = ReplayProfiler()
+        source.set_profiler(profiler)
+        source.start()
+        phases = profiler.to_dict()['phases']
+        self.assertEqual(source._estimated_count, phases['execute']['count'])
+        self.assertEqual(source._estimated_count, sum(k['count'] for k in phases['execute']['keys'].values()))
+        self.assertEqual(source._estimated_count - 1, phases['parse']['count'])  # Except for the auto-sealing
+        self.assertNotIn('emit', phases)    # Nothing is emitted in bulk-load mode
+        timings = phases['execute']['keys']['CreateBacklogStrategy']
+        self.assertLessEqual(timings['p50_ms'], timings['p99_ms'])
+        self.assertLessEqual(timings['p99_ms'], timings['max_ms'])
+
+        profiler.reset()
+        source.execute(CreateBacklogStrategy, ['b1', 'Profiled backlog'])
+        phases = json.loads(profiler.to_json())['phases']
+        self.assertEqual(1, phases['execute']['keys']['CreateBacklogStrategy']['count'])
+        self.assertEqual(1, phases['persist']['count'])
+        self.assertEqual({'BeforeMessageProcessed', 'BeforeBacklogCreate', 'AfterBacklogCreate', 'AfterMessageProcessed'},
+                         set(phases['emit']['keys'].keys()))
+
+    def test_state_at(self):
+        self.settings.set({S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL: '10'})
+        source = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+        source.start()
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        for i in range(50):
+            source.execute(CreateBacklogStrategy, [f'b{i}', f'Backlog {i}'], when=start + datetime.timedelta(hours=i))
+        source.execute(RenameBacklogStrategy, ['b0', 'Renamed'], when=start + datetime.timedelta(hours=50))
+        source.disconnect()     # Flushes the index
+
+        def backlogs(state: Tenant) -> list[str]:
+            return [b.get_name() for b in state['user@local.host'].values()]
+
+        with patch.object(source, 'get_strategies_from', wraps=source.get_strategies_from) as read:
+            self.assertEqual(['Backlog 0', 'Backlog 1'], backlogs(source.get_state_at(3)))
+            self.assertEqual(40, len(backlogs(source.get_state_at(41))))
+            # Moving forward continues from the last reconstructed state
+            self.assertEqual(['Backlog 0', 'Backlog 1', 'Backlog 2'],
+                             backlogs(source.get_state_at(when=start + datetime.timedelta(hours=2, minutes=30)))[:3])
+            self.assertEqual('Renamed', backlogs(source.get_state_at())[0])
+            # Going back starts from the nearest in-memory snapshot
+            self.assertEqual(25, len(backlogs(source.get_state_at(26))))
+            self.assertEqual([1, 4, 1, 5, 21], [c.args[0] for c in read.call_args_list])
+
+        self.assertEqual(source.get_data().get_current_user().dump(mask_last_modified=True),
+                         source.get_state_at().get_current_user().dump(mask_last_modified=True))
+        del source.get_state_at()['user@local.host']['b1']   # It's a copy
+        self.assertEqual(50, len(backlogs(source.get_state_at())))
+
+    def test_state_at_without_index(self):
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        source = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+        source.start()
+        self.assertNotEqual('True', self.settings.get(S.FILEEVENTSOURCE_INDEX))
+        last = source.get_last_sequence()
+        source.get_state_at(last - 20)
+
+        # The index is only rebuilt once, so moving forward only reads what's after the cursor
+        with patch.object(SimpleSerializer, 'deserialize', autospec=True,
+                          side_effect=SimpleSerializer.deserialize) as deserialize:
+            source.get_state_at(last - 10)
+            self.assertLessEqual(deserialize.call_count, 11)
+
+        # Until the data file changes
+        source.execute(CreateBacklogStrategy, ['new', 'New backlog'])
+        self.assertIsNone(source._memory_index)
+        self.assertEqual('New backlog', source.get_state_at().find_backlog('new').get_name())
+        self.assertIsNotNone(source._memory_index)
+        self.assertFalse(os.path.isfile(get_index_filename(TEMP_FILENAME)))
+
+        # It waits for the strategies being replayed or appended in another thread
+        source.disconnect()
+        source = FileEventSource[Tenant](self.settings, self.cryptograph, Tenant(self.settings))
+        source.start()
+        states = list()
+        reader = threading.Thread(target=lambda: states.append(source.get_state_at(last - 5)))
+        with source._lock:
+            reader.start()
+            reader.join(0.2)
+            self.assertTrue(reader.is_alive())
+            self.assertIsNone(source._memory_index)
+        reader.join()
+        self.assertEqual(1, len(states))
+
     # Tests:
     # - Filesystem watcher
     # - Cryptograph -- create a dedicated unit test for it
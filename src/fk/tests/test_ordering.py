@@ -15,10 +15,13 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import datetime
 import logging
+import random
 from itertools import permutations
 from statistics import mean
+from unittest.mock import patch
 
 from fk.core.backlog import Backlog
+from fk.core.ordered_children import OrderedChildren
 from fk.core.ordering import get_reordering_strategies
 from fk.core.tenant import Tenant, ADMIN_USER
 from fk.core.user import User
@@ -102,3 +105,59 @@ class TestEvents(AbstractTestCase):
         avg = self._internal_full_test(6)
         self.assertEqual(avg, 2.6958333333333333)
 
+    def _move(self, expected: list[Workitem], w: Workitem, index_to: int) -> None:
+        index_from = expected.index(w)
+        expected.insert(index_to if index_to <= index_from else index_to - 1, expected.pop(index_from))
+        self.backlog.move_child(w, index_to)
+        self.assertEqual(_keys(expected), _keys(self.backlog.values()))
+
+    def test_random_moves_and_deletes(self):
+        # The container must behave exactly like a plain list
+        rnd = random.Random(42)
+        expected = [self._create_workitem(i) for i in range(50)]
+        for i in range(2000):
+            w = rnd.choice(expected)
+            if i % 10 == 0 and len(expected) > 10:
+                expected.remove(w)
+                del self.backlog[w.get_uid()]
+            else:
+                self._move(expected, w, rnd.randint(0, len(expected)))
+            if i % 50 == 0:
+                expected.append(self._create_workitem(1000 + i))
+
+        # Squeezing the items between the same two neighbours runs out of float precision at some point
+        for i in range(200):
+            self._move(expected, expected[-1], 2)
+        self.assertEqual(_keys(expected), _keys(self.backlog.values()))
+
+    @patch('fk.core.ordered_children.LOAD', 4)
+    def test_ordered_children(self):
+        # Small blocks, so that they get split and merged all the time
+        rnd = random.Random(42)
+        ordered = OrderedChildren[str]()
+        expected = list[float]()
+        for i in range(5000):
+            if rnd.random() < 0.2:
+                key = expected[-1] + 1 if len(expected) > 0 else 0.0
+                self.assertEqual(key, ordered.append(f'v{key}'))
+                expected.append(key)
+            elif rnd.random() < 0.6 or len(expected) == 0:
+                key = rnd.uniform(-1000, 1000)
+                ordered.insert(key, f'v{key}')
+                expected.append(key)
+                expected.sort()
+            else:
+                key = rnd.choice(expected)
+                self.assertEqual(f'v{key}', ordered.remove(key))
+                expected.remove(key)
+            self.assertEqual(len(expected), len(ordered))
+            if len(expected) > 0:
+                j = rnd.randrange(len(expected))
+                self.assertEqual(expected[j], ordered.key_at(j))
+                self.assertEqual(j, ordered.index_of(expected[j]))
+                self.assertEqual(f'v{expected[0]}', ordered.first())
+                self.assertEqual(expected[-1], ordered.last_key())
+            if i % 100 == 0:
+                self.assertEqual([f'v{k}' for k in expected], ordered.values())
+        self.assertEqual([f'v{k}' for k in expected], list(ordered))
+        self.assertRaises(KeyError, lambda: ordered.remove(5000.0))
@@ -15,6 +15,7 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import datetime
 import logging
+import tracemalloc
 from unittest import TestCase
 
 from fk.core.abstract_cryptograph import AbstractCryptograph
@@ -82,6 +83,22 @@ class TestPomodoros(TestCase):
         self.source.execute(AddPomodoroStrategy, ['w11', str(n), type])
         return user, backlog, workitem, workitem.values()
 
+    def test_memory_per_10k_pomodoros(self):
+        user, backlog, workitem = self._standard_workitem()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            self.source.execute(AddPomodoroStrategy, ['w11', '10000'])
+            used = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(10000, len(workitem))
+        pomodoro: Pomodoro = workitem.values()[0]
+        self.assertFalse(hasattr(pomodoro, '__dict__'))
+        self.assertEqual(0, len(pomodoro.values()))
+        # It used to take ~6.9 MB with a __dict__ and the empty containers for interruptions, now it's ~4 MB
+        self.assertLess(used, 5_000_000)
+
     # Tests:
     # + Sealing pomodoros
     # - pomodoro.seal()
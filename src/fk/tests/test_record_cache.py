@@ -0,0 +1,128 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import glob
+import os
+from unittest import TestCase
+
+from fk.core.abstract_settings import S
+from fk.core.aes_gcm_cryptograph import AesGcmCryptograph
+from fk.core.backlog_strategies import CreateBacklogStrategy
+from fk.core.file_event_source import FileEventSource
+from fk.core.import_export import export
+from fk.core.mock_settings import MockSettings
+from fk.core.record_cache import RecordCache, MISSING
+from fk.core.tenant import Tenant
+
+TEMP_FILENAME = 'src/fk/tests/fixtures/flowkeeper-cache-TEMP.txt'
+EXPORTED_FILENAME = f'{TEMP_FILENAME}-exported'
+
+
+class CountingCryptograph(AesGcmCryptograph):
+    decrypted: list[str]
+
+    def __init__(self, settings: MockSettings):
+        self.decrypted = list()
+        super().__init__(settings)
+
+    def decrypt(self, s: str) -> str:
+        self.decrypted.append(s)
+        return super().decrypt(s)
+
+
+def nothing(*args, **kwargs):
+    pass
+
+
+class TestRecordCache(TestCase):
+    def setUp(self) -> None:
+        self.settings = MockSettings(filename=TEMP_FILENAME)
+        self.settings.set({
+            S.SOURCE_ENCRYPTION_KEY: 'test key',
+            S.SOURCE_ENCRYPTION_ENABLED: 'True',
+            S.SOURCE_ENCRYPTION_CIPHER: 'aes-gcm',
+        })
+
+    def tearDown(self) -> None:
+        for f in glob.glob(f'{TEMP_FILENAME}*'):
+            os.unlink(f)
+
+    def _load(self) -> FileEventSource:
+        source = FileEventSource[Tenant](self.settings, CountingCryptograph(self.settings), Tenant(self.settings))
+        source.start()
+        return source
+
+    def _encrypted_records(self) -> int:
+        with open(TEMP_FILENAME, encoding='UTF-8') as f:
+            return sum(1 for line in f if line.startswith('+'))
+
+    def test_bounded(self):
+        cache = RecordCache(2)
+        keys = [RecordCache.key('parsed', f'record {i}') for i in range(3)]
+        cache.put(keys[0], 'a')
+        cache.put(keys[1], None)
+        self.assertEqual('a', cache.get(keys[0]))   # Now keys[1] is the least recently used one
+        cache.put(keys[2], 'c')
+        self.assertEqual(2, len(cache))
+        self.assertIs(MISSING, cache.get(keys[1]))
+        self.assertEqual('c', cache.get(keys[2]))
+        self.assertNotEqual(RecordCache.key('parsed', 'x'), RecordCache.key('block', 'x'))
+        self.assertEqual(RecordCache.key('parsed', 'x'), RecordCache.key('parsed', b'x'))
+
+        cache.release()
+        cache.put(keys[0], 'a')
+        self.assertEqual(0, len(cache))
+
+    def test_maintenance_decrypts_once(self):
+        source = self._load()
+        for i in range(10):
+            source.execute(CreateBacklogStrategy, [f'b{i}', f'Backlog {i}'])
+        source.disconnect()
+        encrypted = self._encrypted_records()
+        self.assertGreaterEqual(encrypted, 10)
+
+        source = self._load()
+        cryptograph: CountingCryptograph = source._cryptograph
+        cryptograph.decrypted.clear()
+        with source.maintenance():
+            log, backup = source.repair()
+            self.assertIsNone(backup)
+            export(source, EXPORTED_FILENAME, Tenant(self.settings), False, False, nothing, nothing, nothing)
+            export(source, EXPORTED_FILENAME, Tenant(self.settings), False, False, nothing, nothing, nothing)
+            self.assertEqual(encrypted, len(cryptograph.decrypted))
+        self.assertIsNone(source._record_cache)
+
+        # Once released, everything is decrypted again
+        cryptograph.decrypted.clear()
+        export(source, EXPORTED_FILENAME, Tenant(self.settings), False, False, nothing, nothing, nothing)
+        self.assertEqual(encrypted, len(cryptograph.decrypted))
+        with open(EXPORTED_FILENAME, encoding='UTF-8') as f:
+            self.assertIn('Backlog 9', f.read())
+
+    def test_file_change_during_maintenance(self):
+        source = self._load()
+        source.execute(CreateBacklogStrategy, ['b1', 'First backlog'])
+        another = self._load()
+        with source.maintenance():
+            self.assertEqual(2, len(list(source.get_strategies_from(1))))
+            cached = len(source._record_cache)
+            another.execute(CreateBacklogStrategy, ['b2', 'Second backlog'])
+            another.disconnect()
+            # The changes from the file watcher are read past the cache, which only serves maintenance
+            source._on_file_change(TEMP_FILENAME)
+            self.assertIsNotNone(source.find_backlog('b2'))
+            self.assertEqual(cached, len(source._record_cache))
+            self.assertIsNone(source._serializer._cache)
+        source.disconnect()
@@ -0,0 +1,132 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import glob
+import os
+import shutil
+from unittest import TestCase
+from unittest.mock import patch
+
+from fk.core.abstract_settings import S
+from fk.core.backlog_strategies import RenameBacklogStrategy
+from fk.core.checkpoint import restore_tenant
+from fk.core.file_event_source import FileEventSource
+from fk.core.mock_settings import MockSettings
+from fk.core.no_cryptograph import NoCryptograph
+from fk.core.segments import get_segment_filename, get_manifest_filename, Manifest
+from fk.core.tenant import Tenant
+
+TEMP_BASE = 'src/fk/tests/fixtures/flowkeeper-segments-TEMP'
+TEMP_FILENAME = f'{TEMP_BASE}.txt'
+RAND_FILENAME = 'src/fk/tests/fixtures/random.txt'
+
+
+class TestSegments(TestCase):
+    def setUp(self) -> None:
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+
+    def tearDown(self) -> None:
+        for f in glob.glob(f'{TEMP_BASE}*'):
+            os.unlink(f)
+
+    def _create_source(self, checkpoints: bool = False) -> FileEventSource:
+        settings = MockSettings(filename=TEMP_FILENAME)
+        settings.set({
+            S.FILEEVENTSOURCE_SEGMENTS: 'size',
+            S.FILEEVENTSOURCE_SEGMENT_SIZE: '16',
+            S.FILEEVENTSOURCE_CHECKPOINTS: str(checkpoints),
+            S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL: '100',
+        })
+        source = FileEventSource[Tenant](settings, NoCryptograph(settings), Tenant(settings))
+        source.start()
+        return source
+
+    def test_single_file_layout(self):
+        source = self._create_source()
+        self.assertEqual([TEMP_FILENAME], source._manifest.get_files())
+        self.assertFalse(os.path.isfile(get_manifest_filename(TEMP_FILENAME)))
+
+    def test_rollover(self):
+        source = self._create_source()
+        last_seq = source.get_last_sequence()
+        backlog = list(source.backlogs())[0]
+        source.execute(RenameBacklogStrategy, [backlog.get_uid(), 'Renamed in a new segment'])
+        source.disconnect()
+
+        segment = get_segment_filename(TEMP_FILENAME, 1)
+        self.assertTrue(os.path.isfile(segment))
+        self.assertEqual(os.path.getsize(RAND_FILENAME), os.path.getsize(segment))
+        manifest = Manifest.load(TEMP_FILENAME, source.get_settings(), NoCryptograph(source.get_settings()))
+        self.assertEqual(1, len(manifest.segments))
+        self.assertEqual(1, manifest.segments[0].first_seq)
+        self.assertEqual(last_seq, manifest.segments[0].last_seq)
+        self.assertTrue(manifest.segments[0].verify(os.path.dirname(TEMP_FILENAME)))
+
+        # Only the new strategy goes to the active segment
+        with open(TEMP_FILENAME, encoding='UTF-8') as f:
+            self.assertEqual(1, len(f.readlines()))
+
+        reloaded = self._create_source()
+        self.assertEqual('Renamed in a new segment', reloaded.find_backlog(backlog.get_uid()).get_name())
+        self.assertEqual(source.get_data().get_current_user().dump(),
+                         reloaded.get_data().get_current_user().dump())
+
+    def test_checkpoint_in_sealed_segment(self):
+        source = self._create_source(True)
+        backlog = list(source.backlogs())[0]
+        source.execute(RenameBacklogStrategy, [backlog.get_uid(), 'Renamed after checkpoint'])
+        source.disconnect()
+
+        # The checkpoint was taken in what is now the sealed segment
+        with patch('fk.core.file_event_source.restore_tenant', wraps=restore_tenant) as restore:
+            reloaded = self._create_source(True)
+            restore.assert_called_once()
+        self.assertEqual('Renamed after checkpoint', reloaded.find_backlog(backlog.get_uid()).get_name())
+        self.assertEqual(source.get_data().get_current_user().dump(),
+                         reloaded.get_data().get_current_user().dump())
+
+    def test_recover_unlisted_segment(self):
+        source = self._create_source()
+        backlog = list(source.backlogs())[0]
+        source.execute(RenameBacklogStrategy, [backlog.get_uid(), 'Renamed'])
+        source.disconnect()
+
+        # As if we crashed right after renaming the active segment
+        os.unlink(get_manifest_filename(TEMP_FILENAME))
+        reloaded = self._create_source()
+        self.assertEqual(2, len(reloaded._manifest.get_files()))
+        self.assertEqual('Renamed', reloaded.find_backlog(backlog.get_uid()).get_name())
+
+    def test_rollover_with_invalid_record(self):
+        with open(TEMP_FILENAME, 'a', encoding='UTF-8') as f:
+            f.write('This is not a strategy\n')
+        source = self._create_source()
+        last_seq = source.get_last_sequence()
+        backlog = list(source.backlogs())[0]
+        # The source knows the sequences in the active segment, so it doesn't read it again
+        with patch('fk.core.segments.Segment.describe') as describe:
+            source.execute(RenameBacklogStrategy, [backlog.get_uid(), 'Renamed in a new segment'])
+            describe.assert_not_called()
+        source.disconnect()
+        self.assertEqual(last_seq, source._manifest.segments[0].last_seq)
+
+        # As if we crashed right after renaming the active segment, so we have to read it
+        os.unlink(get_manifest_filename(TEMP_FILENAME))
+        reloaded = self._create_source()
+        self.assertEqual(2, len(reloaded._manifest.get_files()))
+        self.assertEqual(1, reloaded._manifest.segments[0].first_seq)
+        self.assertEqual(last_seq, reloaded._manifest.segments[0].last_seq)
+        self.assertEqual(source._manifest.segments[0].count, reloaded._manifest.segments[0].count)
+        self.assertEqual('Renamed in a new segment', reloaded.find_backlog(backlog.get_uid()).get_name())
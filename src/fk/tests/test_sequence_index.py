@@ -0,0 +1,114 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import datetime
+import glob
+import os
+import shutil
+from unittest import TestCase
+
+from fk.core.abstract_settings import S
+from fk.core.backlog_strategies import RenameBacklogStrategy
+from fk.core.binary_serializer import convert_file
+from fk.core.file_event_source import FileEventSource
+from fk.core.mock_settings import MockSettings
+from fk.core.no_cryptograph import NoCryptograph
+from fk.core.sequence_index import get_index_filename
+from fk.core.simple_serializer import SimpleSerializer
+from fk.core.tenant import Tenant
+
+TEMP_FILENAME = 'src/fk/tests/fixtures/flowkeeper-index-TEMP.txt'
+RAND_FILENAME = 'src/fk/tests/fixtures/random.txt'
+
+
+class TestSequenceIndex(TestCase):
+    def setUp(self) -> None:
+        shutil.copyfile(RAND_FILENAME, TEMP_FILENAME)
+        settings = MockSettings()
+        self.serializer = SimpleSerializer(settings, NoCryptograph(settings))
+        with open(RAND_FILENAME, encoding='UTF-8') as f:
+            self.strategies = [self.serializer.deserialize(line) for line in f if line.strip() != '']
+
+    def tearDown(self) -> None:
+        for f in glob.glob(f'{TEMP_FILENAME}*'):
+            os.unlink(f)
+
+    def _text(self, strategies) -> list[str]:
+        return [self.serializer.serialize(s) for s in strategies]
+
+    def _create_source(self, filename: str = TEMP_FILENAME, checkpoints: bool = False) -> FileEventSource:
+        settings = MockSettings(filename=filename)
+        settings.set({
+            S.FILEEVENTSOURCE_INDEX: 'True',
+            S.FILEEVENTSOURCE_CHECKPOINTS: str(checkpoints),
+            S.FILEEVENTSOURCE_CHECKPOINT_INTERVAL: '100',
+        })
+        source = FileEventSource[Tenant](settings, NoCryptograph(settings), Tenant(settings))
+        source.start()
+        return source
+
+    def test_index_created_on_load(self):
+        self._create_source().disconnect()
+        self.assertTrue(os.path.isfile(get_index_filename(TEMP_FILENAME)))
+        self.assertEqual([], self._create_source().check_sequences())
+
+    def test_read_from_sequence(self):
+        source = self._create_source()
+        seq = self.strategies[-10].get_sequence()
+        found = list(source.get_strategies_from(seq))
+        self.assertEqual(self._text(self.strategies[-10:]), self._text(found))
+        self.assertEqual([], list(source.get_strategies_from(self.strategies[-1].get_sequence() + 1)))
+
+    def test_index_updated_on_append(self):
+        source = self._create_source()
+        backlog = list(source.backlogs())[0]
+        source.execute(RenameBacklogStrategy, [backlog.get_uid(), 'Renamed and indexed'])
+        source.disconnect()
+
+        reloaded = self._create_source()
+        last = reloaded.get_last_strategies(1)
+        self.assertEqual(1, len(last))
+        self.assertEqual('Renamed and indexed', last[0].get_params()[1])
+
+    def test_read_time_window(self):
+        source = self._create_source()
+        start = self.strategies[100].get_when()
+        end = start + datetime.timedelta(days=3)
+        expected = list()
+        for s in self.strategies[100:]:
+            if s.get_when() > end:
+                break
+            expected.append(self.serializer.serialize(s))
+        self.assertEqual(expected, self._text(source.get_strategies_between(start, end)))
+
+    def test_rebuilt_if_missing(self):
+        self._create_source(checkpoints=True).disconnect()
+        os.unlink(get_index_filename(TEMP_FILENAME))
+
+        # Loading from the checkpoint doesn't see the whole file, so the index is rebuilt on first use
+        source = self._create_source(checkpoints=True)
+        self.assertFalse(os.path.isfile(get_index_filename(TEMP_FILENAME)))
+        found = source.get_last_strategies(3)
+        self.assertEqual(self._text(self.strategies[-3:]), self._text(found))
+        self.assertTrue(os.path.isfile(get_index_filename(TEMP_FILENAME)))
+
+    def test_binary_file(self):
+        settings = MockSettings()
+        binary_filename = f'{TEMP_FILENAME}.bin'
+        convert_file(RAND_FILENAME, binary_filename, True, settings, NoCryptograph(settings))
+        source = self._create_source(binary_filename)
+        seq = self.strategies[-5].get_sequence()
+        self.assertEqual(self._text(self.strategies[-5:]),
+                         self._text(source.get_strategies_from(seq)))
@@ -0,0 +1,175 @@
+#  Flowkeeper - Pomodoro timer for power users and teams
+#  Copyright (c) 2023 Constantine Kulak
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import datetime
+import random
+from unittest import TestCase
+
+from fk.core.abstract_settings import S
+from fk.core.backlog_strategies import RenameBacklogStrategy
+from fk.core.fernet_cryptograph import FernetCryptograph
+# It imports all strategies, which the fixtures use, so that they get registered
+from fk.core.file_event_source import FileEventSource
+from fk.core.mock_settings import MockSettings
+from fk.core.no_cryptograph import NoCryptograph
+from fk.core.simple_serializer import SimpleSerializer
+
+FIXTURES = [
+    'src/fk/tests/fixtures/random.txt',
+    'src/fk/tests/fixtures/test-tags.txt',
+]
+
+# Lines in the canonical format, which have to be parsed without the regex
+CANONICAL = [
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("", "")',
+    '12, 2024-01-01 00:00:00.123456+05:30, first.last-name@sub.domain.org: RenameBacklog("b1", "Name, with (parens)")',
+    '3, 2024-01-01 00:00:00+00:00, a@b.com: RenameBacklog("b1", "Quoted \\"name\\"")',
+    '4, 2024-01-01 00:00:00+00:00, a@b.com: RenameBacklog("b1", "Back\\\\slash\\\\")',
+    '5, 2024-01-01 00:00:00+00:00, a@b.com: RenameBacklog("b1", "Привет, ", ")")',
+    '6, 2024-01-01 00:00:00+00:00, a@b.com: CreateWorkitem("w1", "b1", "Title", "Fourth")',
+    '7, 2024-01-01 00:00:00+00:00, a@b.com: RenameBacklog("b1", "As read from a file")\n',
+]
+
+# Lines which the regex deals with in its own peculiar way
+IRREGULAR = [
+    '1 , 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name")',
+    '1,2024-01-01 00:00:00+00:00,a@b.com:CreateBacklog( "b1" , "Name" )',
+    '1,  2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name")',
+    '01, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name")',
+    'Some prefix 1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name")',
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name") and a suffix',
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("1", "2", "3", "4", "5", "6")',
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Bad \\escape")',
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name"',
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog()',
+    '1, 2024-01-01T00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name")',
+    '1, 2024-01-01 00:00:00+00:00, a@b.toolong: CreateBacklog("b1", "Name")',
+    '1, 2024-01-01 00:00:00+00:00, not-an-email: CreateBacklog("b1", "Name")',
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: Create_Backlog("b1", "Name")',
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Stray " quote")',
+    '1, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name")\r',
+    '١, 2024-01-01 00:00:00+00:00, a@b.com: CreateBacklog("b1", "Name")',
+]
+
+
+def _regex_or_error(line: str):
+    try:
+        return SimpleSerializer.tokenize_with_regex(line)
+    except Exception as ex:
+        return str(ex)
+
+
+class TestSimpleSerializer(TestCase):
+    def setUp(self) -> None:
+        self.settings = MockSettings()
+        self.serializer = SimpleSerializer(self.settings, NoCryptograph(self.settings))
+
+    def _assert_conforms(self, line: str) -> None:
+        tokens = SimpleSerializer.tokenize(line)
+        if tokens is not None:
+            self.assertEqual(_regex_or_error(line), tokens, line)
+
+    def test_fixtures_take_fast_path(self):
+        for filename in FIXTURES:
+            with open(filename, encoding='UTF-8') as f:
+                for line in f:
+                    if line.strip() == '' or line.startswith('#'):
+                        continue
+                    self.assertIsNotNone(SimpleSerializer.tokenize(line), line)
+                    self._assert_conforms(line)
+
+    def test_records_take_fast_path(self):
+        # Exactly what the file event source gets from read_records(), trailing newlines included
+        for filename in FIXTURES:
+            with open(filename, 'rb') as f:
+                for raw, record in self.serializer.read_records(f):
+                    if record.strip() == '' or record.startswith('#'):
+                        continue
+                    self.assertTrue(record.endswith('\n'), record)
+                    self.assertIsNotNone(SimpleSerializer.tokenize(record), record)
+                    self._assert_conforms(record)
+
+    def test_canonical_corpus(self):
+        for line in CANONICAL:
+            self.assertIsNotNone(SimpleSerializer.tokenize(line), line)
+            self._assert_conforms(line)
+
+    def test_irregular_corpus(self):
+        for line in IRREGULAR:
+            self.assertIsNone(SimpleSerializer.tokenize(line), line)
+
+    def test_mutated_corpus(self):
+        # Whatever we do to a valid line, the tokenizer either agrees with the regex, or gives up
+        rnd = random.Random(42)
+        alphabet = ['"', '\\', ',', ' ', ':', '(', ')', '@', '.', '0', 'a', 'Я']
+        for line in CANONICAL:
+            for i in range(500):
+                mutated = list(line)
+                for j in range(rnd.randint(1, 3)):
+                    pos = rnd.randrange(len(mutated) + 1)
+                    if rnd.random() < 0.5 and pos < len(mutated):
+                        del mutated[pos]
+                    else:
+                        mutated.insert(pos, rnd.choice(alphabet))
+                self._assert_conforms(''.join(mutated))
+
+    def test_round_trip(self):
+        rnd = random.Random(42)
+        alphabet = ['"', '\\', ',', ', ', ' ', '(', ')', '")', '", "', '\\"', 'x', 'Я', '\n']
+        when = datetime.datetime(2024, 3, 1, 10, 20, 30, 123456, tzinfo=datetime.timezone.utc)
+        for i in range(500):
+            name = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 8)))
+            s = RenameBacklogStrategy(i + 1, when, 'user@local.host', ['b1', name], self.settings)
+            line = self.serializer.serialize(s)
+            self.assertIsNotNone(SimpleSerializer.tokenize(line), line)
+            self._assert_conforms(line)
+            self.assertEqual(('b1', name), self.serializer.deserialize(line).get_params())
+
+    def test_compact_strategies(self):
+        with open(FIXTURES[0], encoding='UTF-8') as f:
+            strategies = [self.serializer.deserialize(line) for line in f if line.strip() != '']
+        identities = dict()
+        for s in strategies:
+            self.assertFalse(hasattr(s, '__dict__'), type(s).__name__)
+            self.assertIsInstance(s.get_params(), tuple)
+            identity = identities.setdefault(s.get_user_identity(), s.get_user_identity())
+            self.assertIs(identity, s.get_user_identity())
+
+    def test_parse_many_encrypted(self):
+        settings = MockSettings()
+        settings.set({S.SOURCE_ENCRYPTION_KEY: 'test key', S.SOURCE_ENCRYPTION_ENABLED: 'True'})
+        cryptograph = FernetCryptograph(settings)
+        serializer = SimpleSerializer(settings, cryptograph)
+        with open(FIXTURES[0], encoding='UTF-8') as f:
+            lines = [serializer.serialize(self.serializer.deserialize(line)) for line in f if line.strip() != ''][:300]
+        self.assertTrue(lines[10].startswith('+'))
+        lines[10] = lines[10][:-5] + 'XXXXX'
+        lines[20] = '1, 2024-01-01 00:00:00+00:00, a@b.com: Bad syntax'
+
+        tokens = [line[1:] for line in lines if line.startswith('+')]
+        decrypted = cryptograph.decrypt_many(tokens)
+        self.assertEqual(len(tokens), len(decrypted))
+        self.assertIsNone(decrypted[10])
+        self.assertEqual(cryptograph.decrypt(tokens[11]), decrypted[11])
+
+        parsed = serializer.parse_many(lines)
+        self.assertEqual(len(lines), len(parsed))
+        for i, (line, (p, error)) in enumerate(zip(lines, parsed)):
+            if i == 10 or i == 20:
+                self.assertIsNone(p)
+                self.assertIsNotNone(error)
+            else:
+                self.assertIsNone(error)
+                self.assertEqual(serializer.parse(line), p)
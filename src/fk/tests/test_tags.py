@@ -21,6 +21,7 @@ from fk.core.abstract_cryptograph import AbstractCryptograph
 from fk.core.abstract_settings import AbstractSettings
 from fk.core.backlog import Backlog
 from fk.core.backlog_strategies import CreateBacklogStrategy
+from fk.core.checkpoint import archive_backlog, snapshot_tenant, restore_tenant
 from fk.core.ephemeral_event_source import EphemeralEventSource
 from fk.core.fernet_cryptograph import FernetCryptograph
 from fk.core.file_event_source import FileEventSource
@@ -31,7 +32,8 @@ from fk.core.tenant import Tenant
 from fk.core.user import User
 from fk.core.user_strategies import CreateUserStrategy
 from fk.core.workitem import Workitem
-from fk.core.workitem_strategies import CreateWorkitemStrategy, DeleteWorkitemStrategy, RenameWorkitemStrategy
+from fk.core.workitem_strategies import CreateWorkitemStrategy, DeleteWorkitemStrategy, RenameWorkitemStrategy, \
+    MoveWorkitemStrategy
 
 
 class TestTags(TestCase):
@@ -182,6 +184,47 @@ class TestTags(TestCase):
         self.assertIn('last', tags)
         self.assertIn('tags', tags)
 
+    # - Workitem -> tags index
+    def test_workitem_tags(self):
+        user = self.data['user@local.host']
+        tags = user.get_tags()
+
+        def names(workitem: Workitem) -> set[str]:
+            found = set(t.get_uid() for t in tags.get_workitem_tags(workitem))
+            self.assertEqual(workitem.get_tags(), found)
+            return found
+
+        w11 = self._add_workitem('Tagged #one #two', 'w11')
+        w12 = self._add_workitem('Tagged #two', 'w12')
+        self.assertEqual({'one', 'two'}, names(w11))
+        self.assertEqual({'two'}, names(w12))
+
+        self._rename_workitem('w11', 'Tagged #two #three')
+        self.assertEqual({'two', 'three'}, names(w11))
+        self.assertNotIn('one', tags)
+
+        self.source.execute(CreateBacklogStrategy, ['b2', 'Second backlog'])
+        self.source.execute(MoveWorkitemStrategy, ['w11', 'b2'])
+        self.assertEqual({'two', 'three'}, names(w11))
+        self.assertEqual({w11, w12}, tags['two'].get_workitems())
+
+        # Archived workitems are not in the index until their backlog gets inflated
+        self.assertTrue(archive_backlog(user['b2']))
+        self.assertEqual(set(), tags.get_workitem_tags(w11))
+        w11 = user.find_workitem('w11')
+        self.assertEqual({'two', 'three'}, names(w11))
+
+        restored = Tenant(self.settings)
+        restore_tenant(snapshot_tenant(self.data), restored)
+        restored_user = restored['user@local.host']
+        self.assertEqual({'two', 'three'},
+                         set(t.get_uid() for t in restored_user.get_tags().get_workitem_tags(restored_user['b2']['w11'])))
+
+        self._delete_workitem('w11')
+        self._delete_workitem('w12')
+        self.assertEqual(0, len(tags))
+        self.assertEqual(0, len(tags._workitem_tags))
+
     # - Tag accessors in event source
     def test_event_source(self):
         user = self.data['user@local.host']
@@ -20,13 +20,14 @@ from unittest import TestCase
 from fk.core.abstract_cryptograph import AbstractCryptograph
 from fk.core.abstract_settings import AbstractSettings
 from fk.core.backlog import Backlog
-from fk.core.backlog_strategies import CreateBacklogStrategy
+from fk.core.backlog_strategies import CreateBacklogStrategy, DeleteBacklogStrategy
+from fk.core.checkpoint import snapshot_tenant, restore_tenant
 from fk.core.ephemeral_event_source import EphemeralEventSource
 from fk.core.fernet_cryptograph import FernetCryptograph
 from fk.core.mock_settings import MockSettings
 from fk.core.pomodoro import Pomodoro
 from fk.core.pomodoro_strategies import AddPomodoroStrategy
-from fk.core.tenant import Tenant
+from fk.core.tenant import Tenant, ADMIN_USER
 from fk.core.timer_strategies import StartTimerStrategy
 from fk.core.user import User
 from fk.core.workitem import Workitem
@@ -386,3 +387,88 @@ class TestWorkitems(TestCase):
         self.assertEqual(len(user['b1']), 0)
         self.assertEqual(len(user['b2']), 1)
         self.assertIn('w11', user['b2'])
+
+    def test_find_by_uid(self):
+        self.source.execute(CreateBacklogStrategy, ['b1', 'Backlog 1'])
+        self.source.execute(CreateBacklogStrategy, ['b2', 'Backlog 2'])
+        self.source.execute(CreateWorkitemStrategy, ['w11', 'b1', 'First #workitem'])
+        self.source.execute(CreateWorkitemStrategy, ['w12', 'b1', 'Second workitem'])
+        self.assertEqual('Backlog 2', self.source.find_backlog('b2').get_name())
+        self.assertEqual('First #workitem', self.source.find_workitem('w11').get_name())
+        self.assertEqual(1, len(self.source.find_tag('workitem').get_workitems()))
+
+        self.source.execute(MoveWorkitemStrategy, ['w11', 'b2'])
+        self.assertEqual('b2', self.source.find_workitem('w11').get_parent().get_uid())
+        self.source.execute(DeleteWorkitemStrategy, ['w11'])
+        self.assertIsNone(self.source.find_workitem('w11'))
+        self.assertIsNone(self.source.find_tag('workitem'))
+        self.source.execute(DeleteBacklogStrategy, ['b1'])
+        self.assertIsNone(self.source.find_backlog('b1'))
+        self.assertIsNone(self.source.find_workitem('w12'))
+
+        # Restoring a snapshot replaces all users with their content
+        self.source.execute(CreateWorkitemStrategy, ['w21', 'b2', 'Restored workitem'])
+        restored = Tenant(self.settings)
+        restore_tenant(snapshot_tenant(self.data), restored)
+        self.assertIs(restored.find_workitem('w21'), restored.find_backlog('b2')['w21'])
+        self.assertIsNone(restored.find_backlog('b1'))
+        self.assertEqual('user@local.host', self.source.find_user('user@local.host').get_identity())
+
+    def test_find_workitem_with_same_uid_in_another_user(self):
+        self.source.execute(CreateBacklogStrategy, ['b1', 'Backlog 1'])
+        self.source.execute(CreateWorkitemStrategy, ['w11', 'b1', 'Mine'])
+        admin: User = self.data[ADMIN_USER]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        backlog = Backlog('Admin backlog', admin, 'b2', now)
+        admin['b2'] = backlog
+        backlog['w11'] = Workitem('Same UID', 'w11', backlog, now, set())
+        self.source.execute(RenameWorkitemStrategy, ['w11', 'Renamed'])
+        self.assertEqual('Renamed', self.data.get_current_user()['b1']['w11'].get_name())
+        self.assertEqual('Same UID', backlog['w11'].get_name())
+
+    def test_find_by_uid_after_deleting_a_collision(self):
+        self.source.execute(CreateBacklogStrategy, ['b1', 'Backlog 1'])
+        self.source.execute(CreateWorkitemStrategy, ['w11', 'b1', 'Mine'])
+        admin: User = self.data[ADMIN_USER]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        backlog = Backlog('Admin backlog', admin, 'b1', now)
+        admin['b1'] = backlog
+        backlog['w11'] = Workitem('Same UID', 'w11', backlog, now, set())
+
+        # Deleting one of them keeps the other one in the index
+        del backlog['w11']
+        self.assertEqual('Mine', self.data.find_workitem('w11').get_name())
+        del admin['b1']
+        self.assertEqual('Backlog 1', self.data.find_backlog('b1').get_name())
+        admin['b1'] = backlog
+        backlog['w11'] = Workitem('Same UID', 'w11', backlog, now, set())
+        self.source.execute(DeleteWorkitemStrategy, ['w11'])
+        self.assertEqual('Same UID', self.data.find_workitem('w11').get_name())
+        self.source.execute(DeleteBacklogStrategy, ['b1'])
+        self.assertIs(backlog, self.data.find_backlog('b1'))
+
+    def test_find_workitem_by_owner(self):
+        user, backlog = self._standard_backlog()
+        self.source.execute(CreateWorkitemStrategy, ['w11', 'b1', 'First workitem'])
+        admin: User = self.data[ADMIN_USER]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        other = Backlog('Admin backlog', admin, 'b2', now)
+        admin['b2'] = other
+        other['w11'] = Workitem('Same UID', 'w11', other, now, set())
+        self.assertEqual('Same UID', self.data.find_workitem('w11').get_name())
+        self._assert_workitem(user.find_workitem('w11'), user, backlog)
+
+        # The index is authoritative, so we don't look through the backlogs
+        self.data.get_uid_index().remove(backlog['w11'])
+        self.assertIsNone(user.find_workitem('w11'))
+        self.assertIs(other['w11'], admin.find_workitem('w11'))
+
+    def test_find_workitem_without_tenant(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        user = User(None, 'alice@local.host', 'Alice', now, False)
+        backlog = Backlog('First backlog', user, 'b1', now)
+        user['b1'] = backlog
+        backlog['w11'] = Workitem('First workitem', 'w11', backlog, now, set())
+        self._assert_workitem(user.find_workitem('w11'), user, backlog)
+        del backlog['w11']
+        self.assertIsNone(user.find_workitem('w11'))
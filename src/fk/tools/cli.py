@@ -23,9 +23,11 @@ from fk.core.abstract_data_item import generate_uid
 from fk.core.abstract_event_source import AbstractEventSource
 from fk.core.abstract_strategy import AbstractStrategy
 from fk.core.backlog_strategies import CreateBacklogStrategy, DeleteBacklogStrategy
+from fk.core.binary_serializer import convert_file
 from fk.core.file_event_source import FileEventSource
 from fk.core.mock_settings import MockSettings
 from fk.core.no_cryptograph import NoCryptograph
+from fk.core.replay_profiler import ReplayProfiler
 from fk.core.tenant import Tenant
 from fk.core.user import User
 
@@ -90,6 +92,21 @@ def backlog(args) -> None:
     else:
         backlog_parser.print_help()
 
+def profile(args) -> None:
+    settings = MockSettings(filename=args.file)
+    source = FileEventSource[Tenant](settings,
+                                     NoCryptograph(settings),
+                                     Tenant(settings))
+    profiler = ReplayProfiler()
+    source.set_profiler(profiler)
+    source.start()
+    dump(profiler.to_dict())
+
+def convert(args) -> None:
+    settings = MockSettings()
+    count = convert_file(args.source, args.target, args.to == 'binary', settings, NoCryptograph(settings))
+    print(f'Converted {count} strategies')
+
 
 if __name__ == '__main__':
     parser = ArgumentParser(description="Flowkeeper command-line client")
@@ -106,6 +123,16 @@ if __name__ == '__main__':
     backlog_parser.add_argument("--file", required=True, help="Data file")
     backlog_parser.set_defaults(func=backlog)
 
+    convert_parser = subparsers.add_parser('convert', help='Convert data file between text and binary formats')
+    convert_parser.add_argument("--to", required=True, choices=['text', 'binary'], help="Target format")
+    convert_parser.add_argument("source", help="Source data file")
+    convert_parser.add_argument("target", help="Target data file")
+    convert_parser.set_defaults(func=convert)
+
+    profile_parser = subparsers.add_parser('profile', help='Load data file and print the timings of each phase as JSON')
+    profile_parser.add_argument("--file", required=True, help="Data file")
+    profile_parser.set_defaults(func=profile)
+
     parser.add_argument("--debug", action='store_true', help="Debug output for troubleshooting Flowkeeper")
 
     args: Namespace = parser.parse_args()